@@ -0,0 +1,37 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+
+"""Benchmarks for the stestr cli startup time, in the format used by asv."""
+
+import os
+import subprocess
+import sys
+
+
+def _stestr(*args):
+    with open(os.devnull, 'w') as devnull:
+        subprocess.check_call(
+            [sys.executable, '-m', 'stestr.cli'] + list(args),
+            stdout=devnull, stderr=devnull)
+
+
+class TimeStartup(object):
+
+    def time_version(self):
+        _stestr('--version')
+
+    def time_command_help(self):
+        _stestr('last', '--help')
+
+    def time_help(self):
+        _stestr('--help')
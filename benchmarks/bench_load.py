@@ -0,0 +1,98 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Benchmarks for loading and reporting results, in the format used by asv."""
+
+import io
+import os
+import shutil
+import tempfile
+
+from stestr.commands import failing
+from stestr.commands import load
+from stestr.repository import util
+from stestr import subunit_trace
+
+from benchmarks import synthetic
+
+
+def _stdout():
+    return io.TextIOWrapper(io.BytesIO(), encoding='utf8')
+
+
+class _Suite(object):
+    """Set up a subunit stream of a run, with 1% failing tests, on disk."""
+
+    params = [1000, 10000, 100000]
+    param_names = ['test_ids']
+    timeout = 600
+
+    def setup(self, count):
+        self.tempdir = tempfile.mkdtemp()
+        self.stream = synthetic.subunit_stream(synthetic.test_ids(count),
+                                               fail_every=100)
+        self.stream_path = os.path.join(self.tempdir, 'stream.subunit')
+        with open(self.stream_path, 'wb') as stream_file:
+            stream_file.write(self.stream)
+
+    def teardown(self, count):
+        shutil.rmtree(self.tempdir)
+
+
+class TimeLoad(_Suite):
+
+    def setup(self, count):
+        super(TimeLoad, self).setup(count)
+        self.repo_url = os.path.join(self.tempdir, 'repo')
+        os.mkdir(self.repo_url)
+        util.get_repo_initialise('file', self.repo_url)
+
+    def time_load(self, count):
+        load.load(streams=[self.stream_path], repo_url=self.repo_url,
+                  stdout=_stdout())
+
+    def time_load_subunit_trace(self, count):
+        load.load(streams=[self.stream_path], repo_url=self.repo_url,
+                  pretty_out=True, stdout=_stdout())
+
+
+class TimeTrace(_Suite):
+
+    def time_trace(self, count):
+        subunit_trace.trace(io.BytesIO(self.stream), _stdout())
+
+    def time_trace_spill_failures(self, count):
+        subunit_trace.trace(io.BytesIO(self.stream), _stdout(),
+                            spill_failures=True)
+
+
+class TimeFailing(_Suite):
+
+    def setup(self, count):
+        super(TimeFailing, self).setup(count)
+        self.repo_url = os.path.join(self.tempdir, 'repo')
+        os.mkdir(self.repo_url)
+        util.get_repo_initialise('file', self.repo_url)
+        load.load(streams=[self.stream_path], repo_url=self.repo_url,
+                  stdout=_stdout())
+
+    def time_failing(self, count):
+        failing.failing(repo_url=self.repo_url, stdout=_stdout())
+
+    def time_failing_list(self, count):
+        failing.failing(repo_url=self.repo_url, list_tests=True,
+                        stdout=_stdout())
+
+    def time_partial_load(self, count):
+        # A partial run merges its results into the failing tests
+        load.load(streams=[self.stream_path], repo_url=self.repo_url,
+                  partial=True, stdout=_stdout())
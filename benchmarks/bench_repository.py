@@ -0,0 +1,104 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Benchmarks for the repositories, in the format used by asv."""
+
+import io
+import os
+import shutil
+import tempfile
+
+import subunit
+
+from stestr.commands import export
+from stestr.repository import util
+
+from benchmarks import synthetic
+
+
+def _insert(repo, stream):
+    inserter = repo.get_inserter()
+    inserter.startTestRun()
+    try:
+        subunit.ByteStreamToStreamResult(io.BytesIO(stream)).run(inserter)
+    finally:
+        inserter.stopTestRun()
+
+
+class _Repository(object):
+
+    params = (['file', 'sql'], [1000, 10000, 100000])
+    param_names = ['repo_type', 'test_ids']
+    timeout = 600
+
+    def setup(self, repo_type, count):
+        if repo_type == 'sql':
+            try:
+                import subunit2sql  # noqa
+            except ImportError:
+                # asv skips benchmarks whose setup raises NotImplementedError
+                raise NotImplementedError('subunit2sql is not installed')
+            if count > 10000:
+                raise NotImplementedError('too slow for the sql repository')
+        self.tempdir = tempfile.mkdtemp()
+        if repo_type == 'sql':
+            repo_url = 'sqlite:///' + os.path.join(self.tempdir, 'db.sqlite')
+        else:
+            repo_url = self.tempdir
+        self.repo_url = repo_url
+        self.repo = util.get_repo_initialise(repo_type, repo_url)
+        self.test_ids = synthetic.test_ids(count)
+        self.stream = synthetic.subunit_stream(self.test_ids, fail_every=100)
+
+    def teardown(self, repo_type, count):
+        shutil.rmtree(self.tempdir)
+
+
+class TimeInserter(_Repository):
+
+    def time_insert(self, repo_type, count):
+        _insert(self.repo, self.stream)
+
+
+class TimeGetTestTimes(_Repository):
+
+    def setup(self, repo_type, count):
+        super(TimeGetTestTimes, self).setup(repo_type, count)
+        _insert(self.repo, self.stream)
+
+    def time_get_test_times(self, repo_type, count):
+        self.repo.get_test_times(self.test_ids)
+
+
+class TimeExport(_Repository):
+
+    def setup(self, repo_type, count):
+        super(TimeExport, self).setup(repo_type, count)
+        _insert(self.repo, self.stream)
+        self.output = open(os.devnull, 'w')
+
+    def teardown(self, repo_type, count):
+        self.output.close()
+        super(TimeExport, self).teardown(repo_type, count)
+
+    def _export(self, repo_type, output_format):
+        export.export(output_format=output_format, repo_type=repo_type,
+                      repo_url=self.repo_url, stdout=self.output)
+
+    def time_export_junitxml(self, repo_type, count):
+        self._export(repo_type, 'junitxml')
+
+    def time_export_json(self, repo_type, count):
+        self._export(repo_type, 'json')
+
+    def peakmem_export_junitxml(self, repo_type, count):
+        self._export(repo_type, 'junitxml')
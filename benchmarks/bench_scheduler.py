@@ -0,0 +1,55 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Benchmarks for test partitioning, in the format used by asv."""
+
+import re
+
+from stestr.repository import abstract as repository
+from stestr import scheduler
+
+from benchmarks import synthetic
+
+
+class _TimesRepository(repository.AbstractRepository):
+    """A repository which only knows the times of the tests."""
+
+    def __init__(self, times):
+        self.times = times
+
+    def _get_test_times(self, test_ids):
+        return dict((x, self.times[x]) for x in test_ids if x in self.times)
+
+
+class TimePartitionTests(object):
+
+    params = ([1000, 100000, 500000], [8, 64])
+    param_names = ['test_ids', 'concurrency']
+    timeout = 300
+
+    def setup(self, count, concurrency):
+        self.test_ids = synthetic.test_ids(count)
+        # Leave a tenth of the tests without timing data
+        self.repository = _TimesRepository(
+            synthetic.test_times(self.test_ids[count // 10:]))
+        self.group_regex = re.compile(r'([^\.]+\.)+')
+
+    def time_partition_tests(self, count, concurrency):
+        scheduler.partition_tests(self.test_ids, concurrency, self.repository,
+                                  None)
+
+    def time_partition_tests_grouped(self, count, concurrency):
+        def group_callback(test_id):
+            return self.group_regex.match(test_id).group(0)
+
+        scheduler.partition_tests(self.test_ids, concurrency, self.repository,
+                                  group_callback)
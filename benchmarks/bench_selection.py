@@ -0,0 +1,52 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Benchmarks for test selection, in the format used by asv."""
+
+import os
+import shutil
+import tempfile
+
+from stestr import selection
+
+from benchmarks import synthetic
+
+
+class TimeConstructList(object):
+
+    params = ([1000, 100000], [10, 1000])
+    param_names = ['test_ids', 'blacklist_lines']
+
+    def setup(self, count, lines):
+        self.test_ids = synthetic.test_ids(count)
+        self.tempdir = tempfile.mkdtemp()
+        self.blacklist = os.path.join(self.tempdir, 'blacklist')
+        with open(self.blacklist, 'w') as black_file:
+            for i in range(lines):
+                black_file.write(
+                    'test_module%d\\.TestCase%d\\.test_method%d\\b '
+                    '# broken\n' % (i % 100, i % 1000, i * 7))
+
+    def teardown(self, count, lines):
+        shutil.rmtree(self.tempdir)
+
+    def time_filter_tests(self, count, lines):
+        selection.filter_tests(['unit', 'smoke', r'test_module1\d\.'],
+                               self.test_ids)
+
+    def time_construct_list_blacklist(self, count, lines):
+        selection.construct_list(self.test_ids, regexes=['unit'],
+                                 blacklist_file=self.blacklist)
+
+    def time_construct_list_blacklist_skipped(self, count, lines):
+        selection.construct_list(self.test_ids, regexes=['unit'],
+                                 blacklist_file=self.blacklist, skipped=[])
@@ -0,0 +1,35 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Benchmarks for test list parsing, in the format used by asv."""
+
+from stestr import testlist
+
+from benchmarks import synthetic
+
+
+class TimeParseEnumeration(object):
+
+    params = [1000, 100000, 500000]
+    param_names = ['test_ids']
+    timeout = 300
+
+    def setup(self, count):
+        test_ids = synthetic.test_ids(count)
+        self.enumeration = synthetic.enumeration(test_ids)
+        self.test_list = ('\n'.join(test_ids) + '\n').encode('utf8')
+
+    def time_parse_enumeration(self, count):
+        testlist.parse_enumeration(self.enumeration)
+
+    def time_parse_list(self, count):
+        testlist.parse_list(self.test_list)
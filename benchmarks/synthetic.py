@@ -0,0 +1,80 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Generators for the synthetic test suites used by the benchmarks."""
+
+import datetime
+import io
+
+import subunit
+from subunit import iso8601
+
+START = datetime.datetime(2017, 1, 1, tzinfo=iso8601.UTC)
+
+
+def test_ids(count):
+    """Return count test ids laid out like a large project's unit tests."""
+    return ['project.tests.unit.test_module%d.TestCase%d.test_method%d'
+            '[id-%d,smoke]' % (i % 100, i % 1000, i, i) for i in range(count)]
+
+
+def run_time(index):
+    """Return the run time used for the test at index in a suite."""
+    # A spread of short tests with the occasional slow one
+    return 0.001 * (index % 97) + (1.5 if index % 501 == 0 else 0.0)
+
+
+def test_times(ids):
+    """Return a dict of the run time of each of ids."""
+    return dict((test_id, run_time(i)) for i, test_id in enumerate(ids))
+
+
+def enumeration(ids):
+    """Return the subunit v2 stream listing ids, as from --list."""
+    output = io.BytesIO()
+    result = subunit.StreamResultToBytes(output)
+    for test_id in ids:
+        result.status(test_id=test_id, test_status='exists')
+    return output.getvalue()
+
+
+def subunit_stream(ids, workers=4, fail_every=0):
+    """Return a subunit v2 stream of a run of ids.
+
+    :param list ids: The test ids in the run
+    :param int workers: The number of workers the tests are spread over,
+        round robin
+    :param int fail_every: Make every fail_every-th test fail, 0 means that
+        all of the tests pass
+    :return: The stream as bytes
+    """
+    output = io.BytesIO()
+    result = subunit.StreamResultToBytes(output)
+    clocks = [START] * workers
+    for i, test_id in enumerate(ids):
+        worker = i % workers
+        tags = set(['worker-%d' % worker])
+        result.status(test_id=test_id, test_status='inprogress',
+                      test_tags=tags, timestamp=clocks[worker])
+        clocks[worker] += datetime.timedelta(seconds=run_time(i))
+        if fail_every and i % fail_every == 0:
+            result.status(test_id=test_id, file_name='traceback',
+                          file_bytes=b'Traceback (most recent call last):\n'
+                                     b'AssertionError: synthetic failure\n',
+                          mime_type='text/plain; charset=utf8', eof=True,
+                          test_tags=tags, timestamp=clocks[worker])
+            status = 'fail'
+        else:
+            status = 'success'
+        result.status(test_id=test_id, test_status=status, test_tags=tags,
+                      timestamp=clocks[worker])
+    return output.getvalue()
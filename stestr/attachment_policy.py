@@ -0,0 +1,158 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Limit the attachments of passing tests stored in a repository.
+
+A policy is the number of bytes of each attachment of a successful test to
+keep, or None to keep all of them. The policies are given as:
+
+* ``all``: keep every attachment, the default
+* ``failures``: only keep the attachments of tests which didn't succeed
+* ``N``: truncate each attachment of a successful test to N KiB
+
+The attachments of tests with any other status, like the traceback of a
+failure or the reason for a skip, and the resource usage recorded by
+``stestr.resource_runner`` are always kept.
+"""
+
+import testtools
+
+from stestr import resource_runner
+
+ALL = 'all'
+FAILURES = 'failures'
+# Attachments which are data about the test rather than its output
+_ALWAYS_KEPT = (resource_runner.ATTACHMENT_NAME,)
+_FINAL_STATUSES = ('success', 'fail', 'skip', 'xfail', 'uxsuccess')
+
+
+def parse(value):
+    """Return the policy for the string form of an attachment policy.
+
+    :param str value: 'all', 'failures' or a number of KiB
+    :return: The number of bytes to keep from each attachment of a
+        successful test, or None to keep them all
+    :raises ValueError: If value isn't a valid policy
+    """
+    value = value.strip().lower()
+    if value == ALL:
+        return None
+    if value == FAILURES:
+        return 0
+    try:
+        size = int(value)
+    except ValueError:
+        size = -1
+    if size < 0:
+        raise ValueError("Invalid attachment policy '%s', it must be '%s', "
+                         "'%s' or a number of KiB" % (value, ALL, FAILURES))
+    return size * 1024
+
+
+def _cut(data, size):
+    # Don't split a UTF-8 character, most attachments are text
+    while size > 0 and size < len(data) and (
+            ord(data[size:size + 1]) & 0xC0) == 0x80:
+        size -= 1
+    return data[:size]
+
+
+class AttachmentFilter(testtools.StreamResult):
+    """Drop or truncate the attachments of successful tests.
+
+    The attachments of a test are held back until its final status arrives,
+    then they are forwarded either untouched or limited by the policy. Every
+    other event is forwarded as it arrives, with its status, tags and
+    timestamp unchanged.
+
+    :param target: The StreamResult to forward the events to
+    :param int limit: The number of bytes of each attachment of a successful
+        test to keep
+    """
+
+    def __init__(self, target, limit):
+        super(AttachmentFilter, self).__init__()
+        self.target = target
+        self.limit = limit
+        # (test_id, route_code) -> the held back attachment events
+        self._pending = {}
+
+    def startTestRun(self):
+        self._pending = {}
+        self.target.startTestRun()
+
+    def stopTestRun(self):
+        # Tests which never finished, like those of a crashed worker, keep
+        # everything they had
+        for events in self._pending.values():
+            for event in events:
+                self.target.status(**event)
+        self._pending = {}
+        self.target.stopTestRun()
+
+    def status(self, test_id=None, test_status=None, test_tags=None,
+               runnable=True, file_name=None, file_bytes=None, eof=False,
+               mime_type=None, route_code=None, timestamp=None):
+        event = dict(test_id=test_id, test_status=test_status,
+                     test_tags=test_tags, runnable=runnable,
+                     file_name=file_name, file_bytes=file_bytes, eof=eof,
+                     mime_type=mime_type, route_code=route_code,
+                     timestamp=timestamp)
+        if test_id is None:
+            self.target.status(**event)
+            return
+        key = (test_id, route_code)
+        if test_status not in _FINAL_STATUSES:
+            if file_name is not None:
+                self._pending.setdefault(key, []).append(event)
+            else:
+                self.target.status(**event)
+            return
+        events = self._pending.pop(key, [])
+        events.append(event)
+        if test_status == 'success':
+            events = self._limit(events)
+        for event in events:
+            self.target.status(**event)
+
+    def _limit(self, events):
+        sizes = {}
+        for event in events:
+            name = event['file_name']
+            if name is None or name in _ALWAYS_KEPT:
+                yield event
+                continue
+            used = sizes.get(name, 0)
+            data = _cut(event['file_bytes'] or b'', self.limit - used)
+            sizes[name] = used + len(data)
+            if data:
+                event['file_bytes'] = data
+                if sizes[name] >= self.limit:
+                    event['eof'] = True
+                yield event
+            elif event['test_status'] is not None:
+                # Keep the status, without the attachment
+                event.update(file_name=None, file_bytes=None, eof=False,
+                             mime_type=None)
+                yield event
+
+
+def wrap(result, limit):
+    """Apply an attachment policy to the events sent to result.
+
+    :param result: The StreamResult storing the events
+    :param int limit: The policy, as returned by parse()
+    :return: A StreamResult to send the events to
+    """
+    if limit is None:
+        return result
+    return AttachmentFilter(result, limit)
@@ -0,0 +1,207 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Find the tests which cause other tests to fail when run before them."""
+
+from multiprocessing import pool
+
+import subunit
+import testtools
+
+from stestr import scheduler
+
+
+def prior_tests(run, failing_ids):
+    """Calculate which tests from a test run ran before each failing test.
+
+    Tests that ran in a different worker are not included in the result.
+
+    :param run: The test run, as returned by the repository, to look at
+    :param failing_ids: The test ids to find the prior tests of
+    :return: A dict mapping each of the failing_ids to the list of test ids
+        that ran before it in the same worker, in the order they ran.
+    """
+    case = run.get_test()
+    # Use None if there is no worker-N tag
+    # If there are multiple, map them all.
+    # (worker-N -> [testid, ...])
+    worker_to_test = {}
+    # (testid -> [workerN, ...])
+    test_to_worker = {}
+
+    def map_test(test_dict):
+        tags = test_dict['tags']
+        id = test_dict['id']
+        workers = []
+        for tag in tags:
+            if tag.startswith('worker-'):
+                workers.append(tag)
+        if not workers:
+            workers = [None]
+        for worker in workers:
+            worker_to_test.setdefault(worker, []).append(id)
+        test_to_worker.setdefault(id, []).extend(workers)
+
+    mapper = testtools.StreamToDict(map_test)
+    mapper.startTestRun()
+    try:
+        case.run(mapper)
+    finally:
+        mapper.stopTestRun()
+    result = {}
+    for failing_id in failing_ids:
+        tests = []
+        for worker in test_to_worker.get(failing_id, []):
+            worker_tests = worker_to_test[worker]
+            tests.extend(worker_tests[:worker_tests.index(failing_id)])
+        result[failing_id] = tests
+    return result
+
+
+def _split(test_ids, n):
+    """Split test_ids into n contiguous chunks of near equal size."""
+    size, extra = divmod(len(test_ids), n)
+    chunks = []
+    start = 0
+    for i in range(n):
+        end = start + size + (1 if i < extra else 0)
+        chunks.append(test_ids[start:end])
+        start = end
+    return chunks
+
+
+class IsolationAnalyzer(object):
+    """Find the tests which interact with failing tests.
+
+    Each check runs a list of tests in a single test process, without
+    storing the results in the repository. Checks are run concurrently, so
+    the search splits candidate lists into as many parts as there are
+    workers instead of halving them, and several failures are analyzed at
+    once.
+
+    :param get_run_command: A callable which takes a list of test ids and
+        returns a TestProcessorFixture which runs them serially
+    :param int concurrency: The number of checks to run at once. The default
+        (0) autodetects your CPU count and uses that.
+    """
+
+    def __init__(self, get_run_command, concurrency=0):
+        self.get_run_command = get_run_command
+        self.concurrency = (int(concurrency) or
+                            scheduler.local_concurrency() or 1)
+
+    def probe(self, test_ids):
+        """Run test_ids in order and return the status of each test."""
+        cmd = self.get_run_command(test_ids)
+        cmd.setUp()
+        try:
+            statuses = {}
+
+            def gather(test_dict):
+                statuses[test_dict['id']] = test_dict['status']
+
+            result = testtools.StreamToDict(gather)
+            result.startTestRun()
+            try:
+                for proc in cmd.run_tests():
+                    subunit.ByteStreamToStreamResult(
+                        proc.stdout, non_subunit_name='stdout').run(result)
+                    proc.wait()
+            finally:
+                result.stopTestRun()
+        finally:
+            cmd.cleanUp()
+        return statuses
+
+    def _fails(self, test_ids, failing_id):
+        status = self.probe(list(test_ids) + [failing_id]).get(failing_id)
+        return status == 'fail'
+
+    def find_spurious_failures(self, failing_ids):
+        """Return the failing_ids which pass when run on their own.
+
+        Tests which don't run on their own, because they were filtered out,
+        are not returned.
+        """
+        def passes_alone(failing_id):
+            status = self.probe([failing_id]).get(failing_id)
+            return status not in (None, 'fail')
+
+        probe_pool = pool.ThreadPool(self.concurrency)
+        try:
+            passed = probe_pool.map(passes_alone, failing_ids)
+        finally:
+            probe_pool.close()
+        return [x for x, ok in zip(failing_ids, passed) if ok]
+
+    def find_causes(self, failing_id, candidates, probe_pool):
+        """Find a minimal set of candidates which make failing_id fail.
+
+        This uses delta debugging (ddmin), so failures which only happen
+        when several tests run before failing_id are found as well.
+
+        :param str failing_id: The test id to find the causes of
+        :param list candidates: The tests which ran before failing_id, in
+            the order they ran
+        :param probe_pool: The pool used to run the checks
+        :return: The list of test ids, or None if failing_id didn't fail when
+            run after all the candidates.
+        """
+        if not candidates or not probe_pool.apply(
+                self._fails, (candidates, failing_id)):
+            return None
+        n = min(len(candidates), max(2, self.concurrency))
+        while len(candidates) > 1:
+            subsets = _split(candidates, n)
+            checks = list(subsets)
+            if n > 2:
+                # With only 2 subsets each one is the complement of the other
+                for subset in subsets:
+                    subset = set(subset)
+                    checks.append([x for x in candidates if x not in subset])
+            failed = probe_pool.map(
+                lambda ids: self._fails(ids, failing_id), checks)
+            if True in failed[:n]:
+                candidates = subsets[failed.index(True)]
+                n = min(len(candidates), max(2, self.concurrency))
+            elif True in failed[n:]:
+                candidates = checks[n + failed[n:].index(True)]
+                n = min(len(candidates), max(n - 1, 2))
+            elif n < len(candidates):
+                n = min(len(candidates), 2 * n)
+            else:
+                break
+        return candidates
+
+    def analyze(self, failing_ids, prior):
+        """Find the causes of several failures at once.
+
+        :param list failing_ids: The test ids which failed
+        :param dict prior: A dict mapping each failing test id to the list of
+            tests which ran before it, as returned by prior_tests()
+        :return: A dict mapping each failing test id which fails only when
+            run with other tests to the list of tests causing the failure, or
+            None if the cause couldn't be determined.
+        """
+        spurious = self.find_spurious_failures(failing_ids)
+        if not spurious:
+            return {}
+        probe_pool = pool.ThreadPool(self.concurrency)
+        analysis_pool = pool.ThreadPool(len(spurious))
+        try:
+            causes = analysis_pool.map(
+                lambda x: self.find_causes(x, prior.get(x, []), probe_pool),
+                spurious)
+        finally:
+            analysis_pool.close()
+            probe_pool.close()
+        return dict(zip(spurious, causes))
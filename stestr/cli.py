@@ -15,6 +15,7 @@ import importlib
 import os
 import sys
 
+from stestr import instrumentation
 from stestr import version
 
 __version__ = version.version_info.version_string_with_vcs()
@@ -22,18 +23,43 @@ __version__ = version.version_info.version_string_with_vcs()
 
 class StestrCLI(object):
 
-    commands = ['run', 'list', 'slowest', 'failing', 'last', 'init', 'load']
+    commands = ['run', 'list', 'slowest', 'failing', 'last', 'init', 'load',
+                'gc', 'watch', 'timeline', 'timing', 'merge', 'export',
+                'compare']
     command_module = 'stestr.commands.'
 
-    def __init__(self):
-        self.parser = self._get_parser()
+    def __init__(self, argv=None):
+        self.parser = self._get_parser(argv)
 
-    def _get_parser(self):
+    def _find_command(self, argv):
+        """Return the command argv runs, without importing any commands."""
+        parser = argparse.ArgumentParser(add_help=False)
+        self._set_common_opts(parser)
+        parser.add_argument('command', nargs='?')
+        args, _ = parser.parse_known_args(argv)
+        if args.command in self.commands:
+            return args.command
+        return None
+
+    def _get_parser(self, argv=None):
+        """Return the parser for argv.
+
+        Only the module of the command argv runs is imported, which keeps
+        the startup time down, the commands import most of stestr's
+        dependencies. All of them are imported if argv doesn't run a
+        command, to show their help.
+        """
+        if argv is None:
+            argv = sys.argv[1:]
+        selected = self._find_command(argv)
         self.command_dict = {}
         parser = argparse.ArgumentParser()
         self._set_common_opts(parser)
         subparsers = parser.add_subparsers(help='command help')
         for cmd in self.commands:
+            if selected is not None and cmd != selected:
+                subparsers.add_parser(cmd)
+                continue
             self.command_dict[cmd] = importlib.import_module(
                 self.command_module + cmd)
             help_str = self.command_dict[cmd].get_cli_help()
@@ -87,6 +113,20 @@ class StestrCLI(object):
                                  " together in the stestr scheduler. If "
                                  "both this and the corresponding config file "
                                  "option are set this value will be used.")
+        parser.add_argument('--profile-stestr', dest='profile_stestr',
+                            metavar='FILE',
+                            default=os.environ.get(instrumentation.ENV_VAR),
+                            help="Record how long each phase of the command "
+                                 "takes and write the report to FILE in the "
+                                 "Chrome trace event format. This can also "
+                                 "be enabled by setting the %s environment "
+                                 "variable to FILE." % instrumentation.ENV_VAR)
+        parser.add_argument('--profile-stestr-cprofile',
+                            dest='profile_stestr_cprofile',
+                            action='store_true', default=False,
+                            help="With --profile-stestr, also profile stestr "
+                                 "with cProfile and write the profile to "
+                                 "FILE.prof")
 
 
 def main():
@@ -99,7 +139,15 @@ def main():
     if 'PYTHON' not in os.environ:
         os.environ['PYTHON'] = sys.executable
     if hasattr(args[0], 'func'):
-        sys.exit(args[0].func(args))
+        if args[0].profile_stestr:
+            instrumentation.enable(args[0].profile_stestr,
+                                   cprofile=args[0].profile_stestr_cprofile)
+        try:
+            with instrumentation.span('command', argv=sys.argv[1:]):
+                result = args[0].func(args)
+        finally:
+            instrumentation.disable()
+        sys.exit(result)
     else:
         cli.parser.print_help()
         # NOTE(andreaf) This point is reached only when using Python 3.x.
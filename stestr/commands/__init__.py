@@ -10,13 +10,48 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
-from stestr.commands.failing import failing as failing_command
-from stestr.commands.init import init as init_command
-from stestr.commands.last import last as last_command
-from stestr.commands.list import list_command
-from stestr.commands.load import load as load_command
-from stestr.commands.run import run_command
-from stestr.commands.slowest import slowest as slowest_command
-
-__all__ = ['failing_command', 'init_command', 'last_command',
-           'list_command', 'load_command', 'run_command', 'slowest_command']
+"""The stable python interface of the stestr commands.
+
+Each function here imports its command module when it is first called, as
+the command modules import most of stestr's dependencies. The functions take
+the same arguments as the command functions they call, for example
+``run_command`` calls :func:`stestr.commands.run.run_command`.
+"""
+
+import importlib
+
+
+def _lazy_command(module, function):
+    path = 'stestr.commands.' + module
+
+    def command(*args, **kwargs):
+        func = getattr(importlib.import_module(path), function)
+        return func(*args, **kwargs)
+
+    command.__name__ = function
+    command.__doc__ = 'Call :func:`%s.%s`, see it for the arguments.' % (
+        path, function)
+    return command
+
+
+compare_command = _lazy_command('compare', 'compare')
+export_command = _lazy_command('export', 'export')
+failing_command = _lazy_command('failing', 'failing')
+gc_command = _lazy_command('gc', 'gc')
+init_command = _lazy_command('init', 'init')
+last_command = _lazy_command('last', 'last')
+list_command = _lazy_command('list', 'list_command')
+load_command = _lazy_command('load', 'load')
+merge_command = _lazy_command('merge', 'merge')
+run_command = _lazy_command('run', 'run_command')
+slowest_command = _lazy_command('slowest', 'slowest')
+timeline_command = _lazy_command('timeline', 'timeline')
+timing_export_command = _lazy_command('timing', 'timing_export')
+timing_import_command = _lazy_command('timing', 'timing_import')
+watch_command = _lazy_command('watch', 'watch')
+
+__all__ = ['compare_command', 'export_command', 'failing_command',
+           'gc_command', 'init_command', 'last_command', 'list_command',
+           'load_command', 'merge_command', 'run_command', 'slowest_command',
+           'timeline_command', 'timing_export_command',
+           'timing_import_command', 'watch_command']
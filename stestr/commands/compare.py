@@ -0,0 +1,308 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Compare the test durations of two runs to find regressions."""
+
+import argparse
+import math
+import sys
+
+from stestr.repository import util
+
+
+def get_cli_help():
+    help_str = """Compare the test durations of two runs to find regressions.
+
+    Run B, by default the last run, is compared with run A, by default the
+    run before B. The duration of each test in run B is compared with its
+    mean and standard deviation over run A and the runs before it, see
+    --history, and the tests which got slower by more than the noise are
+    reported. The tests added and removed since run A, and the change of the
+    wall time and of the time spent by each worker, are shown too.
+
+    The exit code is 1 if any test, or the tests in both runs as a whole,
+    got slower, so this can be used to gate changes in CI.
+    """
+    return help_str
+
+
+def _history_type(value):
+    history = int(value)
+    if history < 1:
+        raise argparse.ArgumentTypeError(
+            'The history must be at least 1 run, not %s' % value)
+    return history
+
+
+def set_cli_opts(parser):
+    parser.add_argument('--history', type=_history_type, default=5,
+                        metavar='N',
+                        help='The number of runs, up to and including run '
+                             'A, whose durations of each test are the '
+                             'baseline for run B. The default is 5.')
+    parser.add_argument('--threshold', type=float, default=20.0,
+                        metavar='PERCENT',
+                        help='The minimum slowdown of a test, as a '
+                             'percentage of its baseline mean, to report it '
+                             'as a regression. The default is 20.')
+    parser.add_argument('--min-delta', type=float, default=0.1,
+                        metavar='SECONDS',
+                        help='The minimum slowdown of a test in seconds to '
+                             'report it as a regression. The default is 0.1.')
+    parser.add_argument('--sigma', type=float, default=3.0,
+                        help='The minimum slowdown of a test, in standard '
+                             'deviations of its baseline durations, to '
+                             'report it as a regression. The default is 3.')
+
+
+def run(arguments):
+    args = arguments[0]
+    run_ids = arguments[1] or []
+    if len(run_ids) > 2:
+        sys.stderr.write('At most 2 run ids can be compared\n')
+        return 2
+    run_a = run_ids[0] if run_ids else None
+    run_b = run_ids[1] if len(run_ids) > 1 else None
+    return compare(run_a=run_a, run_b=run_b, repo_type=args.repo_type,
+                   repo_url=args.repo_url, history=args.history,
+                   threshold=args.threshold, min_delta=args.min_delta,
+                   sigma=args.sigma)
+
+
+class Stats(object):
+    """The running mean and variance of a series of durations."""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    def add(self, value):
+        # Welford's algorithm, which doesn't keep the values
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+
+    @property
+    def stdev(self):
+        if self.count < 2:
+            return 0.0
+        return math.sqrt(self._m2 / (self.count - 1))
+
+
+class RunSummary(object):
+    """The tests, durations and worker times of a test run.
+
+    :param bool keep_durations: Keep the duration of each successful test in
+        durations, as well as adding it to the stats passed to add_test.
+    """
+
+    def __init__(self, keep_durations=False):
+        self.test_ids = set()
+        self.durations = {} if keep_durations else None
+        # worker -> the sum of the durations of the tests it ran
+        self.workers = {}
+        self.start = None
+        self.stop = None
+
+    @property
+    def wall_time(self):
+        if self.start is None:
+            return 0.0
+        return (self.stop - self.start).total_seconds()
+
+    def add_test(self, test_dict, stats=None):
+        from stestr import subunit_trace
+
+        if test_dict['status'] == 'exists':
+            return
+        self.test_ids.add(test_dict['id'])
+        start, stop = test_dict['timestamps']
+        if None in (start, stop):
+            return
+        self.start = start if self.start is None else min(self.start, start)
+        self.stop = stop if self.stop is None else max(self.stop, stop)
+        duration = (stop - start).total_seconds()
+        worker = subunit_trace.find_worker(test_dict)
+        self.workers[worker] = self.workers.get(worker, 0.0) + duration
+        if test_dict['status'] != 'success':
+            return
+        if self.durations is not None:
+            self.durations[test_dict['id']] = duration
+        if stats is not None:
+            stats.setdefault(test_dict['id'], Stats()).add(duration)
+
+
+def _read_run(repo, run_id, summary=None, stats=None):
+    import testtools
+
+    if summary is None:
+        summary = RunSummary()
+
+    def gather(test_dict):
+        summary.add_test(test_dict, stats)
+
+    result = testtools.StreamToDict(gather)
+    result.startTestRun()
+    try:
+        repo.get_test_run(run_id).get_test().run(result)
+    finally:
+        result.stopTestRun()
+    return summary
+
+
+def is_regression(duration, mean, stdev, threshold=20.0, min_delta=0.1,
+                  sigma=3.0):
+    """Return whether a duration is slower than its baseline beyond noise.
+
+    :param float duration: The duration in seconds
+    :param float mean: The mean of the baseline durations
+    :param float stdev: The standard deviation of the baseline durations
+    :param float threshold: The minimum slowdown, as a percentage of the
+        baseline mean
+    :param float min_delta: The minimum slowdown in seconds
+    :param float sigma: The minimum slowdown, in standard deviations of the
+        baseline
+    """
+    limit = max(min_delta, mean * threshold / 100.0, sigma * stdev)
+    return duration - mean > limit
+
+
+def _change(before, after):
+    if not before:
+        return '-'
+    return '%+.1f%%' % ((after - before) * 100.0 / before)
+
+
+def compare(run_a=None, run_b=None, repo_type='file', repo_url=None,
+            history=5, threshold=20.0, min_delta=0.1, sigma=3.0,
+            stdout=sys.stdout):
+    """Compare the test durations of two runs to find regressions
+
+    The duration of each successful test in run_b is compared with the mean
+    and standard deviation of its successful durations in run_a and the
+    runs before it. A test regressed if it got slower than all of the
+    threshold, min_delta and sigma limits. The sums of the durations of the
+    tests in both, compared with the sums of their baseline means and
+    variances, are checked in the same way.
+
+    :param run_a: The id of the run to compare with, by default the run
+        before run_b. Run_b itself is never part of the baseline, even when
+        run_a comes after it.
+    :param run_b: The id of the run to check, by default the latest run
+    :param str repo_type: This is the type of repository to use. Valid choices
+        are 'file' and 'sql'.
+    :param str repo_url: The url of the repository to use.
+    :param int history: The number of runs, up to and including run_a, that
+        the baseline durations come from
+    :param float threshold: The minimum slowdown of a test, as a percentage
+        of its baseline mean, to count as a regression
+    :param float min_delta: The minimum slowdown of a test in seconds to
+        count as a regression
+    :param float sigma: The minimum slowdown of a test, in standard
+        deviations of its baseline durations, to count as a regression
+    :param file stdout: The output file to write all output to. By default
+        this is sys.stdout
+
+    :return return_code: The exit code for the command. 0 if nothing
+        regressed, 1 if there were regressions, 2 if run_a and run_b are
+        the same run and 3 if the runs weren't found.
+    :rtype: int
+    """
+    from stestr import output
+
+    repo = util.get_repo_open(repo_type, repo_url)
+    try:
+        if run_b is None:
+            run_b = repo.latest_id()
+        if run_a is None:
+            previous = repo.get_previous_ids(run_b, 1)
+            if not previous:
+                sys.stderr.write('No run to compare run %s with\n' % run_b)
+                return 3
+            run_a = previous[0]
+        if str(run_a) == str(run_b):
+            sys.stderr.write("Run %s can't be compared with itself\n" % run_b)
+            return 2
+        baseline_ids = [run_a] + [
+            x for x in repo.get_previous_ids(run_a, max(history, 1) - 1)
+            if str(x) != str(run_b)]
+        stats = {}
+        summary_b = _read_run(repo, run_b, RunSummary(keep_durations=True))
+        summary_a = _read_run(repo, run_a, stats=stats)
+        for run_id in baseline_ids[1:]:
+            _read_run(repo, run_id, stats=stats)
+    except KeyError:
+        sys.stderr.write('No test run found\n')
+        return 3
+
+    stdout.write('Comparing run %s with run %s (baseline of %d runs)\n' % (
+        run_b, run_a, len(baseline_ids)))
+    regressions = []
+    total_b = total_mean = total_variance = 0.0
+    for test_id, duration in summary_b.durations.items():
+        test_stats = stats.get(test_id)
+        if test_stats is None:
+            continue
+        total_b += duration
+        total_mean += test_stats.mean
+        total_variance += test_stats.stdev ** 2
+        if is_regression(duration, test_stats.mean, test_stats.stdev,
+                         threshold, min_delta, sigma):
+            regressions.append((duration - test_stats.mean, test_id,
+                                test_stats, duration))
+    # The durations of the tests are assumed to be independent, so the
+    # variance of their sum is the sum of their variances
+    suite_regressed = is_regression(
+        total_b, total_mean, math.sqrt(total_variance), threshold, min_delta,
+        sigma)
+
+    if regressions:
+        regressions.sort(key=lambda x: (-x[0], x[1]))
+        rows = [('Test id', 'Baseline (s)', 'Std dev (s)', 'Runs',
+                 'Run %s (s)' % run_b, 'Change')]
+        for _, test_id, test_stats, duration in regressions:
+            rows.append((test_id, '%.3f' % test_stats.mean,
+                         '%.3f' % test_stats.stdev, test_stats.count,
+                         '%.3f' % duration,
+                         _change(test_stats.mean, duration)))
+        stdout.write('\n%d tests regressed:\n' % len(regressions))
+        output.output_table(rows, output=stdout)
+    else:
+        stdout.write('\nNo tests regressed\n')
+    for title, test_ids in (
+            ('new', summary_b.test_ids - summary_a.test_ids),
+            ('removed', summary_a.test_ids - summary_b.test_ids)):
+        if test_ids:
+            stdout.write('\n%d %s tests:\n' % (len(test_ids), title))
+            for test_id in sorted(test_ids):
+                stdout.write('  %s\n' % test_id)
+
+    rows = [('', 'Run %s (s)' % run_a, 'Run %s (s)' % run_b, 'Change')]
+    rows.append(('Wall time', '%.3f' % summary_a.wall_time,
+                 '%.3f' % summary_b.wall_time,
+                 _change(summary_a.wall_time, summary_b.wall_time)))
+    rows.append(('Common tests (baseline mean)', '%.3f' % total_mean,
+                 '%.3f' % total_b, _change(total_mean, total_b)))
+    for worker in sorted(set(summary_a.workers) | set(summary_b.workers)):
+        before = summary_a.workers.get(worker, 0.0)
+        after = summary_b.workers.get(worker, 0.0)
+        rows.append(('Worker %d' % worker, '%.3f' % before,
+                     '%.3f' % after, _change(before, after)))
+    stdout.write('\n')
+    output.output_table(rows, output=stdout)
+    if suite_regressed:
+        stdout.write('\nThe tests in both runs regressed as a whole\n')
+    if regressions or suite_regressed:
+        return 1
+    return 0
@@ -0,0 +1,327 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Export the results of a test run as JUnit XML, JSON or CSV."""
+
+import codecs
+import csv
+import io
+import json
+import re
+import shutil
+import sys
+import tempfile
+from xml.sax import saxutils
+
+import six
+
+from stestr.repository import util
+
+# The statuses of tests which didn't succeed, whose details are exported
+_PROBLEM_STATUSES = ('fail', 'uxsuccess', 'skip')
+# Characters which can be represented in XML 1.0. Narrow python 2 builds
+# store the characters above U+FFFF as surrogate pairs, which can't be
+# part of a range.
+_VALID_XML = u'\x09\x0a\x0d\x20-\ud7ff\ue000-\ufffd'
+if sys.maxunicode > 0xffff:
+    _VALID_XML += u'\U00010000-\U0010ffff'
+_INVALID_XML = re.compile(u'[^%s]' % _VALID_XML)
+# The size of the JUnit XML test cases kept in memory before spooling them to
+# a temporary file
+_SPOOL_SIZE = 1024 * 1024
+
+
+def get_cli_help():
+    help_str = """Export the results of a test run as JUnit XML, JSON or CSV.
+
+    The last run is used unless a run id is given. The run is read from the
+    repository as a stream and each test is written out as it is read, so
+    the memory used doesn't depend on the number of tests in the run.
+    """
+    return help_str
+
+
+def set_cli_opts(parser):
+    parser.add_argument('--format', '-f', default='junitxml',
+                        choices=sorted(FORMATS), dest='output_format',
+                        help='The format to export the run in, the default '
+                             'is junitxml.')
+    parser.add_argument('--output', '-o', default=None,
+                        help='The file to write the results to. By default '
+                             'they are written to stdout.')
+
+
+def run(arguments):
+    args = arguments[0]
+    run_id = arguments[1][0] if arguments[1] else None
+    if args.output:
+        with io.open(args.output, 'w', encoding='utf-8') as output_file:
+            return export(run_id=run_id, output_format=args.output_format,
+                          repo_type=args.repo_type, repo_url=args.repo_url,
+                          stdout=output_file)
+    return export(run_id=run_id, output_format=args.output_format,
+                  repo_type=args.repo_type, repo_url=args.repo_url)
+
+
+def _duration(test_dict):
+    start, stop = test_dict['timestamps']
+    if None in (start, stop):
+        return None
+    return (stop - start).total_seconds()
+
+
+def _isoformat(timestamp):
+    return timestamp.isoformat() if timestamp is not None else None
+
+
+def _details_text(test_dict):
+    """Return the text details of a test, by name."""
+    details = {}
+    for name, content in test_dict['details'].items():
+        if content.content_type.type != 'text':
+            continue
+        details[name] = content.as_text()
+    return details
+
+
+def _xml_escape(text, entities=None):
+    return saxutils.escape(_INVALID_XML.sub(u'\ufffd', text), entities or {})
+
+
+def _xml_attr(text):
+    return _xml_escape(text, {'"': '&quot;', '\n': '&#10;'})
+
+
+class JUnitXMLWriter(object):
+    """Write the tests of a run as a JUnit XML test suite.
+
+    The counts of the test suite come before its test cases in the XML, so
+    the test cases are spooled, encoded as UTF-8, to a temporary file until
+    the end of the run.
+
+    :param stream: The text file object to write the XML to
+    :param str name: The id of the run, used for the test suite name
+    """
+
+    def __init__(self, stream, name):
+        self.stream = stream
+        self.name = name
+        self.tests = 0
+        self.failures = 0
+        self.skipped = 0
+        self.time = 0.0
+        self._cases = None
+
+    def start(self):
+        # The text modes of SpooledTemporaryFile don't take an encoding on
+        # python 2, so the spool is binary
+        self._cases = tempfile.SpooledTemporaryFile(max_size=_SPOOL_SIZE)
+
+    def _write_case(self, text):
+        self._cases.write(text.encode('utf8'))
+
+    def add_test(self, test_dict):
+        status = test_dict['status']
+        if status == 'exists':
+            return
+        self.tests += 1
+        duration = _duration(test_dict) or 0.0
+        self.time += duration
+        test_id = test_dict['id']
+        # The attributes of a test id can contain dots, like a version
+        base = test_id.split('[', 1)[0]
+        classname, _, name = base.rpartition('.')
+        name += test_id[len(base):]
+        self._write_case(u'<testcase classname="%s" name="%s" '
+                         u'time="%.6f"' % (_xml_attr(classname),
+                                           _xml_attr(name), duration))
+        if status in ('fail', 'uxsuccess'):
+            self.failures += 1
+            details = _details_text(test_dict)
+            if status == 'uxsuccess':
+                message = 'Unexpected success'
+            else:
+                message = details.get('traceback', '').strip().split(
+                    '\n')[-1]
+            text = details.pop('traceback', '')
+            text += ''.join('\n%s:\n%s' % (x, details[x])
+                            for x in sorted(details))
+            self._write_case(u'>\n<failure message="%s">%s</failure>\n'
+                             u'</testcase>\n' % (_xml_attr(message),
+                                                 _xml_escape(text)))
+        elif status == 'skip':
+            self.skipped += 1
+            reason = _details_text(test_dict).get('reason', '')
+            self._write_case(u'>\n<skipped message="%s" />\n</testcase>\n'
+                             % _xml_attr(reason.strip()))
+        else:
+            self._write_case(u' />\n')
+
+    def finish(self):
+        self.stream.write(
+            u'<?xml version="1.0" encoding="UTF-8"?>\n'
+            u'<testsuite errors="0" failures="%d" name="%s" skipped="%d" '
+            u'tests="%d" time="%.6f">\n' % (self.failures,
+                                            _xml_attr(self.name),
+                                            self.skipped, self.tests,
+                                            self.time))
+        self._cases.seek(0)
+        shutil.copyfileobj(codecs.getreader('utf8')(self._cases),
+                           self.stream)
+        self._cases.close()
+        self.stream.write(u'</testsuite>\n')
+
+
+class JSONWriter(object):
+    """Write the tests of a run as a JSON document.
+
+    The document has the run id, a list of the tests and the number of tests
+    with each status. Each test has its id, status, start and stop times,
+    duration in seconds and tags, and the text details of tests which didn't
+    succeed, like the traceback of a failure.
+
+    :param stream: The text file object to write the JSON to
+    :param str name: The id of the run
+    """
+
+    def __init__(self, stream, name):
+        self.stream = stream
+        self.name = name
+        self.tests = 0
+        self.statuses = {}
+
+    def start(self):
+        self.stream.write(u'{"run_id": %s, "tests": [' % json.dumps(
+            self.name))
+
+    def add_test(self, test_dict):
+        status = test_dict['status']
+        if status == 'exists':
+            return
+        start, stop = test_dict['timestamps']
+        test = {
+            'id': test_dict['id'],
+            'status': status,
+            'start_time': _isoformat(start),
+            'stop_time': _isoformat(stop),
+            'duration': _duration(test_dict),
+            'tags': sorted(test_dict['tags']),
+        }
+        if status in _PROBLEM_STATUSES:
+            test['details'] = _details_text(test_dict)
+        self.stream.write(u',\n' if self.tests else u'\n')
+        self.stream.write(six.text_type(json.dumps(test, sort_keys=True)))
+        self.tests += 1
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+
+    def finish(self):
+        self.stream.write(u'\n], "statuses": %s}\n' % json.dumps(
+            self.statuses, sort_keys=True))
+
+
+class CSVWriter(object):
+    """Write the tests of a run as CSV, one row for each test.
+
+    :param stream: The text file object to write the CSV to
+    :param str name: The id of the run
+    """
+
+    fields = ('test_id', 'status', 'start_time', 'stop_time', 'duration',
+              'tags')
+
+    def __init__(self, stream, name):
+        self.stream = stream
+        self.name = name
+        self.tests = 0
+        if six.PY2:
+            # The python 2 csv module only writes byte strings, so each row
+            # is written to a buffer as UTF-8 and decoded onto the stream
+            self._buffer = six.BytesIO()
+            self._writer = csv.writer(self._buffer, lineterminator='\n')
+        else:
+            self._writer = csv.writer(stream, lineterminator='\n')
+
+    def _writerow(self, row):
+        if not six.PY2:
+            self._writer.writerow(row)
+            return
+        self._writer.writerow([six.text_type(x).encode('utf8') for x in row])
+        self.stream.write(self._buffer.getvalue().decode('utf8'))
+        self._buffer.seek(0)
+        self._buffer.truncate()
+
+    def start(self):
+        self._writerow(self.fields)
+
+    def add_test(self, test_dict):
+        if test_dict['status'] == 'exists':
+            return
+        self.tests += 1
+        start, stop = test_dict['timestamps']
+        duration = _duration(test_dict)
+        self._writerow((
+            test_dict['id'], test_dict['status'], _isoformat(start) or '',
+            _isoformat(stop) or '', '' if duration is None else duration,
+            ' '.join(sorted(test_dict['tags']))))
+
+    def finish(self):
+        pass
+
+
+FORMATS = {
+    'csv': CSVWriter,
+    'json': JSONWriter,
+    'junitxml': JUnitXMLWriter,
+}
+
+
+def export(run_id=None, output_format='junitxml', repo_type='file',
+           repo_url=None, stdout=sys.stdout):
+    """Export the results of a test run from a repository
+
+    The run is streamed from the repository, and each test is written out as
+    it is read, so the memory used doesn't depend on the number of tests.
+
+    :param run_id: The id of the run to export, by default the latest run is
+        used
+    :param str output_format: The format to export the run in, 'junitxml',
+        'json' or 'csv'
+    :param str repo_type: This is the type of repository to use. Valid choices
+        are 'file' and 'sql'.
+    :param str repo_url: The url of the repository to use.
+    :param file stdout: The output file to write the results to. By default
+        this is sys.stdout
+
+    :return return_code: The exit code for the command. 0 for success and > 0
+        for failures.
+    :rtype: int
+    """
+    import testtools
+
+    repo = util.get_repo_open(repo_type, repo_url)
+    try:
+        if run_id is None:
+            run_id = repo.latest_id()
+        test_run = repo.get_test_run(run_id)
+    except KeyError:
+        sys.stderr.write('No test run found\n')
+        return 3
+    writer = FORMATS[output_format](stdout, str(run_id))
+    writer.start()
+    result = testtools.StreamToDict(writer.add_test)
+    result.startTestRun()
+    try:
+        test_run.get_test().run(result)
+    finally:
+        result.stopTestRun()
+    writer.finish()
+    return 0
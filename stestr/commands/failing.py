@@ -14,11 +14,7 @@
 
 import sys
 
-import testtools
-
-from stestr import output
 from stestr.repository import util
-from stestr import results
 
 
 def get_cli_help():
@@ -44,6 +40,9 @@ def _show_subunit(run):
 
 
 def _make_result(repo, list_tests=False, stdout=sys.stdout):
+    import testtools
+    from stestr import results
+
     if list_tests:
         list_result = testtools.StreamSummary()
         return list_result, list_result
@@ -88,6 +87,8 @@ def failing(repo_type='file', repo_url=None, list_tests=False, subunit=False,
         for failures.
     :rtype: int
     """
+    from stestr import output
+
     if repo_type not in ['file', 'sql']:
         stdout.write('Repository type %s is not a type' % repo_type)
         return 1
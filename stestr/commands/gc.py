@@ -0,0 +1,87 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Pack old runs in a repository."""
+
+import sys
+
+from stestr.repository import util
+
+DEFAULT_KEEP = 10
+DAY_SECONDS = 60 * 60 * 24
+
+
+def get_cli_help():
+    help_str = """Pack old test runs in the repository.
+
+    Runs which are not retained by the --keep or --max-age policies are
+    packed into a single indexed archive file. Packed runs can still be
+    queried by every other command. The most recent run is always retained.
+    """
+    return help_str
+
+
+def set_cli_opts(parser):
+    parser.add_argument("--keep", type=int, default=None,
+                        help="Retain this many of the most recent runs. If "
+                             "neither this nor --max-age is specified the "
+                             "%d most recent runs are retained."
+                             % DEFAULT_KEEP)
+    parser.add_argument("--max-age", type=float, default=None,
+                        dest='max_age',
+                        help="Retain runs younger than this many days.")
+
+
+def run(arguments):
+    args = arguments[0]
+    return gc(repo_type=args.repo_type, repo_url=args.repo_url,
+              keep=args.keep, max_age=args.max_age)
+
+
+def gc(repo_type='file', repo_url=None, keep=None, max_age=None,
+       stdout=sys.stdout):
+    """Pack old runs in the repository
+
+    This function will pack every run in the repository that is not retained
+    by the ``keep`` or ``max_age`` policies into a single archive file, and
+    compact the timing database. A run is retained if it matches either
+    policy.
+
+    Note this function depends on the cwd for the repository if `repo_type` is
+    set to file and `repo_url` is not specified it will use the repository
+    located at CWD/.stestr
+
+    :param str repo_type: This is the type of repository to use. Only 'file'
+        supports this command.
+    :param str repo_url: The url of the repository to use.
+    :param int keep: The number of most recent runs to retain. If neither
+        this nor ``max_age`` is set, it defaults to 10.
+    :param float max_age: Retain runs younger than this many days.
+    :param file stdout: The output file to write all output to. By default
+        this is sys.stdout
+
+    :return return_code: The exit code for the command. 0 for success and > 0
+        for failures.
+    :rtype: int
+    """
+    if repo_type != 'file':
+        stdout.write('The gc command is not supported by the %s repository '
+                     'type\n' % repo_type)
+        return 1
+    if keep is None and max_age is None:
+        keep = DEFAULT_KEEP
+    if max_age is not None:
+        max_age = max_age * DAY_SECONDS
+    repo = util.get_repo_open(repo_type, repo_url)
+    packed = repo.gc(keep=keep, max_age=max_age)
+    stdout.write('Packed %d runs\n' % len(packed))
+    return 0
@@ -14,10 +14,7 @@
 
 import sys
 
-from stestr import output
 from stestr.repository import util
-from stestr import results
-from stestr import subunit_trace
 
 
 def get_cli_help():
@@ -46,6 +43,13 @@ def set_cli_opts(parser):
                              ' if subunit-trace output is enabled. (this is '
                              'the default). If subunit-trace is disable this '
                              ' does nothing.')
+    parser.add_argument('--spill-failures', action='store_true',
+                        default=False,
+                        help='Keep the failed tests in a temporary file '
+                             'instead of in memory until they are printed '
+                             'in the subunit-trace summary, if subunit-trace '
+                             'output is enabled. This bounds the memory used '
+                             'by runs with many failures.')
 
 
 def run(arguments):
@@ -53,11 +57,11 @@ def run(arguments):
     pretty_out = not args.no_subunit_trace
     return last(repo_type=args.repo_type, repo_url=args.repo_url,
                 subunit_out=args.subunit, pretty_out=pretty_out,
-                color=args.color)
+                color=args.color, spill_failures=args.spill_failures)
 
 
 def last(repo_type='file', repo_url=None, subunit_out=False, pretty_out=True,
-         color=False, stdout=sys.stdout):
+         color=False, stdout=sys.stdout, spill_failures=False):
     """Show the last run loaded into a a repository
 
     This function will print the results from the last run in the repository
@@ -77,11 +81,17 @@ def last(repo_type='file', repo_url=None, subunit_out=False, pretty_out=True,
     :param bool subunit: Show output as a subunit stream.
     :param file stdout: The output file to write all output to. By default
          this is sys.stdout
+    :param bool spill_failures: Keep the failed tests in a temporary file
+        instead of in memory for the subunit-trace summary.
 
     :return return_code: The exit code for the command. 0 for success and > 0
         for failures.
     :rtype: int
     """
+    from stestr import output
+    from stestr import results
+    from stestr import subunit_trace
+
     repo = util.get_repo_open(repo_type, repo_url)
     latest_run = repo.get_latest_run()
     if subunit_out:
@@ -113,7 +123,9 @@ def last(repo_type='file', repo_url=None, subunit_out=False, pretty_out=True,
     else:
         stream = latest_run.get_subunit_stream()
         failed = subunit_trace.trace(stream, stdout, post_fails=True,
-                                     color=color)
+                                     color=color,
+                                     spill_failures=spill_failures,
+                                     repo_type=repo_type, repo_url=repo_url)
     if failed:
         return 1
     else:
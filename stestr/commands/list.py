@@ -15,9 +15,6 @@
 from io import BytesIO
 import sys
 
-from stestr import config_file
-from stestr import output
-
 
 def get_cli_help():
     help_str = ("List the tests for a project. You can use a filter just like"
@@ -93,6 +90,9 @@ def list_command(config='.stestr.conf', repo_type='file', repo_url=None,
         this is sys.stdout
 
     """
+    from stestr import config_file
+    from stestr import output
+
     ids = None
     conf = config_file.TestrConf(config)
     cmd = conf.get_run_command(
@@ -12,20 +12,12 @@
 
 """Load data into a repository."""
 
-
 import datetime
 import functools
 import sys
 
-import subunit
-import testtools
-
-from stestr import output
-from stestr.repository import abstract as repository
+from stestr import instrumentation
 from stestr.repository import util
-from stestr import results
-from stestr import subunit_trace
-from stestr import utils
 
 
 def set_cli_opts(parser):
@@ -49,6 +41,26 @@ def set_cli_opts(parser):
                         help='Enable color output in the subunit-trace output,'
                              ' if subunit-trace output is enabled. If '
                              'subunit-trace is disable this does nothing.')
+    parser.add_argument('--abbreviate', action='store_true', default=False,
+                        help='Print one character status for each test in '
+                             'the subunit-trace output, if subunit-trace '
+                             'output is enabled.')
+    parser.add_argument('--spill-failures', action='store_true',
+                        default=False,
+                        help='Keep the failed tests in a temporary file '
+                             'instead of in memory until they are printed '
+                             'in the subunit-trace summary, if subunit-trace '
+                             'output is enabled. This bounds the memory used '
+                             'by runs with many failures.')
+    parser.add_argument('--attachments', default=None, metavar='POLICY',
+                        help="Which attachments of the tests, like their "
+                             "stdout, stderr and logging, to store in the "
+                             "repository: 'all' of them, only those of the "
+                             "tests which didn't succeed with 'failures', or "
+                             "a number of KiB to truncate the attachments "
+                             "of successful tests to. This takes precedence "
+                             "over the attachments option in the config "
+                             "file, the default is 'all'.")
 
 
 def get_cli_help():
@@ -64,17 +76,24 @@ def get_cli_help():
 
 
 def run(arguments):
+    from stestr import config_file
+
     args = arguments[0]
     load(repo_type=args.repo_type, repo_url=args.repo_url,
          partial=args.partial, subunit_out=args.subunit,
          force_init=args.force_init, streams=arguments[1],
-         pretty_out=args.subunit_trace, color=args.color)
+         pretty_out=args.subunit_trace, color=args.color,
+         abbreviate=args.abbreviate, spill_failures=args.spill_failures,
+         attachments=config_file.TestrConf(
+             args.config).get_attachment_policy(args.attachments))
 
 
 def load(force_init=False, in_streams=None,
          partial=False, subunit_out=False, repo_type='file', repo_url=None,
          run_id=None, streams=None, pretty_out=False, color=False,
-         stdout=sys.stdout):
+         stdout=sys.stdout, abbreviate=False, progress=False,
+         partitions=None, tags=None, attachments=None,
+         spill_failures=False, return_id=False):
     """Load subunit streams into a repository
 
     This function will load subunit streams into the repository. It will
@@ -98,11 +117,34 @@ def load(force_init=False, in_streams=None,
     :param bool color: Enabled colorized subunit-trace output
     :param file stdout: The output file to write all output to. By default
         this is sys.stdout
+    :param bool abbreviate: Print one character status for each test in the
+        subunit-trace output
+    :param bool progress: Show a status line with the progress of the run
+        and its predicted finish time
+    :param list partitions: The list of test ids run by each input stream,
+        in stream order. This is used to predict the remaining time of the
+        run for the progress status line.
+    :param list tags: Tags to add to every test in the loaded streams
+    :param int attachments: The attachment policy to store the streams with,
+        as returned by stestr.attachment_policy.parse(). By default every
+        attachment is stored.
+    :param bool spill_failures: Keep the failed tests in a temporary file
+        instead of in memory for the subunit-trace summary
+    :param bool return_id: Return the id of the run the streams were stored
+        in along with the exit code
 
     :return return_code: The exit code for the command. 0 for success and > 0
-        for failures.
+        for failures. If return_id is set, a tuple of the exit code and the
+        run id.
     :rtype: int
     """
+    import subunit
+    import testtools
+    from stestr import output
+    from stestr.repository import abstract as repository
+    from stestr import results
+    from stestr import subunit_trace
+    from stestr import utils
 
     try:
         repo = util.get_repo_open(repo_type, repo_url)
@@ -123,7 +165,8 @@ def load(force_init=False, in_streams=None,
         streams = [sys.stdin.buffer]
 
     def mktagger(pos, result):
-        return testtools.StreamTagger([result], add=['worker-%d' % pos])
+        return testtools.StreamTagger([result],
+                                      add=['worker-%d' % pos] + (tags or []))
 
     def make_tests():
         for pos, stream in enumerate(streams):
@@ -136,15 +179,19 @@ def load(force_init=False, in_streams=None,
 
     case = testtools.ConcurrentStreamTestSuite(make_tests)
     if not run_id:
-        inserter = repo.get_inserter(partial=partial)
+        inserter = repo.get_inserter(partial=partial, attachments=attachments)
     else:
-        inserter = repo.get_inserter(partial=partial, run_id=run_id)
+        inserter = repo.get_inserter(partial=partial, run_id=run_id,
+                                     attachments=attachments)
     if subunit_out:
         output_result, summary_result = output.make_result(inserter.get_id)
     if pretty_out:
+        trace_summary = subunit_trace.TraceSummary(
+            spill_failures=spill_failures)
         outcomes = testtools.StreamToDict(
             functools.partial(subunit_trace.show_outcome, stdout,
-                              enable_color=color))
+                              enable_color=color, abbreviate=abbreviate,
+                              summary=trace_summary))
         summary_result = testtools.StreamSummary()
         output_result = testtools.CopyStreamResult([outcomes, summary_result])
         output_result = testtools.StreamResultRouter(output_result)
@@ -158,19 +205,35 @@ def load(force_init=False, in_streams=None,
         output_result = results.CLITestResult(
             inserter.get_id, stdout, previous_run)
         summary_result = output_result.get_summary()
+    if progress and not subunit_out:
+        estimates = {}
+        if partitions:
+            estimates = repo.get_test_times(
+                [x for ids in partitions for x in ids])['known']
+        # NOTE: Redrawing the status line in place would erase the
+        # abbreviated output on the same line, so print it periodically.
+        output_result = results.ProgressResult(
+            output_result, stdout, partitions, estimates,
+            redraw=False if abbreviate else None)
     result = testtools.CopyStreamResult([inserter, output_result])
     start_time = datetime.datetime.utcnow()
     result.startTestRun()
     try:
-        case.run(result)
+        # NOTE: This includes the time spent waiting for the workers
+        with instrumentation.span('load.stream'):
+            case.run(result)
     finally:
-        result.stopTestRun()
+        with instrumentation.span('load.finish'):
+            result.stopTestRun()
     stop_time = datetime.datetime.utcnow()
     elapsed_time = stop_time - start_time
     if pretty_out:
-        subunit_trace.print_fails(stdout)
-        subunit_trace.print_summary(stdout, elapsed_time)
+        subunit_trace.print_fails(stdout, trace_summary)
+        subunit_trace.print_summary(stdout, elapsed_time, trace_summary)
     if not summary_result.wasSuccessful():
-        return 1
+        return_code = 1
     else:
-        return 0
+        return_code = 0
+    if return_id:
+        return return_code, inserter.get_id()
+    return return_code
@@ -0,0 +1,158 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+
+"""Merge the latest runs of several repositories into one run."""
+
+import sys
+
+from stestr.repository import util
+
+_WORKER_PREFIX = 'worker-'
+
+
+def get_cli_help():
+    help_str = """Merge the latest runs of several repositories into one run.
+
+    The latest run of each source repository, like the repositories of the
+    shards of a run split with 'stestr run --shard', is streamed into a single
+    new run in the repository, which is created if needed. The worker tags of
+    each source are renumbered so that they don't collide. The timing data and
+    failing tests of the repository are updated from the merged run, as for
+    any other run, so every command sees the whole suite.
+    """
+    return help_str
+
+
+def set_cli_opts(parser):
+    parser.add_argument('sources', nargs='+', metavar='REPO',
+                        help='The url of a repository to merge, for a file '
+                             'repository this is the directory holding the '
+                             '.stestr directory.')
+    parser.add_argument('--source-type', choices=['file', 'sql'],
+                        default='file', dest='source_type',
+                        help='The type of the source repositories.')
+    parser.add_argument('--partial', action='store_true', default=False,
+                        help='The merged run is a partial run, the existing '
+                             'failures are kept.')
+
+
+def run(arguments):
+    args = arguments[0]
+    return merge(args.sources, source_type=args.source_type,
+                 repo_type=args.repo_type, repo_url=args.repo_url,
+                 partial=args.partial)
+
+
+class WorkerRenumberer(object):
+    """Forward events to a target, renumbering their worker tags.
+
+    Each worker tag seen is given the next unused worker number, so several
+    streams can be forwarded into one target without their workers
+    colliding, as long as :meth:`next_source` is called between them. The
+    test run start and stop events aren't forwarded, as each stream replayed
+    from a repository starts and stops its own test run.
+
+    :param target: The StreamResult to forward the events to
+    """
+
+    def __init__(self, target):
+        self.target = target
+        self.workers = 0
+        self._mapping = {}
+
+    def startTestRun(self):
+        pass
+
+    def stopTestRun(self):
+        pass
+
+    def next_source(self):
+        """Start a new source, whose workers are all new workers."""
+        self._mapping = {}
+
+    def _renumber(self, tag):
+        if not tag.startswith(_WORKER_PREFIX):
+            return tag
+        if tag not in self._mapping:
+            self._mapping[tag] = '%s%d' % (_WORKER_PREFIX, self.workers)
+            self.workers += 1
+        return self._mapping[tag]
+
+    def status(self, test_id=None, test_status=None, test_tags=None,
+               runnable=True, file_name=None, file_bytes=None, eof=False,
+               mime_type=None, route_code=None, timestamp=None):
+        if test_tags:
+            test_tags = set(self._renumber(tag) for tag in test_tags)
+        self.target.status(
+            test_id=test_id, test_status=test_status, test_tags=test_tags,
+            runnable=runnable, file_name=file_name, file_bytes=file_bytes,
+            eof=eof, mime_type=mime_type, route_code=route_code,
+            timestamp=timestamp)
+
+
+def merge(sources, source_type='file', repo_type='file', repo_url=None,
+          partial=False, stdout=sys.stdout):
+    """Merge the latest runs of several repositories into one run
+
+    The runs are streamed one after the other into a new run in the target
+    repository, without holding them in memory. Only the ids of the tests,
+    and with the file repository the failed tests spooled to a temporary
+    file, are kept to update the failing tests. The worker tags of each
+    source are renumbered so they don't collide.
+
+    :param list sources: The urls of the repositories to merge
+    :param str source_type: The type of the source repositories. Valid
+        choices are 'file' and 'sql'.
+    :param str repo_type: This is the type of repository to merge into. Valid
+        choices are 'file' and 'sql'.
+    :param str repo_url: The url of the repository to merge into, it's
+        created if it doesn't exist.
+    :param bool partial: Store the merged run as a partial run, keeping the
+        existing failures of the repository.
+    :param file stdout: The output file to write all output to. By default
+        this is sys.stdout
+
+    :return return_code: The exit code for the command. 0 for success and > 0
+        for failures.
+    :rtype: int
+    """
+    import testtools
+    from stestr.repository import abstract as repository
+
+    runs = []
+    for source in sources:
+        try:
+            source_repo = util.get_repo_open(source_type, source)
+            runs.append(source_repo.get_latest_run())
+        except (repository.RepositoryNotFound, KeyError) as e:
+            sys.stderr.write('Unable to read a run from %s: %s\n'
+                             % (source, e))
+            return 1
+    try:
+        repo = util.get_repo_open(repo_type, repo_url)
+    except repository.RepositoryNotFound:
+        repo = util.get_repo_initialise(repo_type, repo_url)
+    inserter = repo.get_inserter(partial=partial)
+    summary = testtools.StreamSummary()
+    result = testtools.CopyStreamResult([inserter, summary])
+    renumberer = WorkerRenumberer(result)
+    result.startTestRun()
+    try:
+        for test_run in runs:
+            renumberer.next_source()
+            test_run.get_test().run(renumberer)
+    finally:
+        result.stopTestRun()
+    stdout.write('Merged %d runs with %d tests into run %s\n'
+                 % (len(runs), summary.testsRun, inserter.get_id()))
+    return 0
@@ -12,21 +12,18 @@
 
 """Run a projects tests and load them into stestr."""
 
-from math import ceil
+import argparse
+import itertools
 import os
 import subprocess
 import sys
+import threading
+import time
 
 import six
-import subunit
-import testtools
 
-from stestr.commands import load
-from stestr import config_file
-from stestr import output
-from stestr.repository import abstract as repository
+from stestr import instrumentation
 from stestr.repository import util
-from stestr.testlist import parse_list
 
 
 def set_cli_opts(parser):
@@ -49,6 +46,40 @@ def set_cli_opts(parser):
     parser.add_argument("--until-failure", action="store_true", default=False,
                         help="Repeat the run again and again until failure "
                              "occurs.")
+    parser.add_argument("--repeat", type=_repeat_type, default=None,
+                        metavar='N',
+                        help="Run N copies of the selected tests, as many "
+                             "at once as the concurrency allows, stopping "
+                             "at the first failure. Only the failing copy "
+                             "is stored in the repository.")
+    parser.add_argument("--parallel-repeats", action="store_true",
+                        default=False,
+                        help="With --until-failure, run copies of the "
+                             "selected tests concurrently instead of one "
+                             "after the other.")
+    parser.add_argument("--resource-usage", action="store_true",
+                        default=False,
+                        help="Record the CPU time, peak memory and storage "
+                             "I/O of each test. The tests are run with "
+                             "stestr.resource_runner instead of subunit.run "
+                             "and the measurements are stored in the "
+                             "repository with the results.")
+    parser.add_argument("--retry", type=int, default=0, metavar='N',
+                        help="Run the tests which failed again, up to N "
+                             "times, and store the attempts in the same run "
+                             "in the repository. A test which passes on a "
+                             "retry is reported as flaky and doesn't fail "
+                             "the run.")
+    parser.add_argument("--shard", default=None, metavar='INDEX/TOTAL',
+                        type=_shard_type,
+                        help="Split the tests into TOTAL shards with about "
+                             "the same expected runtime, using the timing "
+                             "data in the repository, and only run shard "
+                             "INDEX, counting from 1. Every shard is "
+                             "computed the same way from the same tests and "
+                             "timing data, so the shards can be run by "
+                             "separate CI jobs. The run is stored as a "
+                             "partial run.")
     parser.add_argument("--analyze-isolation", action="store_true",
                         default=False,
                         help="Search the last test run for 2-test test "
@@ -96,6 +127,48 @@ def set_cli_opts(parser):
                              ' if subunit-trace output is enabled. (this is '
                              'the default). If subunit-trace is disable this '
                              ' does nothing.')
+    parser.add_argument('--abbreviate', action='store_true', default=False,
+                        help='Print one character status for each test in '
+                             'the subunit-trace output, if subunit-trace '
+                             'output is enabled.')
+    parser.add_argument('--progress', action='store_true', default=False,
+                        help='Show a status line with the number of tests '
+                             'run and the predicted remaining time of each '
+                             'worker, based on the timing data in the '
+                             'repository.')
+    parser.add_argument('--spill-failures', action='store_true',
+                        default=False,
+                        help='Keep the failed tests in a temporary file '
+                             'instead of in memory until they are printed '
+                             'in the subunit-trace summary, if subunit-trace '
+                             'output is enabled. This bounds the memory used '
+                             'by runs with many failures.')
+    parser.add_argument('--attachments', default=None, metavar='POLICY',
+                        help="Which attachments of the tests, like their "
+                             "stdout, stderr and logging, to store in the "
+                             "repository: 'all' of them, only those of the "
+                             "tests which didn't succeed with 'failures', or "
+                             "a number of KiB to truncate the attachments "
+                             "of successful tests to. This takes precedence "
+                             "over the attachments option in the config "
+                             "file, the default is 'all'.")
+
+
+def _shard_type(value):
+    from stestr import scheduler
+
+    try:
+        return scheduler.parse_shard(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def _repeat_type(value):
+    repeat = int(value)
+    if repeat < 1:
+        raise argparse.ArgumentTypeError(
+            'The number of copies to run must be at least 1, not %s' % value)
+    return repeat
 
 
 def get_cli_help():
@@ -104,6 +177,8 @@ def get_cli_help():
 
 
 def _find_failing(repo):
+    import testtools
+
     run = repo.get_failing()
     case = run.get_test()
     ids = []
@@ -128,7 +203,10 @@ def run_command(config='.stestr.conf', repo_type='file',
                 analyze_isolation=False, isolated=False, worker_path=None,
                 blacklist_file=None, whitelist_file=None, black_regex=None,
                 no_discover=False, random=False, combine=False, filters=None,
-                pretty_out=True, color=False, stdout=sys.stdout):
+                pretty_out=True, color=False, stdout=sys.stdout,
+                abbreviate=False, progress=False, repeat=None,
+                parallel_repeats=False, retry=0, resource_usage=False,
+                shard=None, attachments=None, spill_failures=False):
     """Function to execute the run command
 
     This function implements the run command. It will run the tests specified
@@ -184,11 +262,45 @@ def run_command(config='.stestr.conf', repo_type='file',
     :param bool color: Enable colorized output in subunit-trace
     :param file stdout: The file object to write all output to. By default this
         is sys.stdout
+    :param bool abbreviate: Print one character status for each test in the
+        subunit-trace output
+    :param bool progress: Show a status line with the progress of the run and
+        its predicted finish time
+    :param int repeat: Run this many copies of the selected tests, with up to
+        concurrency copies running at once, stopping at the first failure.
+        Only the failing copy is stored in the repository.
+    :param bool parallel_repeats: When used with until_failure, run copies of
+        the selected tests concurrently like repeat does, without a limit on
+        the number of copies.
+    :param int retry: Run the tests which failed again up to this many times.
+        The attempts are stored in the same run, tagged with ``attempt-N``. A
+        test which passes on a retry doesn't fail the run.
+    :param bool resource_usage: Record the resources used by each test in the
+        repository, by running the tests with stestr.resource_runner
+    :param tuple shard: Only run one shard of the tests, as a tuple of the
+        shard index, counting from 0, and the total number of shards. The
+        tests are split into shards with scheduler.shard_tests, after they
+        are filtered. The run is stored as a partial run.
+    :param str attachments: Which attachments of the tests to store in the
+        repository, 'all', 'failures' or a number of KiB to truncate the
+        attachments of successful tests to. If both this and the
+        corresponding config file option are set this value will be used.
+    :param bool spill_failures: Keep the failed tests in a temporary file
+        instead of in memory for the subunit-trace summary
 
     :return return_code: The exit code for the command. 0 for success and > 0
         for failures.
     :rtype: int
     """
+    import subunit
+    import testtools
+    from stestr import bisect_tests
+    from stestr.commands import load
+    from stestr import config_file
+    from stestr import output
+    from stestr.repository import abstract as repository
+    from stestr.testlist import parse_list
+
     try:
         repo = util.get_repo_open(repo_type, repo_url)
     # If a repo is not found, and there a testr config exists just create it
@@ -200,6 +312,8 @@ def run_command(config='.stestr.conf', repo_type='file',
             stdout.write(msg)
             exit(1)
         repo = util.get_repo_initialise(repo_type, repo_url)
+    conf = config_file.TestrConf(config)
+    attachments = conf.get_attachment_policy(attachments)
     combine_id = None
     if combine:
         latest_id = repo.latest_id()
@@ -209,7 +323,9 @@ def run_command(config='.stestr.conf', repo_type='file',
         if ids.find('/') != -1:
             root, _ = os.path.splitext(ids)
             ids = root.replace('/', '.')
-        run_cmd = 'python -m subunit.run ' + ids
+        runner = ('stestr.resource_runner' if resource_usage
+                  else 'subunit.run')
+        run_cmd = 'python -m %s %s' % (runner, ids)
 
         def run_tests():
             run_proc = [('subunit', output.ReturnCodeToSubunit(
@@ -220,7 +336,10 @@ def run_command(config='.stestr.conf', repo_type='file',
                              repo_type=repo_type,
                              repo_url=repo_url, run_id=combine_id,
                              pretty_out=pretty_out,
-                             color=color, stdout=stdout)
+                             color=color, stdout=stdout,
+                             abbreviate=abbreviate, progress=progress,
+                             attachments=attachments,
+                             spill_failures=spill_failures)
 
         if not until_failure:
             return run_tests()
@@ -245,7 +364,8 @@ def run_command(config='.stestr.conf', repo_type='file',
                     return result
 
     if failing or analyze_isolation:
-        ids = _find_failing(repo)
+        with instrumentation.span('find_failing'):
+            ids = _find_failing(repo)
     else:
         ids = None
     if load_list:
@@ -261,217 +381,320 @@ def run_command(config='.stestr.conf', repo_type='file',
             # that are both failing and listed.
             ids = list_ids.intersection(ids)
 
-    conf = config_file.TestrConf(config)
+    if not analyze_isolation and (repeat or
+                                  (until_failure and parallel_repeats)):
+        # NOTE: Each copy runs all of the tests in a single worker, the
+        # concurrency is used for the number of copies run at once.
+        cmd = conf.get_run_command(
+            ids, regexes=filters, group_regex=group_regex, repo_type=repo_type,
+            repo_url=repo_url, serial=True, worker_path=worker_path,
+            blacklist_file=blacklist_file, black_regex=black_regex,
+            top_dir=top_dir, test_path=test_path, randomize=random,
+            resource_usage=resource_usage, shard=shard)
+        return _run_repeats(cmd, repeat, concurrency=concurrency,
+                            subunit_out=subunit_out, combine_id=combine_id,
+                            repo_type=repo_type, repo_url=repo_url,
+                            pretty_out=pretty_out, color=color,
+                            stdout=stdout, abbreviate=abbreviate,
+                            attachments=attachments,
+                            spill_failures=spill_failures)
     if not analyze_isolation:
         cmd = conf.get_run_command(
             ids, regexes=filters, group_regex=group_regex, repo_type=repo_type,
             repo_url=repo_url, serial=serial, worker_path=worker_path,
             concurrency=concurrency, blacklist_file=blacklist_file,
             black_regex=black_regex, top_dir=top_dir, test_path=test_path,
-            randomize=random)
-        if isolated:
-            result = 0
-            cmd.setUp()
-            try:
-                ids = cmd.list_tests()
-            finally:
-                cmd.cleanUp()
-            for test_id in ids:
-                # TODO(mtreinish): add regex
-                cmd = conf.get_run_command(
-                    [test_id], filters, group_regex=group_regex,
-                    repo_type=repo_type, repo_url=repo_url, serial=serial,
-                    worker_path=worker_path, concurrency=concurrency,
-                    blacklist_file=blacklist_file, black_regex=black_regex,
-                    randomize=random, test_path=test_path, top_dir=top_dir)
-
-                run_result = _run_tests(cmd, failing,
-                                        analyze_isolation,
-                                        isolated,
-                                        until_failure,
-                                        subunit_out=subunit_out,
-                                        combine_id=combine_id,
-                                        repo_type=repo_type,
-                                        repo_url=repo_url,
-                                        pretty_out=pretty_out,
-                                        color=color,
-                                        stdout=stdout)
-                if run_result > result:
-                    result = run_result
-            return result
-        else:
-            return _run_tests(cmd, failing, analyze_isolation,
-                              isolated, until_failure,
-                              subunit_out=subunit_out,
-                              combine_id=combine_id,
-                              repo_type=repo_type,
-                              repo_url=repo_url,
-                              pretty_out=pretty_out,
-                              color=color,
-                              stdout=stdout)
+            randomize=random, isolated=isolated,
+            resource_usage=resource_usage, shard=shard)
+        if until_failure:
+            retry = 0
+        result = _run_tests(cmd, failing, analyze_isolation,
+                            isolated, until_failure,
+                            subunit_out=subunit_out,
+                            combine_id=combine_id,
+                            repo_type=repo_type,
+                            repo_url=repo_url,
+                            pretty_out=pretty_out,
+                            color=color,
+                            stdout=stdout,
+                            abbreviate=abbreviate,
+                            progress=progress,
+                            attachments=attachments,
+                            spill_failures=spill_failures,
+                            return_id=bool(retry))
+        if retry:
+            result, run_id = result
+
+            def get_run_command(test_ids):
+                return conf.get_run_command(
+                    test_ids, group_regex=group_regex, repo_type=repo_type,
+                    repo_url=repo_url, serial=serial, worker_path=worker_path,
+                    concurrency=concurrency, test_path=test_path,
+                    top_dir=top_dir, resource_usage=resource_usage)
+
+            result = _retry_failures(
+                repo, run_id, get_run_command, retry, result,
+                subunit_out=subunit_out, repo_type=repo_type,
+                repo_url=repo_url, pretty_out=pretty_out, color=color,
+                stdout=stdout, abbreviate=abbreviate, attachments=attachments,
+                spill_failures=spill_failures)
+        return result
     else:
         # Where do we source data about the cause of conflicts.
         # XXX: Should instead capture the run id in with the failing test
         # data so that we can deal with failures split across many partial
         # runs.
         latest_run = repo.get_latest_run()
-        # Stage one: reduce the list of failing tests (possibly further
-        # reduced by testfilters) to eliminate fails-on-own tests.
-        spurious_failures = set()
-        for test_id in ids:
-            # TODO(mtrienish): Add regex
-            cmd = conf.get_run_command(
-                [test_id], group_regex=group_regex, repo_type=repo_type,
-                repo_url=repo_url, serial=serial, worker_path=worker_path,
-                concurrency=concurrency, blacklist_file=blacklist_file,
-                black_regex=black_regex, randomize=random, test_path=test_path,
+
+        def get_run_command(test_ids):
+            # TODO(mtreinish): Add regex
+            # NOTE: The tests have to run in a single worker to preserve the
+            # order they ran in.
+            return conf.get_run_command(
+                test_ids, group_regex=group_regex, repo_type=repo_type,
+                repo_url=repo_url, serial=True, test_path=test_path,
                 top_dir=top_dir)
-            if not _run_tests(cmd):
-                # If the test was filtered, it won't have been run.
-                if test_id in repo.get_test_ids(repo.latest_id()):
-                    spurious_failures.add(test_id)
-                # This is arguably ugly, why not just tell the system that
-                # a pass here isn't a real pass? [so that when we find a
-                # test that is spuriously failing, we don't forget
-                # that it is actually failing.
-                # Alternatively, perhaps this is a case for data mining:
-                # when a test starts passing, keep a journal, and allow
-                # digging back in time to see that it was a failure,
-                # what it failed with etc...
-                # The current solution is to just let it get marked as
-                # a pass temporarily.
-        if not spurious_failures:
-            # All done.
-            return 0
+
+        analyzer = bisect_tests.IsolationAnalyzer(get_run_command,
+                                                  concurrency=concurrency)
         # spurious-failure -> cause.
-        test_conflicts = {}
-        for spurious_failure in spurious_failures:
-            candidate_causes = _prior_tests(
-                latest_run, spurious_failure)
-            bottom = 0
-            top = len(candidate_causes)
-            width = top - bottom
-            while width:
-                check_width = int(ceil(width / 2.0))
-                # TODO(mtreinish): Add regex
-                cmd = conf.get_run_command(
-                    candidate_causes[bottom:bottom + check_width]
-                    + [spurious_failure],
-                    group_regex=group_regex, repo_type=repo_type,
-                    repo_url=repo_url, serial=serial, worker_path=worker_path,
-                    concurrency=concurrency, blacklist_file=blacklist_file,
-                    black_regex=black_regex, randomize=random,
-                    test_path=test_path, top_dir=top_dir)
-                _run_tests(cmd)
-                # check that the test we're probing still failed - still
-                # awkward.
-                found_fail = []
-
-                def find_fail(test_dict):
-                    if test_dict['id'] == spurious_failure:
-                        found_fail.append(True)
-
-                checker = testtools.StreamToDict(find_fail)
-                checker.startTestRun()
-                try:
-                    repo.get_failing().get_test().run(checker)
-                finally:
-                    checker.stopTestRun()
-                if found_fail:
-                    # Our conflict is in bottom - clamp the range down.
-                    top = bottom + check_width
-                    if width == 1:
-                        # found the cause
-                        test_conflicts[
-                            spurious_failure] = candidate_causes[bottom]
-                        width = 0
-                    else:
-                        width = top - bottom
-                else:
-                    # Conflict in the range we did not run: discard bottom.
-                    bottom = bottom + check_width
-                    if width == 1:
-                        # there will be no more to check, so we didn't
-                        # reproduce the failure.
-                        width = 0
-                    else:
-                        width = top - bottom
-            if spurious_failure not in test_conflicts:
-                # Could not determine cause
-                test_conflicts[spurious_failure] = 'unknown - no conflicts'
+        ids = list(ids)
+        test_conflicts = analyzer.analyze(
+            ids, bisect_tests.prior_tests(latest_run, ids))
         if test_conflicts:
             table = [('failing test', 'caused by test')]
-            for failure, causes in test_conflicts.items():
-                table.append((failure, causes))
-            output.output_table(table)
+            for failure, causes in sorted(test_conflicts.items()):
+                if causes is None:
+                    # Could not determine cause
+                    causes = ['unknown - no conflicts']
+                table.append((failure, ' '.join(causes)))
+            output.output_table(table, output=stdout)
             return 3
         return 0
 
 
-def _prior_tests(self, run, failing_id):
-    """Calculate what tests from the test run run ran before test_id.
+def _get_final_failures(run):
+    """Return the ids of the tests whose last status in run was a failure."""
+    import testtools
+
+    statuses = {}
 
-    Tests that ran in a different worker are not included in the result.
+    def gather(test_dict):
+        statuses[test_dict['id']] = test_dict['status']
+
+    result = testtools.StreamToDict(gather)
+    result.startTestRun()
+    try:
+        run.get_test().run(result)
+    finally:
+        result.stopTestRun()
+    return [x for x, status in statuses.items() if status == 'fail']
+
+
+def _retry_failures(repo, run_id, get_run_command, retry, result,
+                    subunit_out=False, repo_type='file', repo_url=None,
+                    pretty_out=True, color=False, stdout=sys.stdout,
+                    abbreviate=False, attachments=None, spill_failures=False):
+    """Run the failed tests of a run again, up to retry times.
+
+    Every attempt is appended to the run, with its tests tagged with
+    attempt-N, so the last status of a test in the run is its final status.
+
+    :param run_id: The id of the run to retry the failed tests of
+    :param get_run_command: A callable which takes a list of test ids and
+        returns a TestProcessorFixture to run them
+    :param int retry: The maximum number of attempts
+    :param int result: The return code of the initial run
+    :return: The return code for the run including the retries
     """
-    if not getattr(self, '_worker_to_test', False):
-        case = run.get_test()
-        # Use None if there is no worker-N tag
-        # If there are multiple, map them all.
-        # (worker-N -> [testid, ...])
-        worker_to_test = {}
-        # (testid -> [workerN, ...])
-        test_to_worker = {}
-
-        def map_test(test_dict):
-            tags = test_dict['tags']
-            id = test_dict['id']
-            workers = []
-            for tag in tags:
-                if tag.startswith('worker-'):
-                    workers.append(tag)
-            if not workers:
-                workers = [None]
-            for worker in workers:
-                worker_to_test.setdefault(worker, []).append(id)
-            test_to_worker.setdefault(id, []).extend(workers)
-
-        mapper = testtools.StreamToDict(map_test)
-        mapper.startTestRun()
+    from stestr.commands import load
+    from stestr import output
+
+    if run_id is None:
+        # No tests were run
+        return result
+    failed = _get_final_failures(repo.get_test_run(run_id))
+    # NOTE: A worker which exited non-zero can't be retried by test id
+    crashed = 'process-returncode' in failed
+    to_retry = sorted(x for x in failed if x != 'process-returncode')
+    if not to_retry:
+        return result
+    for attempt in range(1, retry + 1):
+        stdout.write('\nRetrying %d failed tests (attempt %d of %d)\n' % (
+            len(to_retry), attempt, retry))
+        cmd = get_run_command(to_retry)
+        cmd.setUp()
         try:
-            case.run(mapper)
+            run_procs = [('subunit', output.ReturnCodeToSubunit(proc))
+                         for proc in cmd.run_tests()]
+            load.load(in_streams=run_procs, partial=True,
+                      subunit_out=subunit_out, repo_type=repo_type,
+                      repo_url=repo_url, run_id=six.text_type(run_id),
+                      pretty_out=pretty_out, color=color, stdout=stdout,
+                      abbreviate=abbreviate, tags=['attempt-%d' % attempt],
+                      attachments=attachments,
+                      spill_failures=spill_failures)
         finally:
-            mapper.stopTestRun()
-        self._worker_to_test = worker_to_test
-        self._test_to_worker = test_to_worker
-    failing_workers = self._test_to_worker[failing_id]
-    prior_tests = []
-    for worker in failing_workers:
-        worker_tests = self._worker_to_test[worker]
-        prior_tests.extend(worker_tests[:worker_tests.index(failing_id)])
-    return prior_tests
+            cmd.cleanUp()
+        final_failures = set(_get_final_failures(repo.get_test_run(run_id)))
+        to_retry = [x for x in to_retry if x in final_failures]
+        if not to_retry:
+            break
+    flaky = sorted(set(failed) - set(to_retry) - set(['process-returncode']))
+    if flaky:
+        stdout.write('\nThe following tests failed but passed on a '
+                     'retry:\n')
+        for test_id in flaky:
+            stdout.write('  %s\n' % test_id)
+    if to_retry or crashed:
+        return 1
+    return 0
+
+
+def _run_repeats(cmd, repeat=None, concurrency=0, subunit_out=False,
+                 combine_id=None, repo_type='file', repo_url=None,
+                 pretty_out=True, color=False, stdout=sys.stdout,
+                 abbreviate=False, attachments=None, spill_failures=False):
+    """Run copies of the tests cmd was parameterised with concurrently.
+
+    :param int repeat: The number of copies to run, if None copies are run
+        until one of them fails.
+    :return: The return code of loading the failing copy into the repository
+        or 0 if none of the copies failed.
+    """
+    import subunit
+    import testtools
+    from stestr.commands import load
+    from stestr import output
+    from stestr import scheduler
+
+    concurrency = int(concurrency) or scheduler.local_concurrency() or 1
+    if repeat:
+        concurrency = min(concurrency, repeat)
+    lock = threading.Lock()
+    stop = threading.Event()
+    running = set()
+    times = []
+    failed = []
+    started = itertools.count()
+
+    def run_copy():
+        while not stop.is_set():
+            with lock:
+                # A copy stopped while waiting for the lock mustn't start
+                # after the others were terminated
+                if stop.is_set():
+                    return
+                index = next(started)
+                if repeat and index >= repeat:
+                    return
+                proc = cmd.run_tests()[0]
+                running.add(proc)
+            start = time.time()
+            data = proc.stdout.read()
+            proc.wait()
+            elapsed = time.time() - start
+            with lock:
+                running.discard(proc)
+                if stop.is_set():
+                    return
+            summary = testtools.StreamSummary()
+            summary.startTestRun()
+            try:
+                subunit.ByteStreamToStreamResult(
+                    six.BytesIO(data), non_subunit_name='stdout').run(summary)
+            finally:
+                summary.stopTestRun()
+            with lock:
+                if summary.wasSuccessful() and proc.returncode == 0:
+                    times.append(elapsed)
+                    continue
+                failed.append(data)
+                stop.set()
+                # Stop every other copy, their results are discarded
+                for other in running:
+                    other.terminate()
+                return
+
+    cmd.setUp()
+    try:
+        if cmd.test_ids is not None and not cmd.test_ids:
+            stdout.write("The specified regex doesn't match with anything")
+            return 1
+        if cmd.resource_callback is not None and (
+                cmd.test_ids is None or
+                any(cmd.resource_callback(x) for x in cmd.test_ids)):
+            # NOTE: Every copy runs all of the tests, copies running at the
+            # same time would run the tests holding a resource concurrently.
+            concurrency = 1
+        workers = [threading.Thread(target=run_copy)
+                   for _ in range(concurrency)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+    finally:
+        cmd.cleanUp()
+    result = 0
+    if failed:
+        result = load.load(in_streams=[('subunit', six.BytesIO(failed[0]))],
+                           subunit_out=subunit_out, repo_type=repo_type,
+                           repo_url=repo_url, run_id=combine_id,
+                           pretty_out=pretty_out, color=color, stdout=stdout,
+                           abbreviate=abbreviate, attachments=attachments,
+                           spill_failures=spill_failures)
+    iterations = len(times) + len(failed)
+    table = [('iterations', 'failures', 'min time', 'mean time', 'max time')]
+    if times:
+        table.append((iterations, len(failed), '%.3fs' % min(times),
+                      '%.3fs' % (sum(times) / len(times)),
+                      '%.3fs' % max(times)))
+    else:
+        table.append((iterations, len(failed), '-', '-', '-'))
+    stdout.write('\n')
+    output.output_table(table, output=stdout)
+    return result or (1 if failed else 0)
 
 
 def _run_tests(cmd, failing, analyze_isolation, isolated, until_failure,
                subunit_out=False, combine_id=None, repo_type='file',
-               repo_url=None, pretty_out=True, color=False, stdout=sys.stdout):
-    """Run the tests cmd was parameterised with."""
-    cmd.setUp()
+               repo_url=None, pretty_out=True, color=False, stdout=sys.stdout,
+               abbreviate=False, progress=False, attachments=None,
+               spill_failures=False, return_id=False):
+    """Run the tests cmd was parameterised with.
+
+    :param bool return_id: Return the id of the run the results were stored
+        in along with the return code. This can't be combined with
+        until_failure.
+    """
+    import subunit
+    import testtools
+    from stestr.commands import load
+    from stestr import output
+
+    with instrumentation.span('test_processor.setup'):
+        cmd.setUp()
     try:
         def run_tests():
             run_procs = [('subunit',
                           output.ReturnCodeToSubunit(
                               proc)) for proc in cmd.run_tests()]
             partial = False
-            if (failing or analyze_isolation or isolated):
+            if (failing or analyze_isolation or isolated or cmd.shard):
                 partial = True
             if not run_procs:
                 stdout.write("The specified regex doesn't match with anything")
-                return 1
+                return (1, None) if return_id else 1
             return load.load((None, None), in_streams=run_procs,
                              partial=partial, subunit_out=subunit_out,
                              repo_type=repo_type,
                              repo_url=repo_url, run_id=combine_id,
-                             pretty_out=pretty_out, color=color, stdout=stdout)
+                             pretty_out=pretty_out, color=color, stdout=stdout,
+                             abbreviate=abbreviate, progress=progress,
+                             partitions=cmd.partitions,
+                             attachments=attachments,
+                             spill_failures=spill_failures,
+                             return_id=return_id)
 
         if not until_failure:
             return run_tests()
@@ -515,4 +738,9 @@ def run(arguments):
         worker_path=args.worker_path, blacklist_file=args.blacklist_file,
         whitelist_file=args.whitelist_file, black_regex=args.black_regex,
         no_discover=args.no_discover, random=args.random, combine=args.combine,
-        filters=filters, pretty_out=pretty_out, color=args.color)
+        filters=filters, pretty_out=pretty_out, color=args.color,
+        abbreviate=args.abbreviate, progress=args.progress,
+        repeat=args.repeat, parallel_repeats=args.parallel_repeats,
+        retry=args.retry, resource_usage=args.resource_usage,
+        shard=args.shard, attachments=args.attachments,
+        spill_failures=args.spill_failures)
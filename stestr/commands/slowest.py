@@ -16,7 +16,6 @@ import math
 from operator import itemgetter
 import sys
 
-from stestr import output
 from stestr.repository import util
 
 
@@ -33,6 +32,10 @@ def set_cli_opts(parser):
     parser.add_argument(
         "--all", action="store_true",
         default=False, help="Show timing for all tests."),
+    parser.add_argument(
+        "--resources", action="store_true", default=False,
+        help="Also show the CPU time, peak memory and storage I/O of each "
+             "test, for runs made with 'stestr run --resource-usage'.")
 
 
 def format_times(times):
@@ -51,14 +54,33 @@ def format_times(times):
     return times
 
 
+def _format_bytes(count):
+    for unit in ('B', 'KiB', 'MiB'):
+        if count < 1024:
+            return '%d %s' % (count, unit)
+        count /= 1024.0
+    return '%.1f GiB' % count
+
+
+def format_resources(usage):
+    """Format the resource usage of a test as table columns."""
+    if usage is None:
+        return ('', '', '', '')
+    cpu = (usage.get('user', 0) + usage.get('sys', 0) +
+           usage.get('children_user', 0) + usage.get('children_sys', 0))
+    return ('%.3f' % cpu, _format_bytes(usage.get('max_rss', 0) * 1024),
+            _format_bytes(usage.get('read_bytes', 0)),
+            _format_bytes(usage.get('write_bytes', 0)))
+
+
 def run(arguments):
     args = arguments[0]
     return slowest(repo_type=args.repo_type, repo_url=args.repo_url,
-                   show_all=args.all)
+                   show_all=args.all, show_resources=args.resources)
 
 
 def slowest(repo_type='file', repo_url=None, show_all=False,
-            stdout=sys.stdout):
+            stdout=sys.stdout, show_resources=False):
     """Print the slowest times from the last run in the repository
 
     This function will print to STDOUT the 10 slowests tests in the last run.
@@ -71,11 +93,15 @@ def slowest(repo_type='file', repo_url=None, show_all=False,
     :param bool show_all: Show timing for all tests.
     :param file stdout: The output file to write all output to. By default
         this is sys.stdout
+    :param bool show_resources: Also show the CPU time (user, sys and child
+        processes), peak memory and storage I/O recorded for each test.
 
     :return return_code: The exit code for the command. 0 for success and > 0
         for failures.
     :rtype: int
     """
+    from stestr import output
+    from stestr import utils
 
     repo = util.get_repo_open(repo_type, repo_url)
     try:
@@ -93,5 +119,12 @@ def slowest(repo_type='file', repo_url=None, show_all=False,
         known_times = format_times(known_times)
         header = ('Test id', 'Runtime (s)')
         rows = [header] + known_times
+        if show_resources:
+            resources = repo.get_test_resources(latest_id)
+            header += ('CPU (s)', 'Peak RSS', 'Read', 'Written')
+            rows = [header] + [
+                row + format_resources(resources.get(
+                    row[0], resources.get(utils.cleanup_test_name(row[0]))))
+                for row in known_times]
         output.output_table(rows, output=stdout)
     return 0
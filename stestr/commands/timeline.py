@@ -0,0 +1,174 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Export the timeline of a test run as a Chrome trace."""
+
+import calendar
+import json
+import sys
+
+from stestr.repository import util
+
+# The colors used by the trace viewers for each test status
+_COLORS = {
+    'success': 'good',
+    'fail': 'terrible',
+    'skip': 'grey',
+    'xfail': 'yellow',
+    'uxsuccess': 'bad',
+}
+
+
+def get_cli_help():
+    help_str = """Export the timeline of a test run as a Chrome trace.
+
+    The last run is used unless a run id is given. The trace has a track for
+    each worker with a slice for each test and for the gaps between tests,
+    and can be viewed in chrome://tracing or https://ui.perfetto.dev.
+    """
+    return help_str
+
+
+def set_cli_opts(parser):
+    parser.add_argument('--output', '-o', default=None,
+                        help='The file to write the trace to. By default '
+                             'it is written to stdout.')
+
+
+def run(arguments):
+    args = arguments[0]
+    run_id = arguments[1][0] if arguments[1] else None
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            return timeline(run_id=run_id, repo_type=args.repo_type,
+                            repo_url=args.repo_url, stdout=output_file)
+    return timeline(run_id=run_id, repo_type=args.repo_type,
+                    repo_url=args.repo_url)
+
+
+def _to_us(timestamp):
+    return (calendar.timegm(timestamp.utctimetuple()) * 1000000 +
+            timestamp.microsecond)
+
+
+class TimelineWriter(object):
+    """Write trace events for the tests of a run as they are seen.
+
+    Only the end of the last test seen on each worker is kept, so the memory
+    used doesn't depend on the number of tests in the run.
+
+    :param stream: The text file object to write the JSON trace to
+    :param str name: The name of the run, used for the process name
+    """
+
+    def __init__(self, stream, name):
+        self.stream = stream
+        self.name = name
+        self.tests = 0
+        # (worker -> microseconds the last test on the worker stopped at)
+        self._last_stop = {}
+        self._first = True
+
+    def _write(self, event):
+        if not self._first:
+            self.stream.write(',\n')
+        self._first = False
+        self.stream.write(json.dumps(event, sort_keys=True))
+
+    def start(self):
+        self.stream.write('{"displayTimeUnit": "ms", "traceEvents": [\n')
+        self._write({'name': 'process_name', 'ph': 'M', 'pid': 0,
+                     'args': {'name': self.name}})
+
+    def _slice(self, name, worker, start, stop, cat, args, cname=None):
+        event = {'name': name, 'cat': cat, 'ph': 'X', 'pid': 0,
+                 'tid': worker, 'ts': start, 'dur': stop - start,
+                 'args': args}
+        if cname:
+            event['cname'] = cname
+        self._write(event)
+
+    def add_test(self, test_dict):
+        from stestr import subunit_trace
+
+        start, stop = test_dict['timestamps']
+        if test_dict['status'] == 'exists' or None in (start, stop):
+            return
+        self.tests += 1
+        worker = subunit_trace.find_worker(test_dict)
+        start, stop = _to_us(start), _to_us(stop)
+        if worker not in self._last_stop:
+            self._write({'name': 'thread_name', 'ph': 'M', 'pid': 0,
+                         'tid': worker,
+                         'args': {'name': 'worker-%d' % worker}})
+        else:
+            last_stop = self._last_stop[worker]
+            if start > last_stop:
+                self._slice('gap', worker, last_stop, start, 'gap',
+                            {'seconds': (start - last_stop) / 1e6},
+                            cname='white')
+        self._last_stop[worker] = max(stop, self._last_stop.get(worker, 0))
+        self._slice(test_dict['id'], worker, start, stop, 'test',
+                    {'status': test_dict['status']},
+                    cname=_COLORS.get(test_dict['status']))
+
+    def finish(self):
+        # Show how long each worker sat idle waiting for the slowest one
+        if self._last_stop:
+            end = max(self._last_stop.values())
+            for worker, last_stop in sorted(self._last_stop.items()):
+                if last_stop < end:
+                    self._slice('idle', worker, last_stop, end, 'gap',
+                                {'seconds': (end - last_stop) / 1e6},
+                                cname='grey')
+        self.stream.write('\n]}\n')
+
+
+def timeline(run_id=None, repo_type='file', repo_url=None, stdout=sys.stdout):
+    """Write the timeline of a test run in the Chrome trace event format
+
+    Each worker of the run is a track in the trace, with a slice for each
+    test it ran, a slice for each gap between tests and an idle slice from
+    its last test to the end of the run.
+
+    :param run_id: The id of the run to export, by default the latest run is
+        used
+    :param str repo_type: This is the type of repository to use. Valid choices
+        are 'file' and 'sql'.
+    :param str repo_url: The url of the repository to use.
+    :param file stdout: The output file to write the trace to. By default
+        this is sys.stdout
+
+    :return return_code: The exit code for the command. 0 for success and > 0
+        for failures.
+    :rtype: int
+    """
+    import testtools
+
+    repo = util.get_repo_open(repo_type, repo_url)
+    try:
+        if run_id is None:
+            run_id = repo.latest_id()
+        test_run = repo.get_test_run(run_id)
+    except KeyError:
+        sys.stderr.write('No test run found\n')
+        return 3
+    writer = TimelineWriter(stdout, 'stestr run %s' % run_id)
+    writer.start()
+    result = testtools.StreamToDict(writer.add_test)
+    result.startTestRun()
+    try:
+        test_run.get_test().run(result)
+    finally:
+        result.stopTestRun()
+    writer.finish()
+    return 0
@@ -0,0 +1,133 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+
+"""Export and import the timing data of a repository."""
+
+import sys
+
+from stestr.repository import util
+from stestr import timing
+
+
+def get_cli_help():
+    help_str = """Export or import the timing data of the repository.
+
+    'timing export [FILE]' writes the estimated duration and number of samples
+    of every test to a portable timing file, or to stdout. 'timing import
+    FILE...' merges timing files into the repository, averaging the estimates
+    of tests which are already timed by their number of samples, and creates
+    the repository if needed. This can be used to seed the scheduler on new
+    machines without copying the whole repository.
+    """
+    return help_str
+
+
+def set_cli_opts(parser):
+    parser.add_argument('action', choices=['export', 'import'],
+                        help='Whether to export or import timing data')
+    parser.add_argument('files', nargs='*', metavar='FILE',
+                        help='The timing file to export to, or the timing '
+                             'files to import. Stdout and stdin are used if '
+                             'no file or - is given.')
+
+
+def run(arguments):
+    args = arguments[0]
+    if args.action == 'export':
+        if len(args.files) > 1:
+            sys.stderr.write('Only one timing file can be exported to\n')
+            return 1
+        path = args.files[0] if args.files else None
+        return timing_export(path, repo_type=args.repo_type,
+                             repo_url=args.repo_url)
+    return timing_import(args.files or None, repo_type=args.repo_type,
+                         repo_url=args.repo_url)
+
+
+def timing_export(path=None, repo_type='file', repo_url=None,
+                  stdout=sys.stdout):
+    """Export the timing data of a repository to a timing file
+
+    :param str path: The path to write the timing file to. If it's None or
+        '-' the timing data is written to stdout.
+    :param str repo_type: This is the type of repository to use. Valid choices
+        are 'file' and 'sql'.
+    :param str repo_url: The url of the repository to use.
+    :param file stdout: The output file to write the timing data to when no
+        path is given. By default this is sys.stdout
+
+    :return return_code: The exit code for the command. 0 for success and > 0
+        for failures.
+    :rtype: int
+    """
+    from stestr.repository import abstract as repository
+
+    try:
+        repo = util.get_repo_open(repo_type, repo_url)
+    except repository.RepositoryNotFound as e:
+        sys.stderr.write('%s\n' % e)
+        return 1
+    timing_data = repo.get_timing_data()
+    if path is None or path == '-':
+        timing.dump(timing_data, stdout)
+    else:
+        with open(path, 'w') as timing_file:
+            timing.dump(timing_data, timing_file)
+    return 0
+
+
+def timing_import(paths=None, repo_type='file', repo_url=None,
+                  stdin=sys.stdin, stdout=sys.stdout):
+    """Merge timing files into a repository
+
+    The repository is created if it doesn't exist. The estimate of a test
+    which already has timing data is averaged with the imported one, weighted
+    by their number of samples.
+
+    :param list paths: The paths of the timing files to import. If it's None
+        or a path is '-' the timing data is read from stdin.
+    :param str repo_type: This is the type of repository to use. Valid choices
+        are 'file' and 'sql'.
+    :param str repo_url: The url of the repository to use.
+    :param file stdin: The input file to read timing data from when no path
+        is given. By default this is sys.stdin
+    :param file stdout: The output file to write all output to. By default
+        this is sys.stdout
+
+    :return return_code: The exit code for the command. 0 for success and > 0
+        for failures.
+    :rtype: int
+    """
+    from stestr.repository import abstract as repository
+
+    try:
+        repo = util.get_repo_open(repo_type, repo_url)
+    except repository.RepositoryNotFound:
+        repo = util.get_repo_initialise(repo_type, repo_url)
+    for path in paths or ['-']:
+        try:
+            if path == '-':
+                timing_data = timing.load(stdin)
+            else:
+                with open(path) as timing_file:
+                    timing_data = timing.load(timing_file)
+        except timing.TimingFileError as e:
+            sys.stderr.write('%s: %s\n' % (path, e))
+            return 1
+        except (IOError, OSError) as e:
+            sys.stderr.write('%s: %s\n' % (path, e.strerror or e))
+            return 1
+        repo.merge_timing_data(timing_data)
+        stdout.write('Imported timing data for %d tests from %s\n'
+                     % (len(timing_data), path))
+    return 0
@@ -0,0 +1,217 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Run the tests impacted by changes to the source tree as they happen."""
+
+import os
+import re
+import sys
+
+from stestr.repository import util
+from stestr import watcher
+
+
+def get_cli_help():
+    help_str = """Watch the source tree and run the tests impacted by changes.
+
+    Every time python files under the top dir change, the tests which were
+    failing are run first, then the test modules which import the changed
+    files, directly or not. Each of these runs is stored in the repository as
+    a partial run. Press Ctrl-C to stop watching.
+    """
+    return help_str
+
+
+def set_cli_opts(parser):
+    parser.add_argument("--interval", type=float, default=1.0,
+                        help="The number of seconds between checks for "
+                             "changes when polling the source tree. inotify "
+                             "is used instead of polling if the "
+                             "inotify_simple package is installed.")
+    parser.add_argument("--concurrency", action="store", default=0,
+                        type=int,
+                        help="How many processes to use. The default (0) "
+                             "autodetects your CPU count.")
+    parser.add_argument('--no-subunit-trace', action='store_true',
+                        default=False,
+                        help='Disable the default subunit-trace output filter')
+    parser.add_argument('--color', action='store_true', default=False,
+                        help='Enable color output in the subunit-trace output,'
+                             ' if subunit-trace output is enabled. (this is '
+                             'the default). If subunit-trace is disable this '
+                             ' does nothing.')
+    parser.add_argument('--abbreviate', action='store_true',
+                        dest='abbreviate',
+                        help='Print one character status for each test')
+
+
+def run(arguments):
+    args = arguments[0]
+    pretty_out = not args.no_subunit_trace
+    return watch(config=args.config, repo_type=args.repo_type,
+                 repo_url=args.repo_url, test_path=args.test_path,
+                 top_dir=args.top_dir, group_regex=args.group_regex,
+                 concurrency=args.concurrency, interval=args.interval,
+                 pretty_out=pretty_out, color=args.color,
+                 abbreviate=args.abbreviate)
+
+
+def _find_failing(repo):
+    import testtools
+
+    ids = []
+
+    def gather_errors(test_dict):
+        if test_dict['status'] == 'fail':
+            ids.append(test_dict['id'])
+
+    result = testtools.StreamToDict(gather_errors)
+    result.startTestRun()
+    try:
+        repo.get_failing().get_test().run(result)
+    finally:
+        result.stopTestRun()
+    return [x for x in ids if x != 'process-returncode']
+
+
+def _get_paths(conf, test_path, top_dir):
+    if not test_path and conf.parser.has_option('DEFAULT', 'test_path'):
+        test_path = conf.parser.get('DEFAULT', 'test_path')
+    if not top_dir and conf.parser.has_option('DEFAULT', 'top_dir'):
+        top_dir = conf.parser.get('DEFAULT', 'top_dir')
+    return test_path, top_dir or './'
+
+
+def _load_run(cmd, repo_type, repo_url, pretty_out, color, stdout,
+              abbreviate):
+    from stestr.commands import load
+    from stestr import output
+
+    cmd.setUp()
+    try:
+        run_procs = [('subunit', output.ReturnCodeToSubunit(proc))
+                     for proc in cmd.run_tests()]
+        if not run_procs:
+            return 0
+        return load.load(in_streams=run_procs, partial=True,
+                         repo_type=repo_type, repo_url=repo_url,
+                         pretty_out=pretty_out, color=color, stdout=stdout,
+                         abbreviate=abbreviate)
+    finally:
+        cmd.cleanUp()
+
+
+def watch(config='.stestr.conf', repo_type='file', repo_url=None,
+          test_path=None, top_dir=None, group_regex=None, concurrency=0,
+          interval=1.0, pretty_out=True, color=False, stdout=sys.stdout,
+          abbreviate=False, cycles=None):
+    """Run the tests impacted by changes to the source tree as they happen
+
+    This function watches the python files under the top dir. After every
+    change it runs the tests which were failing, then the test modules under
+    the test path which import the changed files, directly or not, and loads
+    each run into the repository as a partial run.
+
+    :param str config: The path to the stestr config file. Must be a string.
+    :param str repo_type: This is the type of repository to use. Valid choices
+        are 'file' and 'sql'.
+    :param str repo_url: The url of the repository to use.
+    :param str test_path: Set the test path to use for unittest discovery.
+        If both this and the corresponding config file option are set, this
+        value will be used.
+    :param str top_dir: The top dir to use for unittest discovery and the
+        directory which is watched. This takes precedence over the value in
+        the config file. (if one is present in the config file)
+    :param str group_regex: Set a group regex to use for grouping tests
+        together in the stestr scheduler.
+    :param int concurrency: How many processes to use. The default (0)
+        autodetects your CPU count and uses that.
+    :param float interval: The number of seconds between checks for changes
+        when polling.
+    :param bool pretty_out: Use the subunit-trace output filter
+    :param bool color: Enable colorized output in subunit-trace
+    :param file stdout: The file object to write all output to. By default this
+        is sys.stdout
+    :param bool abbreviate: Print one character status for each test in the
+        subunit-trace output
+    :param int cycles: Stop after handling this many changes. By default
+        changes are handled until the command is interrupted.
+
+    :return return_code: The exit code for the command. 0 if the last tests
+        run passed and 1 otherwise.
+    :rtype: int
+    """
+    from stestr import config_file
+    from stestr.repository import abstract as repository
+
+    conf = config_file.TestrConf(config)
+    test_path, top_dir = _get_paths(conf, test_path, top_dir)
+    if not test_path:
+        stdout.write("No test_path can be found in either the command line "
+                     "options nor in the specified config file %s.\n" %
+                     config)
+        return 1
+    try:
+        repo = util.get_repo_open(repo_type, repo_url)
+    except repository.RepositoryNotFound:
+        repo = util.get_repo_initialise(repo_type, repo_url)
+    test_dir = os.path.abspath(test_path)
+    graph = watcher.ImportGraph(top_dir)
+    source_watcher = watcher.get_watcher(top_dir, interval)
+    stdout.write('Watching %s for changes (%s), press Ctrl-C to stop\n' % (
+        top_dir, source_watcher.method))
+    stdout.flush()
+    result = 0
+    try:
+        while cycles is None or cycles > 0:
+            if cycles is not None:
+                cycles -= 1
+            changed = source_watcher.wait()
+            graph.update(changed)
+            changed_modules = set(
+                watcher.module_name(x, top_dir) for x in changed) - set([None])
+            impacted = graph.impacted(changed_modules)
+            impacted = sorted(
+                module for path, module in graph.modules.items()
+                if module in impacted and
+                os.path.abspath(path).startswith(test_dir + os.sep))
+            failing = _find_failing(repo)
+            stdout.write('\n%d files changed, running %d failing tests and '
+                         '%d test modules\n' % (len(changed), len(failing),
+                                                len(impacted)))
+            result = 0
+            if failing:
+                cmd = conf.get_run_command(
+                    failing, group_regex=group_regex, repo_type=repo_type,
+                    repo_url=repo_url, concurrency=concurrency,
+                    test_path=test_path, top_dir=top_dir)
+                result = _load_run(cmd, repo_type, repo_url, pretty_out,
+                                   color, stdout, abbreviate)
+            if impacted:
+                regexes = ['^%s\\.' % re.escape(x) for x in impacted]
+                black_regex = None
+                if failing:
+                    black_regex = '|'.join(
+                        '^%s$' % re.escape(x) for x in failing)
+                cmd = conf.get_run_command(
+                    regexes=regexes, group_regex=group_regex,
+                    repo_type=repo_type, repo_url=repo_url,
+                    concurrency=concurrency, black_regex=black_regex,
+                    test_path=test_path, top_dir=top_dir)
+                result = _load_run(cmd, repo_type, repo_url, pretty_out,
+                                   color, stdout, abbreviate) or result
+            stdout.flush()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        source_watcher.close()
+    return result
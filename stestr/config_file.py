@@ -15,7 +15,9 @@ import sys
 
 from six.moves import configparser
 
+from stestr import attachment_policy
 from stestr.repository import util
+from stestr import scheduler
 from stestr import test_processor
 
 
@@ -38,7 +40,8 @@ class TestrConf(object):
                         serial=False, worker_path=None,
                         concurrency=0, blacklist_file=None,
                         whitelist_file=None, black_regex=None,
-                        randomize=False):
+                        randomize=False, isolated=False,
+                        resource_usage=False, shard=None):
         """Get a test_processor.TestProcessorFixture for this config file
 
         Any parameters about running tests will be used for initialize the
@@ -81,6 +84,13 @@ class TestrConf(object):
             test list.
         :param bool randomize: Randomize the test order after they are
             partitioned into separate workers
+        :param bool isolated: Run each test in its own process, with up to
+            concurrency of those processes running at once
+        :param bool resource_usage: Run the tests with
+            stestr.resource_runner, which attaches the resources used by
+            each test to its results
+        :param tuple shard: An optional tuple of (index, total) to only run
+            one shard of the tests, see scheduler.shard_tests
 
         :returns: a TestProcessorFixture object for the specified config file
             and any arguments passed into this function
@@ -101,8 +111,9 @@ class TestrConf(object):
             top_dir = './'
 
         python = 'python' if sys.platform == 'win32' else '${PYTHON:-python}'
-        command = "%s -m subunit.run discover -t" \
-                  " %s %s $LISTOPT $IDOPTION" % (python, top_dir, test_path)
+        runner = 'stestr.resource_runner' if resource_usage else 'subunit.run'
+        command = "%s -m %s discover -t %s %s $LISTOPT $IDOPTION" % (
+            python, runner, top_dir, test_path)
         listopt = "--list"
         idoption = "--load-list $IDFILE"
         # If the command contains $IDOPTION read that command from config
@@ -117,6 +128,17 @@ class TestrConf(object):
                     return match.group(0)
         else:
             group_callback = None
+        # Each option of the resources section is an exclusive resource,
+        # with one regex per line matching the tests which hold it
+        resource_callback = None
+        if self.parser.has_section('resources'):
+            resources = {}
+            for name in self.parser.options('resources'):
+                if self.parser.has_option('DEFAULT', name):
+                    continue
+                lines = self.parser.get('resources', name).splitlines()
+                resources[name] = [x.strip() for x in lines if x.strip()]
+            resource_callback = scheduler.get_resource_callback(resources)
 
         # Handle the results repository
         repository = util.get_repo_open(repo_type, repo_url)
@@ -125,4 +147,28 @@ class TestrConf(object):
             test_filters=regexes, group_callback=group_callback, serial=serial,
             worker_path=worker_path, concurrency=concurrency,
             blacklist_file=blacklist_file, black_regex=black_regex,
-            whitelist_file=whitelist_file, randomize=randomize)
+            whitelist_file=whitelist_file, randomize=randomize,
+            isolated=isolated, shard=shard,
+            resource_callback=resource_callback)
+
+    def get_attachment_policy(self, attachments=None):
+        """Get the attachment policy to store test runs with
+
+        :param str attachments: The attachment policy, 'all', 'failures' or a
+            number of KiB. If both this and the corresponding config file
+            option are set this value will be used.
+
+        :return: The policy as returned by attachment_policy.parse()
+        """
+        if not attachments and self.parser.has_option('DEFAULT',
+                                                      'attachments'):
+            attachments = self.parser.get('DEFAULT', 'attachments')
+        if not attachments:
+            return None
+        try:
+            return attachment_policy.parse(attachments)
+        except ValueError as e:
+            print("{0}. Please fix either the --attachments argument or the "
+                  "attachments option in the config file {1}".format(
+                      e, self.config_file))
+            sys.exit(1)
@@ -0,0 +1,132 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Record how long the phases of a stestr command take.
+
+When recording is enabled, every :func:`span` records its wall clock and CPU
+time, and the spans are written out as a JSON file in the Chrome trace event
+format, which can be loaded in chrome://tracing or https://ui.perfetto.dev.
+When recording isn't enabled :func:`span` does nothing.
+"""
+
+import contextlib
+import json
+import os
+import threading
+import time
+
+# The environment variable which enables recording, set to the report path
+ENV_VAR = 'STESTR_PROFILE'
+
+_recorder = None
+
+if hasattr(time, 'thread_time'):
+    _cpu_time = time.thread_time
+elif hasattr(time, 'process_time'):
+    _cpu_time = time.process_time
+else:
+    _cpu_time = time.clock
+
+
+class Recorder(object):
+    """Collect spans and write them out as a Chrome trace.
+
+    :param str path: The path to write the trace to
+    :param bool cprofile: Also profile the process with cProfile, and dump
+        the profile to path with a .prof suffix
+    """
+
+    def __init__(self, path, cprofile=False):
+        self.path = path
+        self.events = []
+        self._lock = threading.Lock()
+        self._origin = time.time()
+        self._profile = None
+        if cprofile:
+            import cProfile
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+
+    def add(self, name, start, wall, cpu, args=None):
+        """Record a span.
+
+        :param str name: The name of the span
+        :param float start: The time.time() the span started at
+        :param float wall: The wall clock duration of the span in seconds
+        :param float cpu: The CPU time of the thread during the span in
+            seconds
+        :param dict args: Extra details to show with the span
+        """
+        event_args = dict(args or {})
+        event_args['cpu_ms'] = round(cpu * 1000, 3)
+        event = {
+            'name': name,
+            'cat': 'stestr',
+            'ph': 'X',
+            'ts': int((start - self._origin) * 1e6),
+            'dur': int(wall * 1e6),
+            'pid': os.getpid(),
+            'tid': threading.current_thread().ident,
+            'args': event_args,
+        }
+        with self._lock:
+            self.events.append(event)
+
+    def write(self):
+        """Write the trace, and the cProfile dump if enabled."""
+        if self._profile is not None:
+            self._profile.disable()
+            self._profile.dump_stats(self.path + '.prof')
+        with self._lock:
+            events = sorted(self.events, key=lambda x: x['ts'])
+        with open(self.path, 'w') as trace_file:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'},
+                      trace_file, indent=1)
+
+
+def enable(path, cprofile=False):
+    """Start recording spans, to be written to path by disable()."""
+    global _recorder
+    _recorder = Recorder(path, cprofile=cprofile)
+    return _recorder
+
+
+def disable():
+    """Stop recording spans and write out the report, if recording."""
+    global _recorder
+    recorder, _recorder = _recorder, None
+    if recorder is not None:
+        recorder.write()
+
+
+def enabled():
+    return _recorder is not None
+
+
+@contextlib.contextmanager
+def span(name, **args):
+    """Record the time taken by the body of a with statement.
+
+    :param str name: The name of the span, like 'list_tests'
+    :param args: Extra details to show with the span in the report
+    """
+    recorder = _recorder
+    if recorder is None:
+        yield
+        return
+    start = time.time()
+    start_cpu = _cpu_time()
+    try:
+        yield
+    finally:
+        recorder.add(name, start, time.time() - start,
+                     _cpu_time() - start_cpu, args)
@@ -28,6 +28,8 @@ the initialize function in the appropriate repository module.
 
 from testtools import StreamToDict
 
+from stestr import resource_runner
+
 
 class AbstractRepositoryFactory(object):
     """Interface for making or opening repositories."""
@@ -67,7 +69,7 @@ class AbstractRepository(object):
         """
         raise NotImplementedError(self.get_failing)
 
-    def get_inserter(self, partial=False, run_id=None):
+    def get_inserter(self, partial=False, run_id=None, attachments=None):
         """Get an inserter that will insert a test run into the repository.
 
         Repository implementations should implement _get_inserter.
@@ -77,13 +79,16 @@ class AbstractRepository(object):
 
         :param partial: If True, the stream being inserted only executed some
             tests rather than all the projects tests.
+        :param int attachments: The attachment policy to store the stream
+            with, as returned by stestr.attachment_policy.parse(). By default
+            every attachment is stored.
         :return an inserter: Inserters meet the extended TestResult protocol
             that testtools 0.9.2 and above offer. The startTestRun and
             stopTestRun methods in particular must be called.
         """
-        return self._get_inserter(partial, run_id)
+        return self._get_inserter(partial, run_id, attachments)
 
-    def _get_inserter(self, partial=False, run_id=None):
+    def _get_inserter(self, partial=False, run_id=None, attachments=None):
         """Get an inserter for get_inserter.
 
         The result is decorated with an AutoTimingTestResultDecorator.
@@ -129,6 +134,29 @@ class AbstractRepository(object):
         """
         raise NotImplementedError(self._get_test_times)
 
+    def get_timing_data(self):
+        """Return the timing data of every test in the repository.
+
+        :return: A dict mapping test ids to a tuple of the estimated time of
+            the test in seconds and the number of samples the estimate is
+            based on. This is the format read and written by
+            :mod:`stestr.timing`.
+        """
+        raise NotImplementedError(self.get_timing_data)
+
+    def merge_timing_data(self, timing_data):
+        """Merge timing data, like from another repository, into this one.
+
+        The estimates of tests which already have timing data are averaged
+        with the new ones, weighted by their number of samples, see
+        :func:`stestr.timing.merge`.
+
+        :param dict timing_data: A dict mapping test ids to a tuple of the
+            estimated time of the test in seconds and the number of samples
+            the estimate is based on.
+        """
+        raise NotImplementedError(self.merge_timing_data)
+
     def latest_id(self):
         """Return the run id for the most recently inserted test run."""
         raise NotImplementedError(self.latest_id)
@@ -154,6 +182,49 @@ class AbstractRepository(object):
             result.stopTestRun()
         return ids
 
+    def get_test_resources(self, run_id=None):
+        """Return the resources used by each test in a run.
+
+        Resource usage is only recorded for runs made with
+        ``stestr run --resource-usage``.
+
+        :param run_id: The id of the test run to query, by default the latest
+            run is used.
+        :return: A dict mapping test ids to a dict of the resources used by
+            the test, see :mod:`stestr.resource_runner`. Tests without
+            resource usage are not included.
+        """
+        if run_id is None:
+            run_id = self.latest_id()
+        run = self.get_test_run(run_id)
+        resources = {}
+
+        def gather(test_dict):
+            usage = resource_runner.parse_resources(test_dict['details'])
+            if usage is not None:
+                resources[test_dict['id']] = usage
+
+        result = StreamToDict(gather)
+        result.startTestRun()
+        try:
+            run.get_test().run(result)
+        finally:
+            result.stopTestRun()
+        return resources
+
+    def get_previous_ids(self, run_id, count):
+        """Return the ids of the runs inserted before a run.
+
+        This implementation is for repositories whose run ids count up from
+        0 in the order the runs were inserted.
+
+        :param run_id: The id of the test run
+        :param int count: The maximum number of run ids to return
+        :return: A list of up to count run ids, the most recent first
+        """
+        run_id = int(run_id)
+        return list(range(run_id - 1, max(run_id - count, 0) - 1, -1))
+
 
 class AbstractTestRun(object):
     """A test run that has been stored in a repository.
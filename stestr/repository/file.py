@@ -12,22 +12,37 @@
 
 """Persistent storage of test results."""
 
+import contextlib
 import errno
 from io import BytesIO
 from operator import methodcaller
 import os
+import shutil
 import sys
 import tempfile
+import time
 
+from extras import try_import
 from future.moves.dbm import dumb as my_dbm
 from subunit import TestProtocolClient
 import subunit.v2
 import testtools
 from testtools.compat import _b
 
+from stestr import attachment_policy
+from stestr import instrumentation
 from stestr.repository import abstract as repository
+from stestr import timing
 from stestr import utils
 
+fcntl = try_import('fcntl')
+
+
+def _to_text(value):
+    if isinstance(value, bytes):
+        return value.decode('utf8')
+    return value
+
 
 def atomicish_rename(source, target):
     if os.name != "posix" and os.path.exists(target):
@@ -80,8 +95,33 @@ class Repository(repository.AbstractRepository):
         """
         self.base = base
 
+    @contextlib.contextmanager
+    def _lock(self, name, shared=False):
+        """Hold an advisory lock on the named repository resource.
+
+        The lock is taken with fcntl.flock() on a separate lock file so that
+        the locked resource itself can still be replaced with an atomic
+        rename. Readers of run files and of the failing file never need to
+        take a lock, those are only ever replaced atomically. On platforms
+        without fcntl this is a no-op.
+
+        :param str name: The name of the resource to lock, e.g. 'next-stream'
+        :param bool shared: Take a shared instead of an exclusive lock
+        """
+        if fcntl is None:
+            yield
+            return
+        with open(self._path(name + '.lock'), 'ab') as lock_file:
+            fcntl.flock(lock_file.fileno(),
+                        fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
     def _allocate(self):
-        # XXX: lock the file. K?!
+        # Callers must hold the next-stream lock until the stream for the
+        # allocated id has been renamed into place.
         value = self.count()
         self._write_next_stream(value + 1)
         return value
@@ -115,28 +155,165 @@ class Repository(repository.AbstractRepository):
                 raise
         return _DiskRun(None, run_subunit_content)
 
+    def _open_run(self, run_id):
+        """Return a binary file object with the subunit stream of run_id."""
+        try:
+            return open(os.path.join(self.base, str(run_id)), 'rb')
+        except IOError as e:
+            if e.errno != errno.ENOENT:
+                raise
+        # Not a loose file, it may have been packed by gc().
+        location = self._read_pack_index().get(str(run_id))
+        if location is None:
+            raise KeyError("No such run.")
+        offset, length = location
+        fp = open(self._path('packed'), 'rb')
+        fp.seek(offset)
+        return _PackedRunFile(fp, length)
+
     def get_test_run(self, run_id):
+        # The run is only read from disk when it's used, but make sure it
+        # exists now. It is looked up again when read, in case gc() packed
+        # it in the meantime.
+        self._open_run(run_id).close()
+        return _DiskRun(run_id, opener=lambda: self._open_run(run_id))
+
+    def _loose_run_ids(self):
+        return sorted(int(name) for name in os.listdir(self.base)
+                      if name.isdigit())
+
+    def _read_pack_index(self):
+        """Return a dict of packed run id -> (offset, length)."""
+        index = {}
         try:
-            with open(os.path.join(self.base, str(run_id)), 'rb') as fp:
-                run_subunit_content = fp.read()
+            with open(self._path('packed.idx'), 'rt') as fp:
+                for line in fp:
+                    run_id, offset, length = line.split()[:3]
+                    index[run_id] = (int(offset), int(length))
         except IOError as e:
-            if e.errno == errno.ENOENT:
-                raise KeyError("No such run.")
-            else:
+            if e.errno != errno.ENOENT:
                 raise
-        return _DiskRun(run_id, run_subunit_content)
+        return index
+
+    def gc(self, keep=None, max_age=None):
+        """Pack old runs into a single archive and compact times.dbm.
+
+        Runs are kept as loose files if they are one of the ``keep`` most
+        recent runs or if they are younger than ``max_age``. All other runs
+        are appended to the ``packed`` file and recorded in ``packed.idx``,
+        from where get_test_run() still reads them. The most recent run is
+        always kept loose because ``--combine`` appends to it.
+
+        :param int keep: The number of most recent runs to keep loose.
+        :param float max_age: The age in seconds below which runs are kept
+            loose.
+        :return: A list of the run ids that were packed.
+        """
+        with self._lock('packed'):
+            to_pack = self._pack_candidates(keep, max_age)
+            if to_pack:
+                self._pack(to_pack)
+        self._compact_times()
+        return to_pack
+
+    def _pack_candidates(self, keep, max_age):
+        # Called with the packed lock held, so a concurrent gc can't pack the
+        # same runs. Runs removed since they were listed are skipped.
+        latest = self._next_stream() - 1
+        now = time.time()
+        loose = self._loose_run_ids()
+        if keep:
+            loose = loose[:-keep]
+        to_pack = []
+        for run_id in loose:
+            if run_id == latest:
+                continue
+            try:
+                mtime = os.path.getmtime(self._path(str(run_id)))
+            except OSError as e:
+                if e.errno != errno.ENOENT:
+                    raise
+                continue
+            if max_age is None or now - mtime >= max_age:
+                to_pack.append(run_id)
+        return to_pack
+
+    def _pack(self, run_ids):
+        # The caller holds the packed lock
+        entries = []
+        with open(self._path('packed'), 'ab') as archive:
+            archive.seek(0, os.SEEK_END)
+            for run_id in run_ids:
+                run_path = self._path(str(run_id))
+                mtime = os.path.getmtime(run_path)
+                offset = archive.tell()
+                with open(run_path, 'rb') as run_file:
+                    shutil.copyfileobj(run_file, archive)
+                entries.append('%d %d %d %d\n' % (
+                    run_id, offset, archive.tell() - offset, mtime))
+            archive.flush()
+            # The loose files are removed below, so unlike the rest of the
+            # repository this is worth the disk IO.
+            os.fsync(archive.fileno())
+        index_path = self._path('packed.idx')
+        with open(index_path + '.new', 'wt') as index:
+            if os.path.exists(index_path):
+                with open(index_path, 'rt') as old_index:
+                    shutil.copyfileobj(old_index, index)
+            index.writelines(entries)
+        atomicish_rename(index_path + '.new', index_path)
+        for run_id in run_ids:
+            os.remove(self._path(str(run_id)))
+
+    def _compact_times(self):
+        # dumbdbm only ever appends changed values to its data file, rewrite
+        # it to drop the stale records.
+        with self._lock('times'):
+            for name in ('times.dbm', 'samples.dbm'):
+                self._compact_dbm(name)
+
+    def _compact_dbm(self, name):
+        try:
+            db = my_dbm.open(self._path(name), 'r')
+        except my_dbm.error:
+            return
+        try:
+            values = dict(db.items())
+        finally:
+            db.close()
+        new_path = self._path(name + '.new')
+        db = my_dbm.open(new_path, 'n')
+        try:
+            for key, value in values.items():
+                db[key] = value
+        finally:
+            db.close()
+        for suffix in ('.dat', '.dir'):
+            atomicish_rename(new_path + suffix, self._path(name + suffix))
+        for path in (new_path + '.bak', self._path(name + '.bak')):
+            if os.path.exists(path):
+                os.remove(path)
 
-    def _get_inserter(self, partial, run_id=None):
-        return _Inserter(self, partial, run_id)
+    def _get_inserter(self, partial, run_id=None, attachments=None):
+        return _Inserter(self, partial, run_id, attachments)
 
     def _get_test_times(self, test_ids):
-        # May be too slow, but build and iterate.
+        # dumbdbm rewrites its index file in place, so a shared lock is
+        # needed to avoid reading it half written by a concurrent inserter.
+        with self._lock('times', shared=True):
+            return self._read_test_times(test_ids)
+
+    def _open_dbm(self, name):
         # 'c' because an existing repo may be missing a file.
         try:
-            db = my_dbm.open(self._path('times.dbm'), 'c')
+            return my_dbm.open(self._path(name), 'c')
         except my_dbm.error:
-            os.remove(self._path('times.dbm'))
-            db = my_dbm.open(self._path('times.dbm'), 'c')
+            os.remove(self._path(name))
+            return my_dbm.open(self._path(name), 'c')
+
+    def _read_test_times(self, test_ids):
+        # May be too slow, but build and iterate.
+        db = self._open_dbm('times.dbm')
         try:
             result = {}
             for test_id in test_ids:
@@ -154,67 +331,163 @@ class Repository(repository.AbstractRepository):
         finally:
             db.close()
 
+    def get_timing_data(self):
+        with self._lock('times', shared=True):
+            return self._read_timing_data()
+
+    def _read_timing_data(self):
+        # The sample counts were added after the times, a test without one
+        # was timed by a single run.
+        timing_data = {}
+        times = self._open_dbm('times.dbm')
+        samples = self._open_dbm('samples.dbm')
+        try:
+            for key in times.keys():
+                try:
+                    count = int(samples[key])
+                except KeyError:
+                    count = 1
+                timing_data[_to_text(key)] = (float(times[key]), count)
+        finally:
+            times.close()
+            samples.close()
+        return timing_data
+
+    def merge_timing_data(self, timing_data):
+        with self._lock('times'):
+            merged = timing.merge(self._read_timing_data(), timing_data)
+            times = self._open_dbm('times.dbm')
+            samples = self._open_dbm('samples.dbm')
+            try:
+                for test_id, (duration, count) in merged.items():
+                    if type(test_id) != str:
+                        test_id = test_id.encode('utf8')
+                    times[test_id] = str(duration)
+                    samples[test_id] = str(count)
+            finally:
+                times.close()
+                samples.close()
+
     def _path(self, suffix):
         return os.path.join(self.base, suffix)
 
     def _write_next_stream(self, value):
-        # Note that this is unlocked and not threadsafe : single
-        # user, repo-per-working-tree model makes this acceptable in the short
-        # term. Likewise we don't fsync - this data isn't valuable enough to
-        # force disk IO.
+        # Note that this is unlocked, callers other than initialise() must
+        # hold the next-stream lock. We don't fsync - this data isn't
+        # valuable enough to force disk IO.
         prefix = self._path('next-stream')
         with open(prefix + '.new', 'wt') as stream:
             stream.write('%d\n' % value)
         atomicish_rename(prefix + '.new', prefix)
 
 
+class _PackedRunFile(object):
+    """A read only file object for one run in the packed file."""
+
+    def __init__(self, fp, length):
+        self._fp = fp
+        self._remaining = length
+
+    def read(self, size=-1):
+        if size is None or size < 0 or size > self._remaining:
+            size = self._remaining
+        data = self._fp.read(size)
+        self._remaining -= len(data)
+        return data
+
+    def readline(self, size=-1):
+        if size is None or size < 0 or size > self._remaining:
+            size = self._remaining
+        data = self._fp.readline(size)
+        self._remaining -= len(data)
+        return data
+
+    def close(self):
+        self._fp.close()
+
+
 class _DiskRun(repository.AbstractTestRun):
-    """A test run that was inserted into the repository."""
+    """A test run that was inserted into the repository.
+
+    The run is read from disk each time it is used, a line at a time, so
+    large runs are never held in memory.
+    """
+
+    def __init__(self, run_id, subunit_content=None, opener=None):
+        """Create a _DiskRun.
 
-    def __init__(self, run_id, subunit_content):
-        """Create a _DiskRun with the content subunit_content."""
+        :param run_id: The id of the run
+        :param bytes subunit_content: The subunit v1 content of the run
+        :param opener: Instead of subunit_content, a callable which returns a
+            binary file object with the subunit v1 content of the run
+        """
         self._run_id = run_id
-        self._content = subunit_content
-        assert type(subunit_content) is bytes
+        if opener is None:
+            assert type(subunit_content) is bytes
+
+            def opener():
+                return BytesIO(subunit_content)
+        self._opener = opener
 
     def get_id(self):
         return self._run_id
 
     def get_subunit_stream(self):
         # Transcode - we want V2.
-        v1_stream = BytesIO(self._content)
-        v1_case = subunit.ProtocolTestCase(v1_stream)
-        output = BytesIO()
+        output = tempfile.TemporaryFile()
         output_stream = subunit.v2.StreamResultToBytes(output)
         output_stream = testtools.ExtendedToStreamDecorator(output_stream)
-        output_stream.startTestRun()
+        v1_stream = self._opener()
         try:
-            v1_case.run(output_stream)
+            v1_case = subunit.ProtocolTestCase(v1_stream)
+            output_stream.startTestRun()
+            try:
+                v1_case.run(output_stream)
+            finally:
+                output_stream.stopTestRun()
         finally:
-            output_stream.stopTestRun()
+            v1_stream.close()
         output.seek(0)
         return output
 
     def get_test(self):
-        # case = subunit.ProtocolTestCase(self.get_subunit_stream())
-        case = subunit.ProtocolTestCase(BytesIO(self._content))
-
-        def wrap_result(result):
-            # Wrap in a router to mask out startTestRun/stopTestRun from the
-            # ExtendedToStreamDecorator.
-            result = testtools.StreamResultRouter(
-                result, do_start_stop_run=False)
-            # Wrap that in ExtendedToStreamDecorator to convert v1 calls to
-            # StreamResult.
-            return testtools.ExtendedToStreamDecorator(result)
-        return testtools.DecorateTestCaseResult(
-            case, wrap_result, methodcaller('startTestRun'),
-            methodcaller('stopTestRun'))
+        return _DiskRunCase(self._opener, self._wrap_result)
+
+    def _wrap_result(self, result):
+        # Wrap in a router to mask out startTestRun/stopTestRun from the
+        # ExtendedToStreamDecorator.
+        result = testtools.StreamResultRouter(
+            result, do_start_stop_run=False)
+        # Wrap that in ExtendedToStreamDecorator to convert v1 calls to
+        # StreamResult.
+        return testtools.ExtendedToStreamDecorator(result)
+
+
+class _DiskRunCase(object):
+    """Replay a stored run into a StreamResult, reading it as it goes."""
+
+    def __init__(self, opener, wrap_result):
+        self._opener = opener
+        self._wrap_result = wrap_result
+
+    def run(self, result):
+        stream = self._opener()
+        try:
+            case = subunit.ProtocolTestCase(stream)
+            case = testtools.DecorateTestCaseResult(
+                case, self._wrap_result, methodcaller('startTestRun'),
+                methodcaller('stopTestRun'))
+            case.run(result)
+        finally:
+            stream.close()
+
+    __call__ = run
 
 
 class _SafeInserter(object):
 
-    def __init__(self, repository, partial=False, run_id=None):
+    def __init__(self, repository, partial=False, run_id=None,
+                 attachments=None):
         # XXX: Perhaps should factor into a decorator and use an unaltered
         # TestProtocolClient.
         self._repository = repository
@@ -233,9 +506,9 @@ class _SafeInserter(object):
         self._time = None
         subunit_client = testtools.StreamToExtendedDecorator(
             TestProtocolClient(stream))
-        self.hook = testtools.CopyStreamResult([
+        self.hook = attachment_policy.wrap(testtools.CopyStreamResult([
             subunit_client,
-            testtools.StreamToDict(self._handle_test)])
+            testtools.StreamToDict(self._handle_test)]), attachments)
         self._stream = stream
 
     def _handle_test(self, test_dict):
@@ -252,27 +525,53 @@ class _SafeInserter(object):
         self.hook.stopTestRun()
         self._stream.flush()
         self._stream.close()
+        with instrumentation.span('file.publish'):
+            run_id = self._publish()
+        with instrumentation.span('file.update_times',
+                                  test_ids=len(self._times)):
+            self._update_times()
+        if not self._run_id:
+            self._run_id = run_id
+
+    def _publish(self):
+        """Move the finished stream into place and return its id."""
         run_id = self._name()
         if not self._run_id:
             final_path = os.path.join(self._repository.base, str(run_id))
             atomicish_rename(self.fname, final_path)
-        # May be too slow, but build and iterate.
-        db = my_dbm.open(self._repository._path('times.dbm'), 'c')
-        try:
-            db_times = {}
-            for key, value in self._times.items():
-                if type(key) != str:
-                    key = key.encode('utf8')
-                db_times[key] = value
-            if getattr(db, 'update', None):
-                db.update(db_times)
-            else:
+        return run_id
+
+    def _update_times(self):
+        db_times = {}
+        for key, value in self._times.items():
+            if type(key) != str:
+                key = key.encode('utf8')
+            db_times[key] = value
+        with self._repository._lock('times'):
+            # May be too slow, but build and iterate.
+            db = self._repository._open_dbm('times.dbm')
+            samples = self._repository._open_dbm('samples.dbm')
+            try:
                 for key, value in db_times.items():
+                    # gdbm does not support get().
+                    try:
+                        mean = float(db[key])
+                    except KeyError:
+                        mean = None
+                    try:
+                        count = int(samples[key])
+                    except KeyError:
+                        count = 0 if mean is None else 1
+                    if count:
+                        # Keep the mean of every sample, so a single slow
+                        # run doesn't replace the estimate
+                        value = str(
+                            (mean * count + float(value)) / (count + 1))
                     db[key] = value
-        finally:
-            db.close()
-        if not self._run_id:
-            self._run_id = run_id
+                    samples[key] = str(count + 1)
+            finally:
+                db.close()
+                samples.close()
 
     def status(self, *args, **kwargs):
         self.hook.status(*args, **kwargs)
@@ -292,47 +591,117 @@ class _FailingInserter(_SafeInserter):
     def _name(self):
         return "failing"
 
+    def _update_times(self):
+        # The failures come from a run whose inserter already recorded their
+        # times, recording them again would count them twice.
+        pass
+
+
+def _write_test_dict(result, test_dict):
+    """Send a test dict, as made by testtools.StreamToDict, to result."""
+    test_id = test_dict['id']
+    tags = test_dict['tags'] or None
+    start, stop = test_dict['timestamps']
+    result.status(test_id=test_id, test_status='inprogress', test_tags=tags,
+                  timestamp=start)
+    for name, detail in test_dict['details'].items():
+        result.status(test_id=test_id, file_name=name,
+                      file_bytes=b''.join(detail.iter_bytes()),
+                      mime_type=repr(detail.content_type), eof=True)
+    result.status(test_id=test_id, test_status=test_dict['status'],
+                  test_tags=tags, timestamp=stop)
+
 
 class _Inserter(_SafeInserter):
 
+    def __init__(self, *args, **kwargs):
+        super(_Inserter, self).__init__(*args, **kwargs)
+        # The failures of the run are spooled to a temporary file as they
+        # stream past and only the test ids are kept in memory, so the
+        # failing file is updated without holding the run in memory.
+        self._seen = set()
+        # test id -> the spooled failure which is its result in this run
+        self._failures = {}
+        self._spooled = 0
+        self._failure_file = tempfile.TemporaryFile()
+        self._failure_stream = subunit.v2.StreamResultToBytes(
+            self._failure_file)
+
+    def _handle_test(self, test_dict):
+        super(_Inserter, self)._handle_test(test_dict)
+        test_id = test_dict['id']
+        self._seen.add(test_id)
+        if test_dict['status'] != 'fail':
+            self._failures.pop(test_id, None)
+            return
+        _write_test_dict(self._failure_stream, test_dict)
+        self._failures[test_id] = self._spooled
+        self._spooled += 1
+
     def _name(self):
         if not self._run_id:
             return self._repository._allocate()
         else:
             return self._run_id
 
+    def _publish(self):
+        # Allocating the id and renaming the stream into place happen under
+        # one lock so concurrent inserters never share an id and readers
+        # never see an id whose stream isn't there yet.
+        with self._repository._lock('next-stream'):
+            return super(_Inserter, self)._publish()
+
     def stopTestRun(self):
         super(_Inserter, self).stopTestRun()
-        # XXX: locking (other inserts may happen while we update the failing
-        # file).
-        # Combine failing + this run : strip passed tests, add failures.
-        # use memory repo to aggregate. a bit awkward on layering ;).
-        # Should just pull the failing items aside as they happen perhaps.
-        # Or use a router and avoid using a memory object at all.
-        from stestr.repository import memory
-        repo = memory.Repository()
-        if self.partial:
-            # Seed with current failing
-            inserter = testtools.ExtendedToStreamDecorator(repo.get_inserter())
-            inserter.startTestRun()
-            failing = self._repository.get_failing()
-            failing.get_test().run(inserter)
-            inserter.stopTestRun()
-        inserter = testtools.ExtendedToStreamDecorator(
-            repo.get_inserter(partial=True))
-        inserter.startTestRun()
-        run = self._repository.get_test_run(self.get_id())
-        run.get_test().run(inserter)
-        inserter.stopTestRun()
-        # and now write to failing
-        inserter = _FailingInserter(self._repository)
-        _inserter = testtools.ExtendedToStreamDecorator(inserter)
-        _inserter.startTestRun()
-        try:
-            repo.get_failing().get_test().run(_inserter)
-        except Exception:
-            inserter._cancel()
-            raise
-        else:
-            _inserter.stopTestRun()
+        # Combine failing + this run : strip the tests this run saw, add its
+        # failures.
+        with instrumentation.span('file.update_failing',
+                                  partial=self.partial):
+            try:
+                self._update_failing()
+            finally:
+                self._failure_file.close()
         return self.get_id()
+
+    def _update_failing(self):
+        with self._repository._lock('failing'):
+            inserter = _FailingInserter(self._repository)
+            _inserter = testtools.ExtendedToStreamDecorator(inserter)
+            _inserter.startTestRun()
+            try:
+                if self.partial:
+                    # Keep the current failures of the tests not in this run
+                    def keep(test_dict):
+                        if test_dict['id'] not in self._seen:
+                            testtools.testresult.real.test_dict_to_case(
+                                test_dict).run(_inserter)
+
+                    self._replay(self._repository.get_failing().get_test(),
+                                 keep)
+                spooled = [0]
+
+                def add(test_dict):
+                    # A test which failed more than once in the run has its
+                    # last failure kept
+                    if self._failures.get(test_dict['id']) == spooled[0]:
+                        testtools.testresult.real.test_dict_to_case(
+                            test_dict).run(_inserter)
+                    spooled[0] += 1
+
+                self._failure_file.seek(0)
+                self._replay(
+                    subunit.ByteStreamToStreamResult(self._failure_file), add)
+            except Exception:
+                inserter._cancel()
+                raise
+            else:
+                _inserter.stopTestRun()
+
+    @staticmethod
+    def _replay(case, callback):
+        result = testtools.StreamToDict(callback)
+        result.startTestRun()
+        try:
+            case.run(result)
+        finally:
+            result.stopTestRun()
@@ -21,7 +21,9 @@ from operator import methodcaller
 import subunit
 import testtools
 
+from stestr import attachment_policy
 from stestr.repository import abstract as repository
+from stestr import timing
 
 
 class RepositoryFactory(repository.AbstractRepositoryFactory):
@@ -53,6 +55,7 @@ class Repository(repository.AbstractRepository):
         self._runs = []
         self._failing = OrderedDict()  # id -> test
         self._times = {}  # id -> duration
+        self._samples = {}  # id -> number of durations seen
 
     def count(self):
         return len(self._runs)
@@ -71,8 +74,8 @@ class Repository(repository.AbstractRepository):
             raise KeyError("No tests in repository")
         return result
 
-    def _get_inserter(self, partial, run_id=None):
-        return _Inserter(self, partial, run_id)
+    def _get_inserter(self, partial, run_id=None, attachments=None):
+        return _Inserter(self, partial, run_id, attachments)
 
     def _get_test_times(self, test_ids):
         result = {}
@@ -82,6 +85,16 @@ class Repository(repository.AbstractRepository):
                 result[test_id] = duration
         return result
 
+    def get_timing_data(self):
+        return dict((test_id, (duration, self._samples.get(test_id, 1)))
+                    for test_id, duration in self._times.items())
+
+    def merge_timing_data(self, timing_data):
+        merged = timing.merge(self.get_timing_data(), timing_data)
+        for test_id, (duration, count) in merged.items():
+            self._times[test_id] = duration
+            self._samples[test_id] = count
+
 
 # XXX: Too much duplication between this and _Inserter
 class _Failures(repository.AbstractTestRun):
@@ -127,9 +140,10 @@ class _Failures(repository.AbstractTestRun):
 class _Inserter(repository.AbstractTestRun):
     """Insert test results into a memory repository."""
 
-    def __init__(self, repository, partial, run_id=None):
+    def __init__(self, repository, partial, run_id=None, attachments=None):
         self._repository = repository
         self._partial = partial
+        self._attachments = attachments
         self._tests = []
         # Subunit V2 stream for get_subunit_stream
         self._subunit = None
@@ -138,9 +152,9 @@ class _Inserter(repository.AbstractTestRun):
     def startTestRun(self):
         self._subunit = BytesIO()
         serialiser = subunit.v2.StreamResultToBytes(self._subunit)
-        self._hook = testtools.CopyStreamResult([
+        self._hook = attachment_policy.wrap(testtools.CopyStreamResult([
             testtools.StreamToDict(self._handle_test),
-            serialiser])
+            serialiser]), self._attachments)
         self._hook.startTestRun()
 
     def _handle_test(self, test_dict):
@@ -153,7 +167,16 @@ class _Inserter(repository.AbstractTestRun):
             (duration_delta.microseconds + (
                 duration_delta.seconds + duration_delta.days
                 * 24 * 3600) * 10 ** 6) / 10.0 ** 6)
-        self._repository._times[test_dict['id']] = duration_seconds
+        test_id = test_dict['id']
+        times = self._repository._times
+        samples = self._repository._samples
+        count = samples.get(test_id, 1 if test_id in times else 0)
+        if count:
+            # Keep the mean of every sample, like the file repository
+            duration_seconds = (
+                (times[test_id] * count + duration_seconds) / (count + 1))
+        times[test_id] = duration_seconds
+        samples[test_id] = count + 1
 
     def stopTestRun(self):
         self._hook.stopTestRun()
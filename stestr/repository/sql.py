@@ -15,24 +15,57 @@
 
 import datetime
 import io
+import json
 import os.path
 import re
 import subprocess
 import sys
+import threading
 
 import six
+from six.moves import queue
 import sqlalchemy
 from sqlalchemy import orm
 import subunit.v2
 from subunit2sql.db import api as db_api
+from subunit2sql.db import models
 from subunit2sql import read_subunit
 from subunit2sql import shell
 from subunit2sql import write_subunit
 import testtools
 
+from stestr import attachment_policy
+from stestr import instrumentation
 from stestr.repository import abstract as repository
+from stestr import resource_runner
+from stestr import timing
 from stestr import utils
 
+# The number of test results buffered by the inserter before they are
+# written to the database in a single transaction. This is also used as the
+# number of test ids looked up per query.
+BATCH_SIZE = 500
+
+_session_factories = {}
+_session_factories_lock = threading.Lock()
+
+
+def get_session_factory(url):
+    """Return the session factory for the database at url.
+
+    One engine, and so one connection pool, is created per url and shared by
+    every repository, test run and inserter in the process.
+
+    :param str url: The sqlalchemy url of the database.
+    """
+    with _session_factories_lock:
+        session_factory = _session_factories.get(url)
+        if session_factory is None:
+            engine = sqlalchemy.create_engine(url)
+            session_factory = orm.sessionmaker(bind=engine, autocommit=True)
+            _session_factories[url] = session_factory
+        return session_factory
+
 
 def atomicish_rename(source, target):
     if os.name != "posix" and os.path.exists(target):
@@ -87,8 +120,7 @@ class Repository(repository.AbstractRepository):
         :param base: The path to the repository.
         """
         self.base = url
-        self.engine = sqlalchemy.create_engine(url)
-        self.session_factory = orm.sessionmaker(bind=self.engine)
+        self.session_factory = get_session_factory(url)
 
     # TODO(mtreinish): We need to add a subunit2sql api to get the count
     def count(self):
@@ -116,33 +148,117 @@ class Repository(repository.AbstractRepository):
     def get_test_run(self, run_id):
         return _Subunit2SqlRun(self.base, run_id)
 
-    def _get_inserter(self, partial, run_id=None):
-        return _SqlInserter(self, partial, run_id)
+    def get_previous_ids(self, run_id, count):
+        session = self.session_factory()
+        try:
+            run_key = db_api.get_run_id_from_uuid(run_id, session=session)
+            query = session.query(models.Run.uuid).filter(
+                models.Run.id < run_key).order_by(
+                    models.Run.id.desc()).limit(count)
+            return [uuid for uuid, in query]
+        finally:
+            session.close()
+
+    def get_test_resources(self, run_id=None):
+        session = self.session_factory()
+        try:
+            if run_id is None:
+                run = self._get_latest_run()
+            else:
+                run = db_api.get_run_by_id(
+                    db_api.get_run_id_from_uuid(run_id, session=session),
+                    session=session)
+            query = session.query(
+                models.Test.test_id, models.TestRunMetadata.value).join(
+                    models.TestRun,
+                    models.TestRun.test_id == models.Test.id).join(
+                    models.TestRunMetadata,
+                    models.TestRunMetadata.test_run_id == models.TestRun.id
+                ).filter(
+                    models.TestRun.run_id == run.id,
+                    models.TestRunMetadata.key ==
+                    resource_runner.ATTACHMENT_NAME)
+            return dict((test_id, json.loads(value))
+                        for test_id, value in query)
+        finally:
+            session.close()
+
+    def _get_inserter(self, partial, run_id=None, attachments=None):
+        return _SqlInserter(self, partial, run_id, attachments=attachments)
 
     def _get_test_times(self, test_ids):
         result = {}
-        # TODO(mtreinish): after subunit2sql adds a bulk query for getting
-        # multiple tests by test_id at once remove the for loop
-        session = self.session_factory()
+        # NOTE(mtreinish): We need to make sure the test_id with attrs is used
+        # in the output dict, otherwise the scheduler won't see it
+        stripped_ids = {}
         for test_id in test_ids:
-            stripped_test_id = utils.cleanup_test_name(test_id)
-            test = db_api.get_test_by_test_id(stripped_test_id,
-                                              session=session)
-            if test:
-                # NOTE(mtreinish): We need to make sure the test_id with attrs
-                # is used in the output dict, otherwise the scheduler won't
-                # see it
-                result[test_id] = test.run_time
-        session.close()
+            stripped_ids.setdefault(utils.cleanup_test_name(test_id),
+                                    []).append(test_id)
+        stripped = list(stripped_ids)
+        session = self.session_factory()
+        try:
+            for i in range(0, len(stripped), BATCH_SIZE):
+                query = session.query(
+                    models.Test.test_id, models.Test.run_time).filter(
+                        models.Test.test_id.in_(stripped[i:i + BATCH_SIZE]))
+                for stripped_id, run_time in query:
+                    for test_id in stripped_ids[stripped_id]:
+                        result[test_id] = run_time
+        finally:
+            session.close()
         return result
 
+    def get_timing_data(self):
+        # NOTE: run_time is the average of the successful runs of a test, or
+        # the time of its first run if it never succeeded.
+        session = self.session_factory()
+        try:
+            query = session.query(
+                models.Test.test_id, models.Test.run_time,
+                models.Test.success).filter(models.Test.run_time.isnot(None))
+            return dict((test_id, (run_time, max(success, 1)))
+                        for test_id, run_time, success in query)
+        finally:
+            session.close()
+
+    def merge_timing_data(self, timing_data):
+        # Imported samples are counted as successful runs of the tests, so
+        # they are weighted like local runs by later runs too.
+        test_ids = list(timing_data)
+        session = self.session_factory()
+        try:
+            with session.begin():
+                for i in range(0, len(test_ids), BATCH_SIZE):
+                    chunk = test_ids[i:i + BATCH_SIZE]
+                    tests = dict(
+                        (test.test_id, test) for test in session.query(
+                            models.Test).filter(
+                                models.Test.test_id.in_(chunk)))
+                    existing = dict(
+                        (test.test_id, (test.run_time, max(test.success, 1)))
+                        for test in tests.values()
+                        if test.run_time is not None)
+                    merged = timing.merge(
+                        existing, dict((x, timing_data[x]) for x in chunk))
+                    for test_id in chunk:
+                        count = timing_data[test_id][1]
+                        test = tests.get(test_id)
+                        if test is None:
+                            test = models.Test(test_id=test_id, run_count=0,
+                                               success=0, failure=0)
+                            session.add(test)
+                        test.run_time = merged[test_id][0]
+                        test.run_count += count
+                        test.success += count
+        finally:
+            session.close()
+
 
 class _Subunit2SqlRun(repository.AbstractTestRun):
     """A test run that was inserted into the repository."""
 
     def __init__(self, url, run_id, test_runs=None):
-        engine = sqlalchemy.create_engine(url)
-        self.session_factory = orm.sessionmaker(bind=engine)
+        self.session_factory = get_session_factory(url)
         self._run_id = run_id
         self._test_runs = test_runs
 
@@ -179,24 +295,33 @@ class _Subunit2SqlRun(repository.AbstractTestRun):
 
 
 class _SqlInserter(repository.AbstractTestRun):
-    """Insert test results into a sql repository."""
+    """Insert test results into a sql repository.
+
+    Test results are buffered as they arrive and written to the database in
+    batches of ``batch_size`` tests, each batch in a single transaction. When
+    ``background`` is True the batches are written by a writer thread so
+    that the incoming stream is never blocked on the database.
+    ``attachments`` is the attachment policy applied to the results before
+    they are buffered.
+    """
 
-    def __init__(self, repository, partial=False, run_id=None):
+    def __init__(self, repository, partial=False, run_id=None,
+                 batch_size=BATCH_SIZE, background=True, attachments=None):
         self._repository = repository
         self.partial = partial
+        self.attachments = attachments
         self._subunit = None
         self._run_id = run_id
-        # Create a new session factory
-        self.engine = sqlalchemy.create_engine(self._repository.base)
-        self.session_factory = orm.sessionmaker(bind=self.engine,
-                                                autocommit=True)
+        self.batch_size = batch_size
+        self.background = background
+        self.session_factory = self._repository.session_factory
 
     def startTestRun(self):
         self._subunit = io.BytesIO()
         self.subunit_stream = subunit.v2.StreamResultToBytes(self._subunit)
-        self.hook = testtools.CopyStreamResult([
+        self.hook = attachment_policy.wrap(testtools.CopyStreamResult([
             testtools.StreamToDict(self._handle_test),
-            self.subunit_stream])
+            self.subunit_stream]), self.attachments)
         self.hook.startTestRun()
         self.start_time = datetime.datetime.utcnow()
         session = self.session_factory()
@@ -208,32 +333,17 @@ class _SqlInserter(repository.AbstractTestRun):
             self.run = db_api.get_run_by_id(int_id, session=session)
         session.close()
         self.totals = {}
-
-    def _update_test(self, test_dict, session, start_time, stop_time):
-        test_id = utils.cleanup_test_name(test_dict['id'])
-        db_test = db_api.get_test_by_test_id(test_id, session)
-        if not db_test:
-            if test_dict['status'] == 'success':
-                success = 1
-                fails = 0
-            elif test_dict['status'] == 'fail':
-                fails = 1
-                success = 0
-            else:
-                fails = 0
-                success = 0
-            run_time = read_subunit.get_duration(start_time, stop_time)
-            db_test = db_api.create_test(test_id, (success + fails), success,
-                                         fails, run_time,
-                                         session)
-        else:
-            test_dict['start_time'] = start_time
-            test_dict['end_time'] = stop_time
-            test_values = shell.increment_counts(db_test, test_dict)
-            # If skipped nothing to update
-            if test_values:
-                db_api.update_test(test_values, db_test.id, session)
-        return db_test
+        self._pending = []
+        self._error = None
+        self._queue = None
+        self._writer = None
+        if self.background:
+            # NOTE: The queue is bounded so a slow database applies
+            # backpressure instead of buffering the whole run in memory.
+            self._queue = queue.Queue(maxsize=4)
+            self._writer = threading.Thread(target=self._write_batches)
+            self._writer.daemon = True
+            self._writer.start()
 
     def _get_attrs(self, test_id):
         attr_regex = re.compile('\[(.*)\]')
@@ -249,46 +359,154 @@ class _SqlInserter(repository.AbstractTestRun):
             return
         elif test_dict['id'] == 'process-returncode':
             return
+        test_dict['start_time'] = start
+        test_dict['end_time'] = end
+        self._pending.append(test_dict)
+        if len(self._pending) >= self.batch_size:
+            self._flush()
+
+    def _flush(self):
+        self._raise_writer_error()
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        if self._queue is not None:
+            self._queue.put(batch)
+        else:
+            self._write_batch(batch)
+
+    def _write_batches(self):
+        while True:
+            batch = self._queue.get()
+            if batch is None:
+                return
+            # NOTE: Once a write has failed the remaining batches are
+            # drained and dropped, the error is raised in the stream thread.
+            if self._error is not None:
+                continue
+            try:
+                self._write_batch(batch)
+            except Exception:
+                self._error = sys.exc_info()
+
+    def _raise_writer_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            six.reraise(*error)
+
+    def _get_tests(self, session, test_ids):
+        tests = {}
+        test_ids = list(test_ids)
+        for i in range(0, len(test_ids), self.batch_size):
+            chunk = test_ids[i:i + self.batch_size]
+            query = session.query(models.Test).filter(
+                models.Test.test_id.in_(chunk))
+            for test in query:
+                tests[test.test_id] = test
+        return tests
+
+    def _update_test(self, db_test, test_dict):
+        status = test_dict['status']
+        # NOTE: This mirrors subunit2sql.shell.increment_counts() except that
+        # statuses other than success, fail and skip are counted as a skip
+        # instead of raising.
+        if status == 'success':
+            values = shell.running_avg(db_test, {}, test_dict)
+            db_test.run_time = values['run_time']
+            db_test.run_count += 1
+            db_test.success += 1
+        elif status == 'fail':
+            db_test.run_count += 1
+            db_test.failure += 1
+
+    def _new_test(self, test_id, test_dict):
+        status = test_dict['status']
+        success = 1 if status == 'success' else 0
+        fails = 1 if status == 'fail' else 0
+        run_time = read_subunit.get_duration(test_dict['start_time'],
+                                             test_dict['end_time'])
+        return models.Test(test_id=test_id, run_count=(success + fails),
+                           success=success, failure=fails, run_time=run_time)
+
+    def _new_test_run(self, db_test, test_dict):
+        test_run = models.TestRun()
+        test_run.test_id = db_test.id
+        test_run.run_id = self.run.id
+        test_run.status = test_dict['status']
+        start_time = test_dict['start_time'].replace(tzinfo=None)
+        stop_time = test_dict['end_time'].replace(tzinfo=None)
+        test_run.start_time = start_time
+        test_run.start_time_microsecond = start_time.microsecond
+        test_run.stop_time = stop_time
+        test_run.stop_time_microsecond = stop_time.microsecond
+        return test_run
+
+    def _get_metadata(self, test_dict):
+        metadata = {}
+        attrs = self._get_attrs(test_dict['id'])
+        if attrs:
+            metadata['attrs'] = attrs
+        if test_dict.get('tags', None):
+            metadata['tags'] = ",".join(test_dict['tags'])
+        resources = resource_runner.parse_resources(test_dict.get('details'))
+        if resources is not None:
+            metadata[resource_runner.ATTACHMENT_NAME] = json.dumps(
+                resources, sort_keys=True)
+        return metadata
+
+    def _write_batch(self, batch):
+        with instrumentation.span('sql.write_batch', test_ids=len(batch)):
+            self._do_write_batch(batch)
+
+    def _do_write_batch(self, batch):
         session = self.session_factory()
         try:
-            # Update the run counts
-            if test_dict['status'] not in self.totals:
-                self.totals[test_dict['status']] = 1
-            else:
-                self.totals[test_dict['status']] += 1
-            values = {}
-            if test_dict['status'] in ('success', 'xfail'):
-                values['passes'] = self.totals['success']
-            elif test_dict['status'] in ('fail', 'uxsuccess'):
-                values['fails'] = self.totals['fail']
-            elif test_dict['status'] == 'skip':
-                values['skips'] = self.totals['skip']
-            db_api.update_run(values, self.run.id, session=session)
-            # Update the test totals
-            db_test = self._update_test(test_dict, session, start,
-                                        end)
-            # Add the test run
-            test_run = db_api.create_test_run(db_test.id, self.run.id,
-                                              test_dict['status'],
-                                              start, end,
-                                              session)
-            metadata = {}
-            attrs = self._get_attrs(test_dict['id'])
-            if attrs:
-                metadata['attrs'] = attrs
-            if test_dict.get('tags', None):
-                metadata['tags'] = ",".join(test_dict['tags'])
-            if metadata:
-                db_api.add_test_run_metadata(
-                    metadata, test_run.id, session)
+            with session.begin():
+                test_ids = [utils.cleanup_test_name(x['id']) for x in batch]
+                tests = self._get_tests(session, set(test_ids))
+                for test_id, test_dict in zip(test_ids, batch):
+                    if test_id in tests:
+                        self._update_test(tests[test_id], test_dict)
+                    else:
+                        tests[test_id] = self._new_test(test_id, test_dict)
+                        session.add(tests[test_id])
+                # Assign ids to the newly created tests
+                session.flush()
+                test_runs = [self._new_test_run(tests[test_id], test_dict)
+                             for test_id, test_dict in zip(test_ids, batch)]
+                session.add_all(test_runs)
+                session.flush()
+                metadata = []
+                for test_run, test_dict in zip(test_runs, batch):
+                    for key, value in self._get_metadata(test_dict).items():
+                        metadata.append({'key': key, 'value': value,
+                                         'test_run_id': test_run.id})
+                if metadata:
+                    session.execute(models.TestRunMetadata.__table__.insert(),
+                                    metadata)
+                # Update the run counts
+                for test_dict in batch:
+                    status = test_dict['status']
+                    self.totals[status] = self.totals.get(status, 0) + 1
+                values = {
+                    'passes': self.totals.get('success', 0),
+                    'fails': self.totals.get('fail', 0),
+                    'skips': self.totals.get('skip', 0),
+                }
+                session.query(models.Run).filter_by(id=self.run.id).update(
+                    values, synchronize_session=False)
             # TODO(mtreinish): Add attachments support to the DB.
+        finally:
             session.close()
-        except Exception:
-            session.rollback()
-            raise
 
     def stopTestRun(self):
         self.hook.stopTestRun()
+        self._flush()
+        if self._writer is not None:
+            self._queue.put(None)
+            with instrumentation.span('sql.wait_for_writer'):
+                self._writer.join()
+            self._raise_writer_error()
         stop_time = datetime.datetime.utcnow()
         self._subunit.seek(0)
         values = {}
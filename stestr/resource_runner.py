@@ -0,0 +1,188 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""A subunit test runner which records the resources used by each test.
+
+This is used as the worker for ``stestr run --resource-usage``, in place of
+``python -m subunit.run``::
+
+  python -m stestr.resource_runner discover -t ./ ./tests
+
+Before each test finishes, a JSON attachment named ``resources`` is added to
+it with the resources the worker used while the test ran:
+
+* ``user`` and ``sys``: the CPU time in seconds
+* ``children_user`` and ``children_sys``: the CPU time in seconds of the child
+  processes which finished while the test ran
+* ``max_rss``: the peak resident set size of the worker so far, in KiB
+* ``read_bytes`` and ``write_bytes``: the bytes read from and written to
+  storage, where the platform reports it
+"""
+
+import io
+import json
+import sys
+
+from subunit import run
+from subunit.test_results import AutoTimingTestResultDecorator
+import testtools
+
+try:
+    import resource
+except ImportError:
+    # Not available on windows
+    resource = None
+
+# The name of the attachment with the resource usage of a test
+ATTACHMENT_NAME = 'resources'
+_FINAL_STATUSES = ('success', 'fail', 'skip', 'xfail', 'uxsuccess')
+
+
+def _read_io_counters():
+    counters = {}
+    try:
+        with open('/proc/self/io') as io_file:
+            for line in io_file:
+                key, _, value = line.partition(':')
+                counters[key] = int(value)
+    except (IOError, OSError, ValueError):
+        return None
+    return counters
+
+
+def get_usage():
+    """Return the resource usage counters of this process."""
+    usage = {}
+    if resource is not None:
+        self_usage = resource.getrusage(resource.RUSAGE_SELF)
+        children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        max_rss = self_usage.ru_maxrss
+        if sys.platform == 'darwin':
+            # macOS reports bytes instead of KiB
+            max_rss //= 1024
+        usage.update(user=self_usage.ru_utime, sys=self_usage.ru_stime,
+                     children_user=children.ru_utime,
+                     children_sys=children.ru_stime, max_rss=max_rss)
+        io_counters = _read_io_counters()
+        if io_counters is not None:
+            usage['read_bytes'] = io_counters.get('read_bytes', 0)
+            usage['write_bytes'] = io_counters.get('write_bytes', 0)
+        else:
+            usage['read_bytes'] = self_usage.ru_inblock * 512
+            usage['write_bytes'] = self_usage.ru_oublock * 512
+    return usage
+
+
+def diff_usage(start, end):
+    """Return the resources used between two get_usage() calls."""
+    used = {}
+    for key, value in end.items():
+        if key == 'max_rss':
+            used[key] = value
+        elif isinstance(value, float):
+            used[key] = round(value - start.get(key, 0), 6)
+        else:
+            used[key] = value - start.get(key, 0)
+    return used
+
+
+def parse_resources(details):
+    """Return the resource usage attached to a test, if any.
+
+    :param dict details: The details of a test, as in the test dicts from
+        testtools.StreamToDict
+    :return: A dict of the resource usage, or None
+    """
+    content = (details or {}).get(ATTACHMENT_NAME)
+    if content is None:
+        return None
+    try:
+        return json.loads(b''.join(content.iter_bytes()).decode('utf8'))
+    except ValueError:
+        return None
+
+
+class ResourceUsageResult(testtools.StreamResult):
+    """Add the resource usage of each test to it as an attachment.
+
+    :param target: The StreamResult to forward the events to
+    """
+
+    def __init__(self, target):
+        super(ResourceUsageResult, self).__init__()
+        self.target = target
+        self._started = {}
+
+    def startTestRun(self):
+        self.target.startTestRun()
+
+    def stopTestRun(self):
+        self.target.stopTestRun()
+
+    def status(self, test_id=None, test_status=None, test_tags=None,
+               runnable=True, file_name=None, file_bytes=None, eof=False,
+               mime_type=None, route_code=None, timestamp=None):
+        if test_status == 'inprogress':
+            self._started[test_id] = get_usage()
+        elif test_status in _FINAL_STATUSES and test_id in self._started:
+            used = diff_usage(self._started.pop(test_id), get_usage())
+            self.target.status(
+                test_id=test_id, file_name=ATTACHMENT_NAME,
+                file_bytes=json.dumps(used, sort_keys=True).encode('utf8'),
+                mime_type='application/json', eof=True, test_tags=test_tags,
+                route_code=route_code, timestamp=timestamp)
+        self.target.status(
+            test_id=test_id, test_status=test_status, test_tags=test_tags,
+            runnable=runnable, file_name=file_name, file_bytes=file_bytes,
+            eof=eof, mime_type=mime_type, route_code=route_code,
+            timestamp=timestamp)
+
+
+class ResourceTestRunner(run.SubunitTestRunner):
+    """A SubunitTestRunner which attaches the resource usage of each test."""
+
+    def run(self, test):
+        result, _ = self._list(test)
+        result = ResourceUsageResult(result)
+        result = testtools.ExtendedToStreamDecorator(result)
+        result = AutoTimingTestResultDecorator(result)
+        if self.failfast is not None:
+            result.failfast = self.failfast
+            result.tb_locals = self.tb_locals
+        result.startTestRun()
+        try:
+            test(result)
+        finally:
+            result.stopTestRun()
+        return result
+
+
+def main(argv=None, stdout=None):
+    if argv is None:
+        argv = sys.argv
+    if stdout is None:
+        stdout = sys.stdout
+        if hasattr(stdout, 'fileno'):
+            binstdout = io.open(stdout.fileno(), 'wb', 0)
+            if sys.version_info[0] > 2:
+                sys.stdout = io.TextIOWrapper(binstdout,
+                                              encoding=sys.stdout.encoding)
+            else:
+                sys.stdout = binstdout
+            stdout = sys.stdout
+    run.SubunitTestProgram(module=None, argv=argv,
+                           testRunner=ResourceTestRunner, stdout=stdout,
+                           exit=False)
+
+
+if __name__ == '__main__':
+    main()
@@ -10,6 +10,10 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import datetime
+import shutil
+import time
+
 import six
 import subunit
 import testtools
@@ -168,3 +172,154 @@ class CLITestResult(testtools.StreamResult):
 
     def get_summary(self):
         return self._summary
+
+
+class ProgressResult(testtools.StreamResult):
+    """Show a status line with the progress and predicted end of a run.
+
+    The events are forwarded to the wrapped result. On a tty the status line
+    is redrawn in place below the output of the wrapped result, otherwise a
+    progress line is printed every interval seconds.
+    """
+
+    final_states = frozenset(
+        ['success', 'fail', 'skip', 'xfail', 'uxsuccess'])
+
+    def __init__(self, target, stream, partitions=None, estimates=None,
+                 interval=None, redraw=None):
+        """Construct a ProgressResult.
+
+        :param target: The StreamResult to forward all events to
+        :param stream: The stream to write the progress to
+        :param list partitions: A list of the test ids run by each worker, in
+            worker order. If not set only the number of completed tests is
+            shown.
+        :param dict estimates: A dict mapping test ids to their estimated run
+            time in seconds, as returned by get_test_times()
+        :param float interval: The minimum number of seconds between updates.
+            The default is 0.5 when redrawing and 30 otherwise.
+        :param bool redraw: Redraw the status line in place, the default is
+            to redraw only if stream is a tty
+        """
+        super(ProgressResult, self).__init__()
+        self.target = target
+        self.stream = stream
+        self.partitions = partitions or []
+        self.estimates = estimates or {}
+        if redraw is None:
+            redraw = hasattr(stream, 'isatty') and stream.isatty()
+        self.redraw = redraw
+        if interval is None:
+            interval = 0.5 if redraw else 30
+        self.interval = interval
+        self.total = sum(len(ids) for ids in self.partitions)
+        known = [self.estimates[x] for partition in self.partitions
+                 for x in partition if x in self.estimates]
+        # Tests without timing data are assumed to take the average time
+        self._default_estimate = (sum(known) / len(known)) if known else 0.0
+        # The remaining estimated time for each worker
+        self._remaining = [sum(self._estimate(x) for x in partition)
+                           for partition in self.partitions]
+        self._worker_of = {}
+        for worker, partition in enumerate(self.partitions):
+            for test_id in partition:
+                self._worker_of[test_id] = worker
+
+    def _estimate(self, test_id):
+        return self.estimates.get(test_id, self._default_estimate)
+
+    def startTestRun(self):
+        self.target.startTestRun()
+        self.done = 0
+        self._start_times = {}
+        self._actual_time = 0.0
+        self._estimated_time = 0.0
+        self._start = time.time()
+        self._last_update = None
+        self._drawn = False
+
+    def stopTestRun(self):
+        self._clear()
+        self.target.stopTestRun()
+
+    def status(self, test_id=None, test_status=None, timestamp=None,
+               **kwargs):
+        completed = (test_status in self.final_states and
+                     test_id != 'process-returncode')
+        if completed:
+            self._clear()
+        self.target.status(test_id=test_id, test_status=test_status,
+                           timestamp=timestamp, **kwargs)
+        if test_status == 'inprogress':
+            self._start_times[test_id] = timestamp
+        elif completed:
+            self._complete(test_id, timestamp)
+        self._update()
+
+    def _complete(self, test_id, timestamp):
+        self.done += 1
+        estimate = self._estimate(test_id)
+        start = self._start_times.pop(test_id, None)
+        if start is not None and timestamp is not None:
+            self._actual_time += (timestamp - start).total_seconds()
+            self._estimated_time += estimate
+        worker = self._worker_of.pop(test_id, None)
+        if worker is not None:
+            self._remaining[worker] = max(
+                0.0, self._remaining[worker] - estimate)
+
+    def _get_remaining(self):
+        """Return the predicted remaining seconds for each worker.
+
+        The estimates are scaled by how fast the completed tests ran
+        compared to their estimates.
+        """
+        scale = 1.0
+        if self._estimated_time > 0 and self._actual_time > 0:
+            scale = self._actual_time / self._estimated_time
+        return [remaining * scale for remaining in self._remaining]
+
+    def get_status_line(self, now=None):
+        now = now or time.time()
+        elapsed = _format_seconds(now - self._start)
+        if not self.total:
+            return '[%d] elapsed %s' % (self.done, elapsed)
+        remaining = self._get_remaining()
+        eta = max(remaining) if remaining else 0.0
+        finish = datetime.datetime.fromtimestamp(now + eta)
+        return '[%d/%d] %d%% elapsed %s, ETA %s (finish %s), workers: %s' % (
+            self.done, self.total, 100 * self.done // self.total, elapsed,
+            _format_seconds(eta), finish.strftime('%H:%M:%S'),
+            ' '.join(_format_seconds(x) for x in remaining))
+
+    def _update(self):
+        now = time.time()
+        if (self._last_update is not None and
+                now - self._last_update < self.interval):
+            return
+        if self.redraw:
+            line = self._truncate(self.get_status_line(now))
+            self.stream.write('\r' + line)
+            self._drawn = True
+        elif self._last_update is not None:
+            self.stream.write('\n' + self.get_status_line(now) + '\n')
+        self.stream.flush()
+        self._last_update = now
+
+    def _truncate(self, line):
+        try:
+            width = shutil.get_terminal_size().columns
+        except AttributeError:
+            # NOTE: get_terminal_size() is not available on python 2
+            width = 80
+        return line[:width - 1]
+
+    def _clear(self):
+        if self._drawn:
+            self.stream.write('\r\x1b[K')
+            self.stream.flush()
+            self._drawn = False
+
+
+def _format_seconds(seconds):
+    return str(datetime.timedelta(seconds=int(seconds)))
@@ -15,6 +15,7 @@ import itertools
 import multiprocessing
 import operator
 import random
+import re
 
 import yaml
 
@@ -22,7 +23,7 @@ from stestr import selection
 
 
 def partition_tests(test_ids, concurrency, repository, group_callback,
-                    randomize=False):
+                    randomize=False, resource_callback=None):
         """Partition test_ids by concurrency.
 
         Test durations from the repository are used to get partitions which
@@ -42,6 +43,10 @@ def partition_tests(test_ids, concurrency, repository, group_callback,
             identifier will be kept on the same worker.
         :param bool randomize: If true each partition's test order will be
                             randomized
+        :param resource_callback: A callback function which returns the names
+            of the exclusive resources a test_id holds, see
+            get_resource_callback. Groups holding the same resource are kept
+            on the same worker, so their tests never run at the same time.
 
         :return: A list where each element is a distinct subset of test_ids,
             and the union of all the elements is equal to set(test_ids).
@@ -66,6 +71,8 @@ def partition_tests(test_ids, concurrency, repository, group_callback,
         for test_id in test_ids:
             group_id = group_callback(test_id) or test_id
             group_ids[group_id].append(test_id)
+        if resource_callback is not None:
+            group_ids = group_by_resources(group_ids, resource_callback)
         # Time groups: generate three sets of groups:
         # - fully timed dict(group_id -> time),
         # - partially timed dict(group_id -> time) and
@@ -119,6 +126,155 @@ def partition_tests(test_ids, concurrency, repository, group_callback,
             return partitions
 
 
+def get_resource_callback(resources):
+    """Return a callback which returns the resources a test holds.
+
+    :param dict resources: A dict mapping the name of each exclusive resource
+        to a list of regexes. A test holds a resource if any of its regexes
+        matches the test id with re.search().
+
+    :return: A function which takes a test id and returns a list of the names
+        of the resources it holds.
+    """
+    compiled = [(name, [re.compile(regex) for regex in regexes])
+                for name, regexes in sorted(resources.items())]
+
+    def resource_callback(test_id):
+        return [name for name, regexes in compiled
+                if any(regex.search(test_id) for regex in regexes)]
+
+    return resource_callback
+
+
+def group_by_resources(groups, resource_callback):
+    """Merge the groups of tests which hold any of the same resources.
+
+    The groups are merged transitively, so if group A shares a resource with
+    group B and B shares another one with group C, A, B and C are merged.
+
+    :param dict groups: A dict mapping group ids to lists of test ids
+    :param resource_callback: A callback function which returns the names of
+        the resources a test id holds
+    :return: A dict mapping group ids to lists of test ids, where each
+        resource is held by the tests of a single group. The group id of a
+        merged group is the id of its first group in groups.
+    """
+    # A union-find of group ids, the root of each set is its first group
+    parents = {}
+
+    def find(group_id):
+        while parents[group_id] != group_id:
+            parents[group_id] = parents[parents[group_id]]
+            group_id = parents[group_id]
+        return group_id
+
+    order = {}
+    owners = {}
+    for group_id, group_tests in groups.items():
+        parents[group_id] = group_id
+        order[group_id] = len(order)
+        for test_id in group_tests:
+            for resource in resource_callback(test_id):
+                if resource not in owners:
+                    owners[resource] = group_id
+                    continue
+                root, other = find(group_id), find(owners[resource])
+                if root != other:
+                    if order[other] < order[root]:
+                        root, other = other, root
+                    parents[other] = root
+    merged = collections.OrderedDict()
+    for group_id, group_tests in groups.items():
+        merged.setdefault(find(group_id), []).extend(group_tests)
+    return merged
+
+
+def shard_tests(test_ids, index, total, repository=None,
+                group_callback=None):
+    """Return the test ids in one shard of a run split over several machines.
+
+    The tests are split into total shards which have roughly the same
+    expected runtime, like partition_tests does for workers. Every decision
+    is made in a fixed order, and doesn't depend on the order of test_ids or
+    the python hash seed, so every machine computes the same split from the
+    same test ids and timing data without having to coordinate.
+
+    :param list test_ids: The list of test_ids to be sharded
+    :param int index: The index of the shard to return, from 0 to total - 1
+    :param int total: The number of shards the tests are split into
+    :param repository: A repository object to get test times from. To get the
+        same split, each machine needs the same timing data.
+    :param group_callback: A callback function that is used as a scheduler
+        hint to group test_ids together. Tests with the same group identifier
+        are kept in the same shard.
+
+    :return: The test ids in the shard, in the order of test_ids
+    """
+    if total < 1 or not 0 <= index < total:
+        raise ValueError('Invalid shard %s of %s' % (index, total))
+    ordered_ids = sorted(set(test_ids))
+    if repository:
+        time_data = repository.get_test_times(ordered_ids)
+        timed_tests = time_data['known']
+    else:
+        timed_tests = {}
+    # Group tests, group ids can be any value so the groups are ordered by
+    # their first test id rather than by group id.
+    groups = collections.OrderedDict()
+    for test_id in ordered_ids:
+        group_id = (group_callback and group_callback(test_id)) or test_id
+        groups.setdefault(group_id, []).append(test_id)
+    timed = []
+    partial = []
+    unknown = []
+    for group_tests in groups.values():
+        times = [timed_tests[x] for x in group_tests if x in timed_tests]
+        group_time = sum(times)
+        if len(times) == len(group_tests):
+            timed.append((group_time, group_tests))
+        elif group_time:
+            partial.append((group_time, group_tests))
+        else:
+            unknown.append(group_tests)
+    # [time, tests, shard index] for each shard
+    shards = [[0.0, 0, i] for i in range(total)]
+    selected = set()
+    for queue in (timed, partial):
+        queue.sort(key=lambda item: (-item[0], item[1][0]))
+        for duration, group_tests in queue:
+            shard = min(shards)
+            shard[0] += duration
+            shard[1] += len(group_tests)
+            if shard[2] == index:
+                selected.update(group_tests)
+    # Spread the groups without any timing data by test count
+    for group_tests in unknown:
+        shard = min(shards, key=lambda item: (item[1], item[2]))
+        shard[1] += len(group_tests)
+        if shard[2] == index:
+            selected.update(group_tests)
+    return [x for x in test_ids if x in selected]
+
+
+def parse_shard(value):
+    """Parse a shard given as INDEX/TOTAL on the command line.
+
+    :param str value: The shard, with INDEX counting from 1, like '2/4'
+    :return: A tuple of the shard index counting from 0 and the total number
+        of shards, as used by shard_tests
+    :raises ValueError: If value isn't a valid shard
+    """
+    index, sep, total = value.partition('/')
+    try:
+        index, total = int(index), int(total)
+    except ValueError:
+        raise ValueError('Shard %r is not of the form INDEX/TOTAL' % value)
+    if not sep or total < 1 or not 1 <= index <= total:
+        raise ValueError('Shard %r must have an INDEX from 1 to TOTAL'
+                         % value)
+    return index - 1, total
+
+
 def local_concurrency():
     """Get the number of available CPUs on the system.
 
@@ -133,9 +289,14 @@ def local_concurrency():
 
 
 def generate_worker_partitions(ids, worker_path, repository=None,
-                               group_callback=None, randomize=False):
+                               group_callback=None, randomize=False,
+                               resource_callback=None):
     """Parse a worker yaml file and generate test groups
 
+    Besides the workers, the file can declare exclusive resources in a
+    ``resources`` entry, mapping each resource name to a regex or a list of
+    regexes. These are used along with the resources of resource_callback.
+
     :param list ids: A list of test ids too be partitioned
     :param path worker_path: The path to a worker file
     :param repository: A repository object that will be used for looking up
@@ -151,14 +312,40 @@ def generate_worker_partitions(ids, worker_path, repository=None,
     :param bool randomize: If true each partition's test order will be
         randomized. This is optional and also will only be used for scheduling
         if there is a count field on a worker.
+    :param resource_callback: A callback function which returns the names of
+        the exclusive resources a test_id holds. Tests holding the same
+        resource are moved to the same worker, the first one with any of
+        them, so they never run at the same time. The other tests stay on
+        their workers.
 
     :returns: A list where each element is a distinct subset of test_ids.
     """
     with open(worker_path, 'r') as worker_file:
         workers_desc = yaml.load(worker_file.read())
+    resources = {}
+    for worker in workers_desc:
+        if isinstance(worker, dict) and isinstance(worker.get('resources'),
+                                                   dict):
+            for name, regexes in worker['resources'].items():
+                if not isinstance(regexes, list):
+                    regexes = [regexes]
+                resources.setdefault(name, []).extend(regexes)
+    if resources:
+        file_callback = get_resource_callback(resources)
+        if resource_callback is None:
+            resource_callback = file_callback
+        else:
+            config_callback = resource_callback
+
+            def resource_callback(test_id):
+                return config_callback(test_id) + file_callback(test_id)
+
     worker_groups = []
     for worker in workers_desc:
-        if isinstance(worker, dict) and 'worker' in worker.keys():
+        if isinstance(worker, dict) and 'resources' in worker.keys():
+            if not isinstance(worker['resources'], dict):
+                raise TypeError('The input yaml is the incorrect format')
+        elif isinstance(worker, dict) and 'worker' in worker.keys():
             if isinstance(worker['worker'], list):
                 local_worker_list = selection.filter_tests(
                     worker['worker'], ids)
@@ -167,7 +354,8 @@ def generate_worker_partitions(ids, worker_path, repository=None,
                     'concurrency'] > 1:
                     partitioned_tests = partition_tests(
                         local_worker_list, worker['concurrency'], repository,
-                        group_callback, randomize)
+                        group_callback, randomize,
+                        resource_callback=resource_callback)
                     worker_groups.extend(partitioned_tests)
                 else:
                     # If a worker partition is empty don't add it to the output
@@ -177,4 +365,24 @@ def generate_worker_partitions(ids, worker_path, repository=None,
                 raise TypeError('The input yaml is the incorrect format')
         else:
             raise TypeError('The input yaml is the incorrect format')
+    if resource_callback is not None:
+        worker_groups = _move_resource_tests(worker_groups, resource_callback)
     return worker_groups
+
+
+def _move_resource_tests(worker_groups, resource_callback):
+    # Move the tests holding the same resources to the first worker with
+    # any of them, the other tests stay on the worker they were given.
+    holders = collections.OrderedDict()
+    workers = {}
+    for index, worker_tests in enumerate(worker_groups):
+        for test_id in worker_tests:
+            if test_id not in holders and resource_callback(test_id):
+                holders[test_id] = [test_id]
+                workers[test_id] = index
+    lanes = group_by_resources(holders, resource_callback)
+    moved = [[test_id for test_id in worker_tests if test_id not in holders]
+             for worker_tests in worker_groups]
+    for first_test, lane in lanes.items():
+        moved[workers[first_test]].extend(lane)
+    return [worker_tests for worker_tests in moved if worker_tests]
@@ -14,6 +14,47 @@ import contextlib
 import re
 
 
+# Patterns which can't be safely merged into a single alternation. Numbered
+# backreferences and conditionals change meaning once the groups of another
+# pattern precede them, named groups may collide between patterns and global
+# inline flags, which older Pythons accept anywhere in a pattern, would apply
+# to every other pattern too.
+_UNMERGEABLE_RE = re.compile(r'\\[1-9]|\(\?P[<=]|\(\?\(|\(\?[aiLmsux]+\)')
+
+
+def _compile_matcher(regexes):
+    """Compile a list of regexes into a single search predicate.
+
+    Where possible the regexes are joined into one alternation so each
+    test_id is scanned once instead of once per regex. Patterns which can't
+    be combined fall back to searching with each regex in turn.
+
+    :param list regexes: A list of regex strings
+    :return: A callable taking a test_id and returning a truthy value if any
+        of the regexes has a re.search() match for it.
+    """
+    compiled = [re.compile(regex) for regex in regexes]
+    if len(compiled) == 1:
+        return compiled[0].search
+    if not any(_UNMERGEABLE_RE.search(regex) for regex in regexes):
+        try:
+            combined = re.compile(
+                '|'.join('(?:%s)' % regex for regex in regexes))
+        except re.error:
+            # Anything else that is only valid at the start of a pattern
+            pass
+        else:
+            return combined.search
+
+    def search(test_id):
+        for pred in compiled:
+            if pred.search(test_id):
+                return True
+        return False
+
+    return search
+
+
 def filter_tests(filters, test_ids):
     """Filter test_ids by the test_filters.
 
@@ -26,14 +67,8 @@ def filter_tests(filters, test_ids):
     """
     if filters is None:
         return test_ids
-    _filters = list(map(re.compile, filters))
-
-    def include(test_id):
-        for pred in _filters:
-            if pred.search(test_id):
-                return True
-
-    return list(filter(include, test_ids))
+    include = _compile_matcher(filters)
+    return [test_id for test_id in test_ids if include(test_id)]
 
 
 def black_reader(blacklist_file):
@@ -67,7 +102,7 @@ def _get_regex_from_whitelist_file(file_path):
 
 
 def construct_list(test_ids, blacklist_file=None, whitelist_file=None,
-                   regexes=None, black_regex=None):
+                   regexes=None, black_regex=None, skipped=None):
     """Filters the discovered test cases
 
     :param list test_ids: The set of test_ids to be filtered
@@ -78,6 +113,10 @@ def construct_list(test_ids, blacklist_file=None, whitelist_file=None,
         of the regexes in this list. If this is None all test_ids will be
         returned
     :param str black_regex:
+    :param list skipped: If a list is passed in, a tuple of
+        (message, [test_ids]) is appended to it for every blacklist entry,
+        holding the test_ids that entry removed. Recording which blacklist
+        entry removed a test is slower, so it's only done when requested.
 
     :return: iterable of strings. The strings are full
         test_ids
@@ -111,20 +150,24 @@ def construct_list(test_ids, blacklist_file=None, whitelist_file=None,
             black_data = [record]
 
     list_of_test_cases = filter_tests(regexes, test_ids)
-    set_of_test_cases = set(list_of_test_cases)
 
     if not black_data:
-        return set_of_test_cases
-
-    # NOTE(afazekas): We might use a faster logic when the
-    # print option is not requested
-    for (rex, msg, s_list) in black_data:
-        for test_case in list_of_test_cases:
+        return set(list_of_test_cases)
+
+    if skipped is None:
+        exclude = _compile_matcher([rex.pattern for rex, _, _ in black_data])
+        return set(test_case for test_case in list_of_test_cases
+                   if not exclude(test_case))
+
+    set_of_test_cases = set()
+    for test_case in list_of_test_cases:
+        # NOTE(mtreinish): In the case of overlapping regex the test case is
+        # attributed to the first blacklist entry which matches it
+        for (rex, msg, s_list) in black_data:
             if rex.search(test_case):
-                # NOTE(mtreinish): In the case of overlapping regex the test
-                # case might have already been removed from the set of tests
-                if test_case in set_of_test_cases:
-                    set_of_test_cases.remove(test_case)
-                    s_list.append(test_case)
-
+                s_list.append(test_case)
+                break
+        else:
+            set_of_test_cases.add(test_case)
+    skipped.extend((msg, s_list) for (_, msg, s_list) in black_data)
     return set_of_test_cases
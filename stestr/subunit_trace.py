@@ -20,28 +20,25 @@
 from __future__ import absolute_import
 
 import argparse
+import collections
 import datetime
 import functools
 import os
 import re
 import sys
+import tempfile
 
 import pbr.version
 import subunit
+import subunit.v2
 import testtools
 
 from stestr import colorizer
-
-# NOTE(mtreinish) on python3 anydbm was renamed dbm and the python2 dbm module
-# was renamed to dbm.ndbm, this block takes that into account
-try:
-    import anydbm as dbm
-except ImportError:
-    import dbm
+from stestr.repository import abstract as repository
+from stestr.repository import util
+from stestr import utils
 
 DAY_SECONDS = 60 * 60 * 24
-FAILS = []
-RESULTS = {}
 
 
 def total_seconds(timedelta):
@@ -118,6 +115,10 @@ def print_attachments(stream, test, all_channels=False):
         name = name.split(':')[0]
         if detail.content_type.type == 'test':
             detail.content_type.type = 'text'
+        if detail.content_type.type != 'text':
+            # Binary and structured attachments, like the resource usage
+            # recorded by stestr.resource_runner, can't be shown as text
+            continue
         if (all_channels or name in channels) and detail.as_text():
             title = "Captured %s:" % name
             stream.write("\n%s\n%s\n" % (title, ('~' * len(title))))
@@ -128,33 +129,134 @@ def print_attachments(stream, test, all_channels=False):
                 stream.write("    %s\n" % line)
 
 
-def find_test_run_time_diff(test_id, run_time):
-    times_db_path = os.path.join(os.path.join(os.getcwd(), '.testrepository'),
-                                 'times.dbm')
-    if os.path.isfile(times_db_path):
-        try:
-            test_times = dbm.open(times_db_path)
-        except Exception:
-            return False
-        try:
-            avg_runtime = float(test_times.get(str(test_id), False))
-        except Exception:
-            try:
-                avg_runtime = float(test_times[str(test_id)])
-            except Exception:
-                avg_runtime = False
-
-        if avg_runtime and avg_runtime > 0:
-            run_time = float(run_time.rstrip('s'))
-            perc_diff = ((run_time - avg_runtime) / avg_runtime) * 100
-            return perc_diff
+class TraceSummary(object):
+    """Aggregate the results of a test run as they stream past.
+
+    Only counters, per worker totals and the details of failed tests are
+    kept, so memory use doesn't grow with the number of tests in the run.
+
+    :param bool spill_failures: If True the failed tests are written to a
+        temporary subunit file instead of being held in memory.
+    """
+
+    def __init__(self, spill_failures=False):
+        self.status_counts = collections.Counter()
+        self.run_time = 0.0
+        # worker -> [num_tests, first start time, last stop time]
+        self.workers = {}
+        self.num_failures = 0
+        self._failures = []
+        self._spill = None
+        if spill_failures:
+            self._spill_file = tempfile.TemporaryFile()
+            self._spill = subunit.v2.StreamResultToBytes(self._spill_file)
+
+    @property
+    def num_tests(self):
+        return sum(self.status_counts.values())
+
+    def add(self, test):
+        """Add a test dict, as produced by testtools.StreamToDict."""
+        start, stop = test['timestamps']
+        self.status_counts[test['status']] += 1
+        if start and stop:
+            self.run_time += total_seconds(stop - start)
+        worker = find_worker(test)
+        if worker not in self.workers:
+            self.workers[worker] = [0, start, stop]
+        stats = self.workers[worker]
+        stats[0] += 1
+        stats[2] = stop
+
+    def add_failure(self, test):
+        """Keep the details of a failed test for print_fails()."""
+        self.num_failures += 1
+        if self._spill is None:
+            self._failures.append(test)
+            return
+        for name, detail in test['details'].items():
+            self._spill.status(
+                test_id=test['id'], file_name=name,
+                file_bytes=b''.join(detail.iter_bytes()),
+                mime_type=repr(detail.content_type), eof=True)
+        self._spill.status(test_id=test['id'], test_status=test['status'],
+                           test_tags=test['tags'] or None,
+                           timestamp=test['timestamps'][1])
+
+    def failures(self):
+        """Return the failed test dicts in the order they were added."""
+        if self._spill is None:
+            return list(self._failures)
+        failures = []
+        self._spill_file.seek(0)
+        case = subunit.ByteStreamToStreamResult(self._spill_file)
+        result = testtools.StreamToDict(failures.append)
+        result.startTestRun()
+        case.run(result)
+        result.stopTestRun()
+        self._spill_file.seek(0, os.SEEK_END)
+        return failures
+
+    def worker_stats(self, worker):
+        num_tests, start_time, stop_time = self.workers[worker]
+        if not start_time or not stop_time:
+            delta = 'N/A'
+        else:
+            delta = stop_time - start_time
+        return num_tests, str(delta)
+
+
+def load_test_times(repo_type='file', repo_url=None, test_ids=None):
+    """Load the stored run time estimates of tests.
+
+    :param str repo_type: The repository type to read the timing data from
+    :param str repo_url: The url of the repository, if one is not specified
+        the default $CWD/.stestr is used
+    :param list test_ids: The ids of the tests to load the estimates of. By
+        default the estimates of every test with timing data are loaded,
+        the tests of a stream aren't known until it has been read.
+    :return: A dict mapping test ids, without their attributes like the
+        repository stores them, to their estimated run time in seconds. If
+        there is no repository an empty dict is returned.
+    """
+    try:
+        repo = util.get_repo_open(repo_type, repo_url)
+    except repository.RepositoryNotFound:
+        return {}
+    if test_ids is not None:
+        return dict((utils.cleanup_test_name(test_id), estimate)
+                    for test_id, estimate
+                    in repo.get_test_times(test_ids)['known'].items())
+    return dict((test_id, estimate) for test_id, (estimate, _)
+                in repo.get_timing_data().items())
+
+
+def find_test_run_time_diff(test_id, run_time, test_times):
+    """Return the percent change of run_time from the estimate for test_id.
+
+    :param str test_id: The test id, with or without its attributes
+    :param str run_time: The run time of the test, as formatted by
+        get_duration()
+    :param dict test_times: A dict mapping test ids to their estimated run
+        time in seconds, as returned by load_test_times()
+    :return: The percent difference, or False if there is no usable estimate
+    """
+    avg_runtime = test_times.get(utils.cleanup_test_name(test_id))
+    if avg_runtime and avg_runtime > 0 and run_time:
+        run_time = float(run_time.rstrip('s'))
+        return ((run_time - avg_runtime) / avg_runtime) * 100
     return False
 
 
 def show_outcome(stream, test, print_failures=False, failonly=False,
                  enable_diff=False, threshold='0', abbreviate=False,
-                 enable_color=False):
-    global RESULTS
+                 enable_color=False, summary=None, test_times=None):
+    """Print the outcome of a single test.
+
+    :param summary: A TraceSummary the test is added to, if set.
+    :param dict test_times: The estimated run times used for enable_diff, as
+        returned by load_test_times()
+    """
     status = test['status']
     # TODO(sdague): ask lifeless why on this?
     if status == 'exists':
@@ -164,9 +266,8 @@ def show_outcome(stream, test, print_failures=False, failonly=False,
     name = cleanup_test_name(test['id'])
     duration = get_duration(test['timestamps'])
 
-    if worker not in RESULTS:
-        RESULTS[worker] = []
-    RESULTS[worker].append(test)
+    if summary is not None:
+        summary.add(test)
 
     # don't count the end of the return code as a fail
     if name == 'process-returncode':
@@ -181,7 +282,8 @@ def show_outcome(stream, test, print_failures=False, failonly=False,
             break
 
     if status == 'fail' or status == 'uxsuccess':
-        FAILS.append(test)
+        if summary is not None:
+            summary.add_failure(test)
         if abbreviate:
             color.write('F', 'red')
         else:
@@ -197,8 +299,9 @@ def show_outcome(stream, test, print_failures=False, failonly=False,
                 color.write('.', 'green')
             else:
                 out_string = '{%s} %s [%s' % (worker, name, duration)
-                perc_diff = find_test_run_time_diff(test['id'], duration)
-                if enable_diff:
+                if enable_diff and test_times:
+                    perc_diff = find_test_run_time_diff(test['id'], duration,
+                                                        test_times)
                     if perc_diff and abs(perc_diff) >= abs(float(threshold)):
                         if perc_diff > 0:
                             out_string = out_string + ' +%.2f%%' % perc_diff
@@ -232,81 +335,80 @@ def show_outcome(stream, test, print_failures=False, failonly=False,
     stream.flush()
 
 
-def print_fails(stream):
+def count_tests(key, value, summary):
+    """Count the tests whose status matches the regex value.
+
+    Kept for compatibility, only the status of each test is recorded so key
+    must be 'status'.
+
+    :param summary: The TraceSummary to count the tests of
+    """
+    if key != 'status':
+        raise ValueError("Only the tests' status can be counted")
+    return sum(count for status, count in summary.status_counts.items()
+               if re.search(value, status))
+
+
+def run_time(summary):
+    """Return the sum of the run times of the tests.
+
+    Kept for compatibility, use TraceSummary.run_time.
+    """
+    return summary.run_time
+
+
+def worker_stats(worker, summary):
+    """Return the number of tests of a worker and the time it ran for.
+
+    Kept for compatibility, use TraceSummary.worker_stats().
+    """
+    return summary.worker_stats(worker)
+
+
+def print_fails(stream, summary):
     """Print summary failure report.
 
     Currently unused, however there remains debate on inline vs. at end
     reporting, so leave the utility function for later use.
+
+    :param summary: The TraceSummary to report
     """
-    if not FAILS:
+    if not summary.num_failures:
         return
     stream.write("\n==============================\n")
-    stream.write("Failed %s tests - output below:" % len(FAILS))
+    stream.write("Failed %s tests - output below:" % summary.num_failures)
     stream.write("\n==============================\n")
-    for f in FAILS:
+    for f in summary.failures():
         stream.write("\n%s\n" % f['id'])
         stream.write("%s\n" % ('-' * len(f['id'])))
         print_attachments(stream, f, all_channels=True)
     stream.write('\n')
 
 
-def count_tests(key, value):
-    count = 0
-    for k, v in RESULTS.items():
-        for item in v:
-            if key in item:
-                if re.search(value, item[key]):
-                    count += 1
-    return count
-
-
-def run_time():
-    runtime = 0.0
-    for k, v in RESULTS.items():
-        for test in v:
-            test_dur = get_duration(test['timestamps']).strip('s')
-            # NOTE(toabctl): get_duration() can return an empty string
-            # which leads to a ValueError when casting to float
-            if test_dur:
-                runtime += float(test_dur)
-    return runtime
-
-
-def worker_stats(worker):
-    tests = RESULTS[worker]
-    num_tests = len(tests)
-    stop_time = tests[-1]['timestamps'][1]
-    start_time = tests[0]['timestamps'][0]
-    if not start_time or not stop_time:
-        delta = 'N/A'
-    else:
-        delta = stop_time - start_time
-    return num_tests, str(delta)
-
-
-def print_summary(stream, elapsed_time):
+def print_summary(stream, elapsed_time, summary):
+    counts = summary.status_counts
     stream.write("\n======\nTotals\n======\n")
     stream.write("Ran: %s tests in %.4f sec.\n" % (
-        count_tests('status', '.*'), total_seconds(elapsed_time)))
-    stream.write(" - Passed: %s\n" % count_tests('status', '^success$'))
-    stream.write(" - Skipped: %s\n" % count_tests('status', '^skip$'))
-    stream.write(" - Expected Fail: %s\n" % count_tests('status', '^xfail$'))
-    stream.write(" - Unexpected Success: %s\n" % count_tests('status',
-                                                             '^uxsuccess$'))
-    stream.write(" - Failed: %s\n" % count_tests('status', '^fail$'))
-    stream.write("Sum of execute time for each test: %.4f sec.\n" % run_time())
+        summary.num_tests, total_seconds(elapsed_time)))
+    stream.write(" - Passed: %s\n" % counts['success'])
+    stream.write(" - Skipped: %s\n" % counts['skip'])
+    stream.write(" - Expected Fail: %s\n" % counts['xfail'])
+    stream.write(" - Unexpected Success: %s\n" % counts['uxsuccess'])
+    stream.write(" - Failed: %s\n" % counts['fail'])
+    stream.write("Sum of execute time for each test: %.4f sec.\n" %
+                 summary.run_time)
 
     # we could have no results, especially as we filter out the process-codes
-    if RESULTS:
+    if summary.workers:
         stream.write("\n==============\nWorker Balance\n==============\n")
 
-        for w in range(max(RESULTS.keys()) + 1):
-            if w not in RESULTS:
+        for w in range(max(summary.workers.keys()) + 1):
+            if w not in summary.workers:
                 stream.write(
                     " - WARNING: missing Worker %s! "
                     "Race in testr accounting.\n" % w)
             else:
-                num, time = worker_stats(w)
+                num, time = summary.worker_stats(w)
                 out_str = " - Worker %s (%s tests) => %s" % (w, num, time)
                 if time.isdigit():
                     out_str += 's'
@@ -347,21 +449,32 @@ def parse_args():
                              " completes")
     parser.add_argument('--color', action='store_true',
                         help="Print results with colors")
+    parser.add_argument('--spill-failures', action='store_true',
+                        help="Keep the failed tests in a temporary file "
+                             "instead of in memory until they are printed "
+                             "with --fails")
     return parser.parse_args()
 
 
 def trace(stdin, stdout, print_failures=False, failonly=False,
           enable_diff=False, abbreviate=False, color=False, post_fails=False,
-          no_summary=False):
+          no_summary=False, spill_failures=False, threshold=None,
+          test_times=None, repo_type='file', repo_url=None):
     stream = subunit.ByteStreamToStreamResult(
         stdin, non_subunit_name='stdout')
+    trace_summary = TraceSummary(spill_failures=spill_failures)
+    if enable_diff and test_times is None:
+        test_times = load_test_times(repo_type, repo_url)
     outcomes = testtools.StreamToDict(
         functools.partial(show_outcome, stdout,
                           print_failures=print_failures,
                           failonly=failonly,
                           enable_diff=enable_diff,
+                          threshold=threshold or '0',
+                          test_times=test_times,
                           abbreviate=abbreviate,
-                          enable_color=color))
+                          enable_color=color,
+                          summary=trace_summary))
     summary = testtools.StreamSummary()
     result = testtools.CopyStreamResult([outcomes, summary])
     result = testtools.StreamResultRouter(result)
@@ -376,17 +489,17 @@ def trace(stdin, stdout, print_failures=False, failonly=False,
     stop_time = datetime.datetime.utcnow()
     elapsed_time = stop_time - start_time
 
-    if count_tests('status', '.*') == 0:
+    if trace_summary.num_tests == 0:
         print("The test run didn't actually run any tests")
         return 1
     if post_fails:
-        print_fails(stdout)
+        print_fails(stdout, trace_summary)
     if not no_summary:
-        print_summary(stdout, elapsed_time)
+        print_summary(stdout, elapsed_time, trace_summary)
 
     # NOTE(mtreinish): Ideally this should live in testtools streamSummary
     # this is just in place until the behavior lands there (if it ever does)
-    if count_tests('status', '^success$') == 0:
+    if trace_summary.status_counts['success'] == 0:
         print("\nNo tests were successful during the run")
         return 1
     return 0 if summary.wasSuccessful() else 1
@@ -396,7 +509,8 @@ def main():
     args = parse_args()
     exit(trace(sys.stdin, sys.stdout, args.print_failures, args.failonly,
                args.enable_diff, args.abbreviate, args.color, args.post_fails,
-               args.no_summary))
+               args.no_summary, spill_failures=args.spill_failures,
+               threshold=args.threshold))
 
 
 if __name__ == '__main__':
@@ -19,8 +19,11 @@ import tempfile
 
 import fixtures
 import six
+from six.moves import queue
+import subunit
 from subunit import v2
 
+from stestr import instrumentation
 from stestr import results
 from stestr import scheduler
 from stestr import selection
@@ -74,13 +77,24 @@ class TestProcessorFixture(fixtures.Fixture):
          separate regex on each newline.
     :param boolean randomize: Randomize the test order after they are
         partitioned into separate workers
+    :param bool isolated: Run each test in its own process, with up to
+        concurrency of those processes running at once
+    :param tuple shard: An optional tuple of (index, total) to only run the
+        index shard, counting from 0, of the tests split into total shards
+        by scheduler.shard_tests
+    :param resource_callback: If supplied, should be a function that accepts
+        a test id and returns a list of the names of the exclusive resources
+        the test holds. Tests holding the same resource are never run at the
+        same time: they are scheduled onto the same backend test process, or
+        one after the other when isolated.
     """
 
     def __init__(self, test_ids, cmd_template, listopt, idoption,
                  repository, parallel=True, listpath=None,
                  test_filters=None, group_callback=None, serial=False,
                  worker_path=None, concurrency=0, blacklist_file=None,
-                 black_regex=None, whitelist_file=None, randomize=False):
+                 black_regex=None, whitelist_file=None, randomize=False,
+                 isolated=False, shard=None, resource_callback=None):
         """Create a TestProcessorFixture."""
 
         self.test_ids = test_ids
@@ -101,6 +115,9 @@ class TestProcessorFixture(fixtures.Fixture):
         self.whitelist_file = whitelist_file
         self.black_regex = black_regex
         self.randomize = randomize
+        self.isolated = isolated
+        self.shard = shard
+        self.resource_callback = resource_callback
 
     def setUp(self):
         super(TestProcessorFixture, self).setUp()
@@ -130,21 +147,30 @@ class TestProcessorFixture(fixtures.Fixture):
                 if default_idstr:
                     self.test_ids = default_idstr.split()
             if self.concurrency != 1 or self.test_filters is not None \
-                    or self.worker_path:
+                    or self.worker_path or self.isolated or self.shard:
                 # Have to be able to tell each worker what to run / filter
                 # tests.
-                self.test_ids = self.list_tests()
+                with instrumentation.span('discovery'):
+                    self.test_ids = self.list_tests()
         if self.test_ids is None:
             # No test ids to supply to the program.
             self.list_file_name = None
             name = ''
             idlist = ''
         else:
-            self.test_ids = selection.construct_list(
-                self.test_ids, blacklist_file=self.blacklist_file,
-                whitelist_file=self.whitelist_file,
-                regexes=self.test_filters,
-                black_regex=self.black_regex)
+            with instrumentation.span('construct_list',
+                                      test_ids=len(self.test_ids)):
+                self.test_ids = selection.construct_list(
+                    self.test_ids, blacklist_file=self.blacklist_file,
+                    whitelist_file=self.whitelist_file,
+                    regexes=self.test_filters,
+                    black_regex=self.black_regex)
+            if self.shard:
+                with instrumentation.span('shard_tests',
+                                          test_ids=len(self.test_ids)):
+                    self.test_ids = scheduler.shard_tests(
+                        self.test_ids, self.shard[0], self.shard[1],
+                        self.repository, self._group_callback)
             name = self.make_listfile()
             variables['IDFILE'] = name
             idlist = ' '.join(self.test_ids)
@@ -188,10 +214,11 @@ class TestProcessorFixture(fixtures.Fixture):
         # NOTE(claudiub): Windows does not support passing in a preexec_fn
         # argument.
         preexec_fn = None if sys.platform == 'win32' else self._clear_SIGPIPE
-        return subprocess.Popen(cmd, shell=True,
-                                stdout=subprocess.PIPE,
-                                stdin=subprocess.PIPE,
-                                preexec_fn=preexec_fn)
+        with instrumentation.span('spawn_worker'):
+            return subprocess.Popen(cmd, shell=True,
+                                    stdout=subprocess.PIPE,
+                                    stdin=subprocess.PIPE,
+                                    preexec_fn=preexec_fn)
 
     def list_tests(self):
         """List the tests returned by list_cmd.
@@ -228,9 +255,12 @@ class TestProcessorFixture(fixtures.Fixture):
         """
         result = []
         test_ids = self.test_ids
+        if self.isolated:
+            return self._run_tests_isolated()
         # Handle the single worker case (this is also run recursively per
         # worker in the parallel case)
         if self.concurrency == 1 and (test_ids is None or test_ids):
+            self.partitions = [list(test_ids)] if test_ids else []
             run_proc = self._start_process(self.cmd)
             # Prevent processes stalling if they read from stdin; we could
             # pass this through in future, but there is no point doing that
@@ -241,18 +271,24 @@ class TestProcessorFixture(fixtures.Fixture):
         elif self.worker_path:
             test_id_groups = scheduler.generate_worker_partitions(
                 test_ids, self.worker_path, self.repository,
-                self._group_callback, self.randomize)
+                self._group_callback, self.randomize,
+                resource_callback=self.resource_callback)
         # If we have multiple workers partition the tests and recursively
         # create single worker TestProcessorFixtures for each worker
         else:
-            test_id_groups = scheduler.partition_tests(test_ids,
-                                                       self.concurrency,
-                                                       self.repository,
-                                                       self._group_callback)
+            with instrumentation.span('partition_tests',
+                                      test_ids=len(test_ids)):
+                test_id_groups = scheduler.partition_tests(
+                    test_ids, self.concurrency, self.repository,
+                    self._group_callback,
+                    resource_callback=self.resource_callback)
+        # The test ids run by each of the returned processes
+        self.partitions = []
         for test_ids in test_id_groups:
             if not test_ids:
                 # No tests in this partition
                 continue
+            self.partitions.append(list(test_ids))
             fixture = self.useFixture(
                 TestProcessorFixture(test_ids,
                                      self.template, self.listopt,
@@ -260,3 +296,108 @@ class TestProcessorFixture(fixtures.Fixture):
                                      parallel=False))
             result.extend(fixture.run_tests())
         return result
+
+    def _run_tests_isolated(self):
+        # NOTE: Start the longest tests first so a slow test doesn't end up
+        # running on its own at the end of the run. Tests without timing data
+        # are started before all others.
+        times = self.repository.get_test_times(self.test_ids)['known']
+
+        def sort_key(test_id):
+            return -times.get(test_id, float('inf'))
+
+        # Tests holding the same resource are run one after the other by a
+        # single worker, as a lane.
+        lanes = [[test_id] for test_id in self.test_ids]
+        if self.resource_callback is not None:
+            lanes = list(scheduler.group_by_resources(
+                dict(enumerate(lanes)), self.resource_callback).values())
+        pending = queue.Queue()
+        for lane in sorted(lanes, key=lambda x: sum(map(sort_key, x))):
+            pending.put(sorted(lane, key=sort_key))
+        # The workers pull tests from the queue, so which worker runs which
+        # test isn't known in advance
+        self.partitions = []
+        workers = min(self.concurrency, len(lanes))
+        return [_IsolatedWorker(self, pending) for _ in range(workers)]
+
+
+class _IsolatedWorker(object):
+    """A process-like object running one test per process.
+
+    Lanes of test ids are taken from a queue shared with the other workers
+    until it is empty, and each test is run in its own test process. The
+    subunit streams of those processes are concatenated on stdout. If a test
+    process exits non-zero a failed process-returncode test is added to the
+    stream.
+
+    :param fixture: The TestProcessorFixture to take the test command from
+    :param pending: A queue of the lists of test ids to run, the tests of a
+        list are run one after the other by the worker which takes it
+    """
+
+    returncode = 0
+
+    def __init__(self, fixture, pending):
+        self._fixture = fixture
+        self._pending = pending
+        self._lane = []
+        self._test_fixture = None
+        self._proc = None
+        self._source = None
+
+    @property
+    def stdout(self):
+        return self
+
+    def wait(self):
+        return self.returncode
+
+    def _start_next(self):
+        if not self._lane:
+            try:
+                self._lane = list(self._pending.get_nowait())
+            except queue.Empty:
+                return False
+        test_id = self._lane.pop(0)
+        self._test_fixture = TestProcessorFixture(
+            [test_id], self._fixture.template, self._fixture.listopt,
+            self._fixture.idoption, self._fixture.repository,
+            parallel=False)
+        self._test_fixture.setUp()
+        self._proc = self._test_fixture.run_tests()[0]
+        self._source = self._proc.stdout
+        return True
+
+    def _finish_current(self):
+        returncode = self._proc.wait()
+        self._test_fixture.cleanUp()
+        self._proc = None
+        self._source = six.BytesIO()
+        if returncode != 0:
+            stream = subunit.StreamResultToBytes(self._source)
+            stream.status(test_id='process-returncode', test_status='fail',
+                          file_name='traceback',
+                          mime_type='text/plain;charset=utf8',
+                          file_bytes=(
+                              'returncode %d' % returncode).encode('utf8'))
+            self._source.seek(0)
+
+    def read(self, count=-1):
+        if count == 0:
+            return six.binary_type()
+        while True:
+            if self._source is None and not self._start_next():
+                return six.binary_type()
+            data = self._source.read(count)
+            if data:
+                return data
+            if self._proc is not None:
+                self._finish_current()
+            else:
+                self._source = None
+
+    def close(self):
+        if self._proc is not None:
+            self._proc.stdout.close()
+            self._finish_current()
@@ -12,11 +12,15 @@
 
 """Tests for the file repository implementation."""
 
+import datetime
 import os.path
 import shutil
 import tempfile
+import threading
 
 import fixtures
+import mock
+from subunit import iso8601
 import testtools
 from testtools import matchers
 
@@ -117,3 +121,213 @@ class TestFileRepository(base.TestCase):
         self.assertTrue(os.path.isfile(os.path.join(repo.base, '0')))
         os.chmod(os.path.join(repo.base, '0'), 0000)
         self.assertRaises(IOError, repo.get_test_run, '0')
+
+    def test_concurrent_inserts_allocate_unique_ids(self):
+        repo = self.useFixture(FileRepositoryFixture()).repo
+        ids = []
+        errors = []
+
+        def insert():
+            # Use a separate repository object per writer, like separate
+            # stestr load processes would.
+            try:
+                inserter = file.Repository(repo.base).get_inserter()
+                inserter.startTestRun()
+                inserter.status(test_id='test', test_status='success')
+                inserter.stopTestRun()
+                ids.append(inserter.get_id())
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=insert) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual([], errors)
+        self.assertEqual(list(range(8)), sorted(ids))
+        self.assertEqual(8, repo.count())
+        for run_id in ids:
+            self.assertTrue(os.path.isfile(os.path.join(repo.base,
+                                                        str(run_id))))
+
+    def test_lock_is_released(self):
+        repo = self.useFixture(FileRepositoryFixture()).repo
+        with repo._lock('next-stream'):
+            pass
+        with repo._lock('next-stream'):
+            self.assertTrue(os.path.isfile(os.path.join(
+                repo.base, 'next-stream.lock')))
+
+    def _insert_run(self, repo, test_id='test'):
+        start = datetime.datetime.now(iso8601.UTC)
+        inserter = repo.get_inserter()
+        inserter.startTestRun()
+        inserter.status(test_id=test_id, test_status='inprogress',
+                        timestamp=start)
+        inserter.status(test_id=test_id, test_status='success',
+                        timestamp=start + datetime.timedelta(seconds=1))
+        inserter.stopTestRun()
+        return inserter.get_id()
+
+    def test_get_test_resources(self):
+        repo = self.useFixture(FileRepositoryFixture()).repo
+        start = datetime.datetime.now(iso8601.UTC)
+        inserter = repo.get_inserter()
+        inserter.startTestRun()
+        for test_id in ('measured', 'unmeasured'):
+            inserter.status(test_id=test_id, test_status='inprogress',
+                            timestamp=start)
+            if test_id == 'measured':
+                inserter.status(test_id=test_id, file_name='resources',
+                                file_bytes=b'{"user": 0.5}', eof=True,
+                                mime_type='application/json')
+            inserter.status(test_id=test_id, test_status='success',
+                            timestamp=start)
+        inserter.stopTestRun()
+        self.assertEqual({'measured': {'user': 0.5}},
+                         repo.get_test_resources())
+
+    def test_inserter_attachment_policy(self):
+        repo = self.useFixture(FileRepositoryFixture()).repo
+        start = datetime.datetime.now(iso8601.UTC)
+        inserter = repo.get_inserter(attachments=0)
+        inserter.startTestRun()
+        for test_id, status in (('passing', 'success'), ('failing', 'fail')):
+            inserter.status(test_id=test_id, test_status='inprogress',
+                            timestamp=start)
+            inserter.status(test_id=test_id, file_name='stdout',
+                            file_bytes=b'output', eof=True,
+                            mime_type='text/plain; charset=utf8')
+            inserter.status(test_id=test_id, test_status=status,
+                            test_tags=set(['worker-0']),
+                            timestamp=start + datetime.timedelta(seconds=1))
+        inserter.stopTestRun()
+        tests = {}
+        result = testtools.StreamToDict(
+            lambda x: tests.__setitem__(x['id'], x))
+        result.startTestRun()
+        repo.get_latest_run().get_test().run(result)
+        result.stopTestRun()
+        self.assertEqual({}, tests['passing']['details'])
+        self.assertEqual(['stdout'], list(tests['failing']['details']))
+        self.assertEqual(set(['worker-0']), tests['passing']['tags'])
+        self.assertEqual(datetime.timedelta(seconds=1),
+                         tests['passing']['timestamps'][1] -
+                         tests['passing']['timestamps'][0])
+
+    def _insert_timed_runs(self, repo, durations):
+        start = datetime.datetime.now(iso8601.UTC)
+        for duration in durations:
+            inserter = repo.get_inserter()
+            inserter.startTestRun()
+            inserter.status(test_id='timed', test_status='inprogress',
+                            timestamp=start)
+            inserter.status(test_id='timed', test_status='fail',
+                            timestamp=start + datetime.timedelta(
+                                seconds=duration))
+            inserter.stopTestRun()
+
+    def test_timing_data(self):
+        repo = self.useFixture(FileRepositoryFixture()).repo
+        self._insert_timed_runs(repo, (1, 3))
+        self.assertEqual({'timed': (2.0, 2)}, repo.get_timing_data())
+        repo.merge_timing_data({'timed': (1.0, 2), 'imported': (0.5, 4)})
+        self.assertEqual({'timed': (1.5, 4), 'imported': (0.5, 4)},
+                         repo.get_timing_data())
+        self.assertEqual({'timed': 1.5, 'imported': 0.5},
+                         repo.get_test_times(['timed', 'imported'])['known'])
+
+    def test_timing_data_running_mean(self):
+        repo = self.useFixture(FileRepositoryFixture()).repo
+        self._insert_timed_runs(repo, (1, 2))
+        self.assertEqual({'timed': 1.5},
+                         repo.get_test_times(['timed'])['known'])
+        # The mean is weighted by the number of samples it is based on
+        self._insert_timed_runs(repo, (6,))
+        self.assertEqual({'timed': (3.0, 3)}, repo.get_timing_data())
+
+    def test_gc_packs_old_runs(self):
+        repo = self.useFixture(FileRepositoryFixture()).repo
+        for i in range(4):
+            self._insert_run(repo, test_id='test%d' % i)
+        expected = [repo.get_test_ids(i) for i in range(4)]
+        self.assertEqual([0, 1], repo.gc(keep=2))
+        self.assertFalse(os.path.exists(os.path.join(repo.base, '0')))
+        self.assertFalse(os.path.exists(os.path.join(repo.base, '1')))
+        self.assertTrue(os.path.isfile(os.path.join(repo.base, '2')))
+        self.assertTrue(os.path.isfile(os.path.join(repo.base, '3')))
+        self.assertEqual(expected, [repo.get_test_ids(i) for i in range(4)])
+        self.assertEqual(4, repo.count())
+        self.assertIn('test0', repo.get_test_times(['test0'])['known'])
+
+    def test_gc_appends_to_existing_pack(self):
+        repo = self.useFixture(FileRepositoryFixture()).repo
+        for i in range(3):
+            self._insert_run(repo, test_id='test%d' % i)
+        self.assertEqual([0], repo.gc(keep=2))
+        self.assertEqual([1], repo.gc(keep=1))
+        self.assertEqual(['test0'], repo.get_test_ids(0))
+        self.assertEqual(['test1'], repo.get_test_ids(1))
+        self.assertRaises(KeyError, repo.get_test_run, 5)
+
+    def test_gc_keeps_young_runs(self):
+        repo = self.useFixture(FileRepositoryFixture()).repo
+        for i in range(3):
+            self._insert_run(repo)
+        self.assertEqual([], repo.gc(max_age=3600))
+        self.assertEqual([0, 1], repo.gc(max_age=0))
+
+    def test_gc_skips_removed_runs(self):
+        repo = self.useFixture(FileRepositoryFixture()).repo
+        for i in range(3):
+            self._insert_run(repo)
+        # A run removed after the directory was listed isn't packed
+        loose_run_ids = repo._loose_run_ids
+        with mock.patch.object(repo, '_loose_run_ids',
+                               lambda: [5] + loose_run_ids()):
+            self.assertEqual([0, 1], repo.gc(keep=1))
+
+    def _insert_results(self, repo, results, partial=False):
+        start = datetime.datetime.now(iso8601.UTC)
+        inserter = repo.get_inserter(partial=partial)
+        inserter.startTestRun()
+        for test_id, status, output in results:
+            inserter.status(test_id=test_id, test_status='inprogress',
+                            timestamp=start)
+            inserter.status(test_id=test_id, file_name='traceback',
+                            file_bytes=output, eof=True,
+                            mime_type='text/plain; charset=utf8')
+            inserter.status(test_id=test_id, test_status=status,
+                            timestamp=start + datetime.timedelta(seconds=1))
+        inserter.stopTestRun()
+
+    def _failing(self, repo):
+        tests = {}
+        result = testtools.StreamToDict(
+            lambda x: tests.__setitem__(
+                x['id'], x['details']['traceback'].as_text()))
+        result.startTestRun()
+        repo.get_failing().get_test().run(result)
+        result.stopTestRun()
+        return tests
+
+    def test_failing(self):
+        repo = self.useFixture(FileRepositoryFixture()).repo
+        self._insert_results(repo, [('a', 'fail', b'a1'),
+                                    ('b', 'fail', b'b1'),
+                                    ('c', 'success', b'')])
+        self.assertEqual({'a': 'a1', 'b': 'b1'}, self._failing(repo))
+        # A partial run keeps the failures of the tests it didn't run
+        self._insert_results(repo, [('a', 'success', b''),
+                                    ('d', 'fail', b'd1')], partial=True)
+        self.assertEqual({'b': 'b1', 'd': 'd1'}, self._failing(repo))
+        # The last result of a test in the run is the one kept
+        self._insert_results(repo, [('d', 'fail', b'd2'),
+                                    ('e', 'fail', b'e1'),
+                                    ('e', 'success', b''),
+                                    ('d', 'fail', b'd3')], partial=True)
+        self.assertEqual({'b': 'b1', 'd': 'd3'}, self._failing(repo))
+        # A full run replaces the failures
+        self._insert_results(repo, [('c', 'fail', b'c1')])
+        self.assertEqual({'c': 'c1'}, self._failing(repo))
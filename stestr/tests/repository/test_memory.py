@@ -0,0 +1,46 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Tests for the memory repository implementation."""
+
+import datetime
+
+from subunit import iso8601
+
+from stestr.repository import memory
+from stestr.tests import base
+
+
+class TestMemoryRepository(base.TestCase):
+
+    def _insert_timed_runs(self, repo, durations):
+        start = datetime.datetime.now(iso8601.UTC)
+        for duration in durations:
+            inserter = repo.get_inserter()
+            inserter.startTestRun()
+            inserter.status(test_id='timed', test_status='inprogress',
+                            timestamp=start)
+            inserter.status(test_id='timed', test_status='success',
+                            timestamp=start + datetime.timedelta(
+                                seconds=duration))
+            inserter.stopTestRun()
+
+    def test_timing_data_running_mean(self):
+        repo = memory.RepositoryFactory().initialise('memory:')
+        self._insert_timed_runs(repo, (1, 2))
+        self.assertEqual({'timed': 1.5},
+                         repo.get_test_times(['timed'])['known'])
+        # The mean is weighted by the number of samples it is based on
+        self._insert_timed_runs(repo, (6,))
+        self.assertEqual({'timed': (3.0, 3)}, repo.get_timing_data())
+        repo.merge_timing_data({'timed': (1.0, 3)})
+        self.assertEqual({'timed': (2.0, 6)}, repo.get_timing_data())
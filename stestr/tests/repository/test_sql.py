@@ -12,12 +12,15 @@
 
 """Tests for the sql repository implementation."""
 
+import datetime
 import os
 import os.path
 import tempfile
 import uuid
 
 import fixtures
+from subunit import iso8601
+from subunit2sql.db import api as db_api
 
 from stestr.repository import sql
 from stestr.tests import base
@@ -80,3 +83,125 @@ class TestSqlRepository(base.TestCase):
         self.assertIsNotNone(stream)
         self.assertTrue(stream.readable())
         self.assertEqual([], stream.readlines())
+
+    def _insert_tests(self, inserter, results):
+        start = datetime.datetime.now(iso8601.UTC)
+        inserter.startTestRun()
+        for test_id, status in results:
+            inserter.status(test_id=test_id, test_status='inprogress',
+                            timestamp=start)
+            inserter.status(test_id=test_id, test_status=status,
+                            timestamp=start + datetime.timedelta(seconds=1))
+        inserter.stopTestRun()
+        return inserter.get_id()
+
+    def _assert_batched_insert(self, background):
+        repo = self.useFixture(SqlRepositoryFixture(url=self.url)).repo
+        results = [('test%d' % i, 'success') for i in range(7)]
+        results += [('failing[attr]', 'fail'), ('skipped', 'skip')]
+        for _ in range(2):
+            inserter = sql._SqlInserter(repo, batch_size=3,
+                                        background=background)
+            run_id = self._insert_tests(inserter, results)
+        session = repo.session_factory()
+        self.addCleanup(session.close)
+        run = db_api.get_run_by_id(
+            db_api.get_run_id_from_uuid(run_id, session), session)
+        self.assertEqual((7, 1, 1), (run.passes, run.fails, run.skips))
+        test = db_api.get_test_by_test_id('test0', session)
+        self.assertEqual((2, 2, 0), (test.run_count, test.success,
+                                     test.failure))
+        self.assertAlmostEqual(1.0, test.run_time)
+        failing = db_api.get_test_by_test_id('failing', session)
+        self.assertEqual((2, 0, 2), (failing.run_count, failing.success,
+                                     failing.failure))
+        test_runs = db_api.get_tests_run_dicts_from_run_id(run_id, session)
+        self.assertEqual(9, len(test_runs))
+        self.assertEqual({'attrs': 'attr'},
+                         test_runs['failing']['metadata'])
+        self.assertEqual(set(x[0] for x in results),
+                         set(repo.get_test_ids(run_id)))
+
+    def test_batched_insert(self):
+        self._assert_batched_insert(background=False)
+
+    def test_batched_insert_background_writer(self):
+        self._assert_batched_insert(background=True)
+
+    def test_background_writer_error_is_raised(self):
+        repo = self.useFixture(SqlRepositoryFixture(url=self.url)).repo
+        inserter = sql._SqlInserter(repo, batch_size=1, background=True)
+
+        def _fail(batch):
+            raise ValueError('write failed')
+
+        inserter._write_batch = _fail
+        self.assertRaises(ValueError, self._insert_tests, inserter,
+                          [('test', 'success')])
+
+    def test_get_test_times(self):
+        repo = self.useFixture(SqlRepositoryFixture(url=self.url)).repo
+        self._insert_tests(repo.get_inserter(),
+                           [('test[attr]', 'success'), ('other', 'success')])
+        self.patch(sql, 'BATCH_SIZE', 1)
+        times = repo.get_test_times(['test[attr]', 'other', 'missing'])
+        self.assertEqual({'test[attr]', 'other'}, set(times['known']))
+        self.assertEqual({'missing'}, times['unknown'])
+        self.assertAlmostEqual(1.0, times['known']['test[attr]'])
+
+    def test_get_test_resources(self):
+        repo = self.useFixture(SqlRepositoryFixture(url=self.url)).repo
+        inserter = repo.get_inserter()
+        start = datetime.datetime.now(iso8601.UTC)
+        inserter.startTestRun()
+        for test_id in ('measured', 'unmeasured'):
+            inserter.status(test_id=test_id, test_status='inprogress',
+                            timestamp=start)
+            if test_id == 'measured':
+                inserter.status(test_id=test_id, file_name='resources',
+                                file_bytes=b'{"user": 0.5}', eof=True,
+                                mime_type='application/json')
+            inserter.status(test_id=test_id, test_status='success',
+                            timestamp=start + datetime.timedelta(seconds=1))
+        inserter.stopTestRun()
+        self.assertEqual({'measured': {'user': 0.5}},
+                         repo.get_test_resources())
+        self.assertEqual({'measured': {'user': 0.5}},
+                         repo.get_test_resources(inserter.get_id()))
+
+    def test_timing_data(self):
+        repo = self.useFixture(SqlRepositoryFixture(url=self.url)).repo
+        start = datetime.datetime.now(iso8601.UTC)
+        inserter = repo.get_inserter()
+        inserter.startTestRun()
+        inserter.status(test_id='timed', test_status='inprogress',
+                        timestamp=start)
+        inserter.status(test_id='timed', test_status='success',
+                        timestamp=start + datetime.timedelta(seconds=1))
+        inserter.stopTestRun()
+        self.assertEqual({'timed': (1.0, 1)}, repo.get_timing_data())
+        repo.merge_timing_data({'timed': (4.0, 2), 'imported': (0.5, 4)})
+        self.assertEqual({'timed': (3.0, 3), 'imported': (0.5, 4)},
+                         repo.get_timing_data())
+        self.assertEqual({'timed': 3.0, 'imported': 0.5},
+                         repo.get_test_times(['timed', 'imported'])['known'])
+
+    def test_get_previous_ids(self):
+        repo = self.useFixture(SqlRepositoryFixture(url=self.url)).repo
+        run_ids = [self._insert_tests(repo.get_inserter(),
+                                      [('test', 'success')])
+                   for _ in range(3)]
+        self.assertEqual([run_ids[1], run_ids[0]],
+                         repo.get_previous_ids(run_ids[2], 5))
+        self.assertEqual([run_ids[1]], repo.get_previous_ids(run_ids[2], 1))
+        self.assertEqual([], repo.get_previous_ids(run_ids[0], 5))
+
+    def test_session_factory_is_shared(self):
+        repo = self.useFixture(SqlRepositoryFixture(url=self.url)).repo
+        inserter = repo.get_inserter()
+        run_id = self._insert_tests(inserter, [('test', 'success')])
+        self.assertIs(repo.session_factory, inserter.session_factory)
+        self.assertIs(repo.session_factory,
+                      repo.get_test_run(run_id).session_factory)
+        self.assertIs(repo.session_factory,
+                      sql.RepositoryFactory().open(self.url).session_factory)
@@ -0,0 +1,84 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+from testtools.testresult import doubles
+
+from stestr import attachment_policy
+from stestr.tests import base
+
+
+class TestAttachmentPolicy(base.TestCase):
+
+    def test_parse(self):
+        self.assertIsNone(attachment_policy.parse('all'))
+        self.assertEqual(0, attachment_policy.parse('failures'))
+        self.assertEqual(2048, attachment_policy.parse(' 2 '))
+        for value in ('some', '-1', '1.5', ''):
+            self.assertRaises(ValueError, attachment_policy.parse, value)
+
+    def test_wrap_keep_all(self):
+        result = doubles.StreamResult()
+        self.assertIs(result, attachment_policy.wrap(result, None))
+
+    def _run_test(self, limit, status, chunks=(b'abc', b'def')):
+        target = doubles.StreamResult()
+        result = attachment_policy.wrap(target, limit)
+        result.startTestRun()
+        result.status(test_id='test', test_status='inprogress',
+                      timestamp=1)
+        for chunk in chunks:
+            result.status(test_id='test', file_name='stdout',
+                          file_bytes=chunk, mime_type='text/plain',
+                          timestamp=2)
+        result.status(test_id='test', file_name='resources',
+                      file_bytes=b'{}', eof=True, timestamp=3)
+        result.status(test_id='test', test_status=status,
+                      test_tags=set(['worker-0']), timestamp=4)
+        result.stopTestRun()
+        return [x[1:7] + (x[10],) for x in target._events
+                if x[0] == 'status']
+
+    def test_failures_drops_successful_attachments(self):
+        self.assertEqual([
+            ('test', 'inprogress', None, True, None, None, 1),
+            ('test', None, None, True, 'resources', b'{}', 3),
+            ('test', 'success', set(['worker-0']), True, None, None, 4),
+        ], self._run_test(0, 'success'))
+
+    def test_failures_keeps_failure_attachments(self):
+        self.assertEqual([
+            ('test', 'inprogress', None, True, None, None, 1),
+            ('test', None, None, True, 'stdout', b'abc', 2),
+            ('test', None, None, True, 'stdout', b'def', 2),
+            ('test', None, None, True, 'resources', b'{}', 3),
+            ('test', 'fail', set(['worker-0']), True, None, None, 4),
+        ], self._run_test(0, 'fail'))
+
+    def test_truncate(self):
+        events = self._run_test(1024, 'success', [b'a' * 1000, b'b' * 100])
+        self.assertEqual(
+            [1000, 24], [len(x[5]) for x in events if x[4] == 'stdout'])
+
+    def test_truncate_keeps_utf8_characters(self):
+        chunk = b'a' * 1023 + u'\xe9'.encode('utf8')
+        events = self._run_test(1024, 'success', [chunk])
+        self.assertEqual([b'a' * 1023],
+                         [x[5] for x in events if x[4] == 'stdout'])
+
+    def test_unfinished_test_keeps_attachments(self):
+        target = doubles.StreamResult()
+        result = attachment_policy.wrap(target, 0)
+        result.startTestRun()
+        result.status(test_id='test', file_name='stdout', file_bytes=b'abc')
+        result.stopTestRun()
+        self.assertEqual(['stdout'], [x[5] for x in target._events
+                                      if x[0] == 'status'])
@@ -0,0 +1,129 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import threading
+import time
+
+from stestr import bisect_tests
+from stestr.repository import memory
+from stestr.tests import base
+
+
+class FakeAnalyzer(bisect_tests.IsolationAnalyzer):
+    """An analyzer where a test fails if all of its causes ran before it."""
+
+    def __init__(self, causes, concurrency=4):
+        super(FakeAnalyzer, self).__init__(None, concurrency=concurrency)
+        self.causes = causes
+        self.probes = []
+        self._lock = threading.Lock()
+
+    def probe(self, test_ids):
+        with self._lock:
+            self.probes.append(list(test_ids))
+        statuses = {}
+        for i, test_id in enumerate(test_ids):
+            causes = self.causes.get(test_id)
+            if causes is not None and (
+                    not causes or set(causes) <= set(test_ids[:i])):
+                statuses[test_id] = 'fail'
+            else:
+                statuses[test_id] = 'success'
+        return statuses
+
+
+class TestIsolationAnalyzer(base.TestCase):
+
+    def setUp(self):
+        super(TestIsolationAnalyzer, self).setUp()
+        self.prior = ['test%d' % i for i in range(20)]
+
+    def test_find_single_cause(self):
+        analyzer = FakeAnalyzer({'failing': ['test13']})
+        self.assertEqual({'failing': ['test13']},
+                         analyzer.analyze(['failing'],
+                                          {'failing': self.prior}))
+
+    def test_find_multiple_causes(self):
+        analyzer = FakeAnalyzer({'failing': ['test2', 'test17']})
+        self.assertEqual({'failing': ['test2', 'test17']},
+                         analyzer.analyze(['failing'],
+                                          {'failing': self.prior}))
+
+    def test_find_causes_serial(self):
+        analyzer = FakeAnalyzer({'failing': ['test2', 'test17']},
+                                concurrency=1)
+        self.assertEqual({'failing': ['test2', 'test17']},
+                         analyzer.analyze(['failing'],
+                                          {'failing': self.prior}))
+
+    def test_failing_on_its_own(self):
+        analyzer = FakeAnalyzer({'failing': []})
+        self.assertEqual({}, analyzer.analyze(['failing'],
+                                              {'failing': self.prior}))
+        self.assertEqual([['failing']], analyzer.probes)
+
+    def test_unknown_cause(self):
+        analyzer = FakeAnalyzer({'failing': ['not_run_before']})
+        self.assertEqual({'failing': None},
+                         analyzer.analyze(['failing'],
+                                          {'failing': self.prior}))
+
+    def test_several_failures(self):
+        analyzer = FakeAnalyzer({'failing1': ['test3'],
+                                 'failing2': ['test4', 'test9'],
+                                 'failing3': []})
+        prior = dict((x, self.prior) for x in ('failing1', 'failing2',
+                                               'failing3'))
+        self.assertEqual({'failing1': ['test3'],
+                          'failing2': ['test4', 'test9']},
+                         analyzer.analyze(sorted(prior), prior))
+
+    def test_probes_respect_concurrency(self):
+        analyzer = FakeAnalyzer(dict(('failing%d' % i, ['test%d' % i])
+                                     for i in range(3)), concurrency=1)
+        running = [0]
+        most = [0]
+        probe = analyzer.probe
+
+        def counting_probe(test_ids):
+            with analyzer._lock:
+                running[0] += 1
+                most[0] = max(most[0], running[0])
+            time.sleep(0.01)
+            try:
+                return probe(test_ids)
+            finally:
+                with analyzer._lock:
+                    running[0] -= 1
+
+        analyzer.probe = counting_probe
+        prior = dict(('failing%d' % i, self.prior) for i in range(3))
+        self.assertEqual(dict(('failing%d' % i, ['test%d' % i])
+                              for i in range(3)),
+                         analyzer.analyze(sorted(prior), prior))
+        self.assertEqual(1, most[0])
+
+
+class TestPriorTests(base.TestCase):
+
+    def test_prior_tests(self):
+        repo = memory.RepositoryFactory().initialise('memory:')
+        inserter = repo.get_inserter()
+        inserter.startTestRun()
+        for worker, test_id in [(0, 'a'), (1, 'b'), (0, 'c'), (1, 'd'),
+                                (0, 'e')]:
+            inserter.status(test_id=test_id, test_status='success',
+                            test_tags=set(['worker-%d' % worker]))
+        inserter.stopTestRun()
+        prior = bisect_tests.prior_tests(repo.get_latest_run(), ['e', 'd'])
+        self.assertEqual({'e': ['a', 'c'], 'd': ['b']}, prior)
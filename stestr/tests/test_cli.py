@@ -0,0 +1,53 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import subprocess
+import sys
+
+from stestr import cli
+from stestr.tests import base
+
+
+class TestStestrCLI(base.TestCase):
+
+    def test_only_command_run_imported(self):
+        stestr_cli = cli.StestrCLI(['-q', 'last', '--subunit'])
+        self.assertEqual(['last'], list(stestr_cli.command_dict))
+        args = stestr_cli.parser.parse_known_args(['-q', 'last', '--subunit'])
+        self.assertTrue(args[0].subunit)
+
+    def test_all_commands_imported_without_command(self):
+        stestr_cli = cli.StestrCLI(['--help'])
+        self.assertEqual(sorted(cli.StestrCLI.commands),
+                         sorted(stestr_cli.command_dict))
+
+    def test_unknown_command(self):
+        stestr_cli = cli.StestrCLI(['bogus'])
+        self.assertEqual(sorted(cli.StestrCLI.commands),
+                         sorted(stestr_cli.command_dict))
+
+    def test_parser_doesnt_import_dependencies(self):
+        # The tests have imported everything already, check in a new process
+        code = ('import sys\n'
+                'from stestr import cli\n'
+                'import stestr.commands\n'
+                'cli.StestrCLI(["last"])\n'
+                'print(sorted(x for x in ("subunit", "testtools", "fixtures")'
+                ' if x in sys.modules))\n')
+        output = subprocess.check_output([sys.executable, '-c', code])
+        self.assertEqual(b'[]', output.strip())
+
+    def test_commands_import_on_call(self):
+        from stestr import commands
+        self.assertEqual('last', commands.last_command.__name__)
+        self.assertIn('stestr.commands.last.last',
+                      commands.last_command.__doc__)
@@ -0,0 +1,125 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import argparse
+import datetime
+import shutil
+import tempfile
+
+import six
+from subunit import iso8601
+
+from stestr.commands import compare
+from stestr.repository import util
+from stestr.tests import base
+
+
+class TestStats(base.TestCase):
+
+    def test_mean_and_stdev(self):
+        stats = compare.Stats()
+        self.assertEqual(0.0, stats.stdev)
+        for value in (2.0, 4.0, 4.0, 4.0, 5.0, 5.0, 7.0, 9.0):
+            stats.add(value)
+        self.assertEqual(8, stats.count)
+        self.assertAlmostEqual(5.0, stats.mean)
+        self.assertAlmostEqual(2.13809, stats.stdev, places=5)
+
+    def test_is_regression(self):
+        # Each of the limits has to be exceeded
+        self.assertTrue(compare.is_regression(1.5, 1.0, 0.1))
+        self.assertFalse(compare.is_regression(1.5, 1.0, 0.2))
+        self.assertFalse(compare.is_regression(1.15, 1.0, 0.0))
+        self.assertFalse(compare.is_regression(0.09, 0.01, 0.0))
+        self.assertTrue(compare.is_regression(0.09, 0.01, 0.0, min_delta=0))
+
+
+class TestCompare(base.TestCase):
+
+    def setUp(self):
+        super(TestCompare, self).setUp()
+        self.tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tempdir)
+        self.repo = util.get_repo_initialise('file', self.tempdir)
+
+    def _insert_run(self, durations):
+        start = datetime.datetime(2017, 1, 1, tzinfo=iso8601.UTC)
+        inserter = self.repo.get_inserter()
+        inserter.startTestRun()
+        for test_id, duration in sorted(durations.items()):
+            tags = set(['worker-0'])
+            inserter.status(test_id=test_id, test_status='inprogress',
+                            test_tags=tags, timestamp=start)
+            start += datetime.timedelta(seconds=duration)
+            inserter.status(test_id=test_id, test_status='success',
+                            test_tags=tags, timestamp=start)
+        inserter.stopTestRun()
+
+    def _compare(self, *args, **kwargs):
+        stdout = six.StringIO()
+        result = compare.compare(*args, repo_url=self.tempdir, stdout=stdout,
+                                 **kwargs)
+        return result, stdout.getvalue()
+
+    def test_regression(self):
+        for slow in (1.0, 1.1, 0.9):
+            self._insert_run({'slow': slow, 'steady': 2.0, 'removed': 1.0})
+        self._insert_run({'slow': 2.0, 'steady': 2.05, 'added': 1.0})
+        result, output = self._compare()
+        self.assertEqual(1, result)
+        self.assertIn('Comparing run 3 with run 2 (baseline of 3 runs)',
+                      output)
+        self.assertIn('1 tests regressed', output)
+        self.assertIn('+100.0%', output)
+        self.assertNotIn('steady  ', output)
+        self.assertIn('1 new tests:\n  added\n', output)
+        self.assertIn('1 removed tests:\n  removed\n', output)
+        self.assertIn('Worker 0', output)
+
+    def test_noise_is_not_a_regression(self):
+        for slow in (1.0, 2.0, 1.0, 2.0):
+            self._insert_run({'slow': slow})
+        self._insert_run({'slow': 2.5})
+        self.assertEqual(0, self._compare()[0])
+        # Compared with a single run there is no variance to allow for
+        self.assertEqual(1, self._compare(history=1)[0])
+
+    def test_explicit_runs(self):
+        self._insert_run({'test': 1.0})
+        self._insert_run({'test': 3.0})
+        self._insert_run({'test': 1.0})
+        self.assertEqual(1, self._compare('0', '1')[0])
+        self.assertEqual(0, self._compare('0')[0])
+
+    def test_no_previous_run(self):
+        self._insert_run({'test': 1.0})
+        self.assertEqual(3, self._compare()[0])
+        self.assertEqual(3, self._compare('5')[0])
+
+    def test_run_b_is_not_in_the_baseline(self):
+        self._insert_run({'test': 1.0})
+        self._insert_run({'test': 5.0})
+        self._insert_run({'test': 1.0})
+        # Run 1 comes before run 2 but is the run being checked
+        result, output = self._compare('2', '1', history=3)
+        self.assertEqual(1, result)
+        self.assertIn('Comparing run 1 with run 2 (baseline of 2 runs)',
+                      output)
+        self.assertEqual(2, self._compare('1', '1')[0])
+
+    def test_history_option(self):
+        parser = argparse.ArgumentParser()
+        compare.set_cli_opts(parser)
+        self.assertEqual(1, parser.parse_args(['--history', '1']).history)
+        for value in ('0', '-2'):
+            self.assertRaises(SystemExit, parser.parse_args,
+                              ['--history', value])
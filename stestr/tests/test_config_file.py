@@ -10,6 +10,10 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import os
+import shutil
+import tempfile
+
 import mock
 
 from stestr import config_file
@@ -23,6 +27,7 @@ class TestTestrConf(base.TestCase):
         super(TestTestrConf, self).setUp()
         self._testr_conf = config_file.TestrConf(mock.sentinel.config_file)
         self._testr_conf.parser = mock.Mock()
+        self._testr_conf.parser.has_section.return_value = False
 
     @mock.patch.object(config_file.util, 'get_repo_open')
     @mock.patch.object(config_file.test_processor, 'TestProcessorFixture')
@@ -48,7 +53,8 @@ class TestTestrConf(base.TestCase):
             mock_get_repo_open.return_value, black_regex=None,
             blacklist_file=None, concurrency=0, group_callback=mock.ANY,
             test_filters=None, randomize=False, serial=False,
-            whitelist_file=None, worker_path=None)
+            whitelist_file=None, worker_path=None, isolated=False, shard=None,
+            resource_callback=None)
 
     def test_get_run_command_linux(self):
         self._check_get_run_command(platform='linux2',
@@ -56,3 +62,41 @@ class TestTestrConf(base.TestCase):
 
     def test_get_run_command_win32(self):
         self._check_get_run_command()
+
+    @mock.patch.object(config_file.util, 'get_repo_open')
+    @mock.patch.object(config_file.test_processor, 'TestProcessorFixture')
+    def test_get_run_command_resources(self, mock_TestProcessorFixture,
+                                       mock_get_repo_open):
+        tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tempdir)
+        path = os.path.join(tempdir, '.stestr.conf')
+        with open(path, 'w') as conf_file:
+            conf_file.write('[DEFAULT]\n'
+                            'test_path=./tests\n'
+                            '[resources]\n'
+                            'db = tests\\.test_db\n'
+                            '     tests\\.test_models\\.Migrations\n'
+                            'port = test_server\n')
+        config_file.TestrConf(path).get_run_command()
+        resource_callback = mock_TestProcessorFixture.call_args[1][
+            'resource_callback']
+        self.assertEqual(['db'], resource_callback('tests.test_db.test_a'))
+        self.assertEqual(
+            ['db', 'port'],
+            resource_callback('tests.test_models.Migrations.test_server'))
+        self.assertEqual([], resource_callback('tests.test_api.test_a'))
+
+    def test_get_attachment_policy(self):
+        tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tempdir)
+        path = os.path.join(tempdir, '.stestr.conf')
+        with open(path, 'w') as conf_file:
+            conf_file.write('[DEFAULT]\n'
+                            'test_path=./tests\n'
+                            'attachments=failures\n')
+        conf = config_file.TestrConf(path)
+        self.assertEqual(0, conf.get_attachment_policy())
+        self.assertEqual(4096, conf.get_attachment_policy('4'))
+        self.assertIsNone(conf.get_attachment_policy('all'))
+        self.assertIsNone(config_file.TestrConf(
+            os.path.join(tempdir, 'missing')).get_attachment_policy())
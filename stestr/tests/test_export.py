@@ -0,0 +1,153 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import argparse
+import csv
+import datetime
+import io
+import json
+import os
+import shutil
+import tempfile
+from xml.etree import ElementTree
+
+import six
+from subunit import iso8601
+from testtools import content
+
+from stestr.commands import export
+from stestr.repository import util
+from stestr.tests import base
+
+
+class TestExportWriters(base.TestCase):
+
+    def setUp(self):
+        super(TestExportWriters, self).setUp()
+        self.start = datetime.datetime(2017, 1, 1, tzinfo=iso8601.UTC)
+
+    def _write(self, writer_class):
+        stream = six.StringIO()
+        writer = writer_class(stream, '3')
+        writer.start()
+        for test_id, status, details in (
+                ('tests.test_a.TestA.test_pass[smoke,v1.2]', 'success', {}),
+                ('tests.test_a.TestA.test_fail', 'fail',
+                 {'traceback': content.text_content(
+                     'Traceback\nAssertionError: <boom>\x00')}),
+                ('tests.test_b.TestB.test_skip', 'skip',
+                 {'reason': content.text_content('not today')}),
+                ('tests.test_b.TestB.test_listed', 'exists', {})):
+            writer.add_test({
+                'id': test_id,
+                'status': status,
+                'tags': set(['worker-0']),
+                'details': details,
+                'timestamps': (self.start,
+                               self.start + datetime.timedelta(seconds=2)),
+            })
+        writer.finish()
+        self.assertEqual(3, writer.tests)
+        return stream.getvalue()
+
+    def test_junitxml(self):
+        suite = ElementTree.fromstring(self._write(export.JUnitXMLWriter))
+        self.assertEqual(
+            {'errors': '0', 'failures': '1', 'name': '3', 'skipped': '1',
+             'tests': '3', 'time': '6.000000'}, suite.attrib)
+        cases = suite.findall('testcase')
+        self.assertEqual(
+            [('tests.test_a.TestA', 'test_pass[smoke,v1.2]'),
+             ('tests.test_a.TestA', 'test_fail'),
+             ('tests.test_b.TestB', 'test_skip')],
+            [(x.get('classname'), x.get('name')) for x in cases])
+        failure = cases[1].find('failure')
+        self.assertEqual(u'AssertionError: <boom>\ufffd',
+                         failure.get('message'))
+        self.assertIn('Traceback', failure.text)
+        self.assertEqual('not today', cases[2].find('skipped').get('message'))
+
+    def test_json(self):
+        document = json.loads(self._write(export.JSONWriter))
+        self.assertEqual('3', document['run_id'])
+        self.assertEqual({'fail': 1, 'skip': 1, 'success': 1},
+                         document['statuses'])
+        passed, failed, skipped = document['tests']
+        self.assertEqual(2.0, passed['duration'])
+        self.assertEqual(['worker-0'], passed['tags'])
+        self.assertNotIn('details', passed)
+        self.assertIn('AssertionError', failed['details']['traceback'])
+        self.assertEqual({'reason': 'not today'}, skipped['details'])
+
+    def test_csv(self):
+        rows = list(csv.reader(six.StringIO(self._write(export.CSVWriter))))
+        self.assertEqual(list(export.CSVWriter.fields), rows[0])
+        self.assertEqual(
+            ['tests.test_a.TestA.test_fail', 'fail',
+             '2017-01-01T00:00:00+00:00', '2017-01-01T00:00:02+00:00', '2.0',
+             'worker-0'], rows[2])
+        self.assertEqual(4, len(rows))
+
+
+class TestExportOutput(base.TestCase):
+
+    def setUp(self):
+        super(TestExportOutput, self).setUp()
+        self.repo_url = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.repo_url)
+        repo = util.get_repo_initialise('file', self.repo_url)
+        start = datetime.datetime(2017, 1, 1, tzinfo=iso8601.UTC)
+        inserter = repo.get_inserter()
+        inserter.startTestRun()
+        for test_id, status in ((u'tests.test_\xe9t\xe9.test_pass', 'success'),
+                                (u'tests.test_\u4e2d.test_fail', 'fail')):
+            inserter.status(test_id=test_id, test_status='inprogress',
+                            timestamp=start)
+            if status == 'fail':
+                inserter.status(
+                    test_id=test_id, file_name='traceback',
+                    file_bytes=u'AssertionError: \u2603'.encode('utf8'),
+                    eof=True, mime_type='text/plain; charset=utf8')
+            inserter.status(test_id=test_id, test_status=status,
+                            timestamp=start + datetime.timedelta(seconds=1))
+        inserter.stopTestRun()
+
+    def _export(self, output_format):
+        path = os.path.join(self.repo_url, 'export.out')
+        args = argparse.Namespace(output=path, output_format=output_format,
+                                  repo_type='file', repo_url=self.repo_url)
+        self.assertEqual(0, export.run((args, [])))
+        with io.open(path, encoding='utf-8') as output_file:
+            return output_file.read()
+
+    def test_junitxml_output_file(self):
+        suite = ElementTree.fromstring(
+            self._export('junitxml').encode('utf8'))
+        cases = suite.findall('testcase')
+        self.assertEqual([u'tests.test_\xe9t\xe9', u'tests.test_\u4e2d'],
+                         [x.get('classname') for x in cases])
+        self.assertEqual(u'AssertionError: \u2603',
+                         cases[1].find('failure').get('message'))
+
+    def test_json_output_file(self):
+        document = json.loads(self._export('json'))
+        self.assertEqual([u'tests.test_\xe9t\xe9.test_pass',
+                          u'tests.test_\u4e2d.test_fail'],
+                         [x['id'] for x in document['tests']])
+        self.assertEqual(u'AssertionError: \u2603',
+                         document['tests'][1]['details']['traceback'])
+
+    def test_csv_output_file(self):
+        rows = self._export('csv').splitlines()
+        self.assertEqual(3, len(rows))
+        self.assertTrue(rows[1].startswith(u'tests.test_\xe9t\xe9.test_pass,'))
+        self.assertTrue(rows[2].startswith(u'tests.test_\u4e2d.test_fail,'))
@@ -0,0 +1,73 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import json
+import os
+import shutil
+import tempfile
+
+from stestr import instrumentation
+from stestr.tests import base
+
+
+class TestInstrumentation(base.TestCase):
+
+    def setUp(self):
+        super(TestInstrumentation, self).setUp()
+        self.tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tempdir)
+        self.addCleanup(instrumentation.disable)
+        self.path = os.path.join(self.tempdir, 'trace.json')
+
+    def _read_events(self):
+        with open(self.path) as trace_file:
+            return json.load(trace_file)['traceEvents']
+
+    def test_span_disabled(self):
+        with instrumentation.span('phase'):
+            pass
+        self.assertFalse(instrumentation.enabled())
+        instrumentation.disable()
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_spans_written_as_chrome_trace(self):
+        instrumentation.enable(self.path)
+        with instrumentation.span('outer'):
+            with instrumentation.span('inner', test_ids=3):
+                pass
+        instrumentation.disable()
+        events = self._read_events()
+        self.assertEqual(['outer', 'inner'], [x['name'] for x in events])
+        outer, inner = events
+        self.assertEqual('X', inner['ph'])
+        self.assertEqual(3, inner['args']['test_ids'])
+        self.assertIn('cpu_ms', inner['args'])
+        self.assertLessEqual(outer['ts'], inner['ts'])
+        self.assertLessEqual(inner['ts'] + inner['dur'],
+                             outer['ts'] + outer['dur'])
+
+    def test_span_recorded_on_error(self):
+        instrumentation.enable(self.path)
+
+        def fail():
+            with instrumentation.span('failing'):
+                raise ValueError()
+
+        self.assertRaises(ValueError, fail)
+        instrumentation.disable()
+        self.assertEqual(['failing'],
+                         [x['name'] for x in self._read_events()])
+
+    def test_cprofile(self):
+        instrumentation.enable(self.path, cprofile=True)
+        instrumentation.disable()
+        self.assertTrue(os.path.isfile(self.path + '.prof'))
@@ -0,0 +1,95 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+
+import datetime
+import os
+import shutil
+import tempfile
+
+import six
+from subunit import iso8601
+from testtools.testresult import doubles
+
+from stestr.commands import merge
+from stestr.repository import util
+from stestr.tests import base
+
+
+class TestWorkerRenumberer(base.TestCase):
+
+    def test_renumber_sources(self):
+        target = doubles.StreamResult()
+        renumberer = merge.WorkerRenumberer(target)
+        for tags in (['worker-0', 'smoke'], ['worker-3'], ['worker-0']):
+            renumberer.status(test_id='a', test_tags=set(tags))
+        renumberer.next_source()
+        renumberer.status(test_id='b', test_tags=set(['worker-0']))
+        renumberer.status(test_id='b')
+        self.assertEqual(
+            [set(['worker-0', 'smoke']), set(['worker-1']),
+             set(['worker-0']), set(['worker-2']), None],
+            [event[3] for event in target._events])
+
+
+class TestMerge(base.TestCase):
+
+    def setUp(self):
+        super(TestMerge, self).setUp()
+        self.tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tempdir)
+
+    def _make_repo(self, name, results):
+        url = os.path.join(self.tempdir, name)
+        os.mkdir(url)
+        repo = util.get_repo_initialise('file', url)
+        start = datetime.datetime.now(iso8601.UTC)
+        inserter = repo.get_inserter()
+        inserter.startTestRun()
+        for test_id, status in results:
+            tags = set(['worker-0'])
+            inserter.status(test_id=test_id, test_status='inprogress',
+                            test_tags=tags, timestamp=start)
+            inserter.status(test_id=test_id, test_status=status,
+                            test_tags=tags,
+                            timestamp=start + datetime.timedelta(seconds=1))
+        inserter.stopTestRun()
+        return url
+
+    def test_merge(self):
+        sources = [self._make_repo('shard1', [('a', 'success')]),
+                   self._make_repo('shard2', [('b', 'fail'),
+                                              ('c', 'success')])]
+        target = os.path.join(self.tempdir, 'target')
+        os.mkdir(target)
+        stdout = six.StringIO()
+        self.assertEqual(0, merge.merge(sources, repo_url=target,
+                                        stdout=stdout))
+        self.assertEqual('Merged 2 runs with 3 tests into run 0\n',
+                         stdout.getvalue())
+        repo = util.get_repo_open('file', target)
+        self.assertEqual(['a', 'b', 'c'], sorted(repo.get_test_ids(0)))
+        failing = doubles.StreamResult()
+        repo.get_failing().get_test().run(failing)
+        statuses = [event[1:3] for event in failing._events
+                    if event[0] == 'status']
+        self.assertEqual([('b', 'inprogress'), ('b', 'fail')],
+                         [x for x in statuses if x[1] is not None])
+        self.assertEqual(
+            {'a': 1.0, 'b': 1.0, 'c': 1.0},
+            repo.get_test_times(['a', 'b', 'c'])['known'])
+
+    def test_merge_missing_source(self):
+        target = os.path.join(self.tempdir, 'target')
+        self.assertEqual(1, merge.merge(
+            [os.path.join(self.tempdir, 'missing')], repo_url=target))
+        self.assertFalse(os.path.exists(target))
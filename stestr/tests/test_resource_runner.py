@@ -0,0 +1,80 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import io
+import json
+import unittest
+
+import subunit
+import testtools
+from testtools.testresult import doubles
+
+from stestr import resource_runner
+from stestr.tests import base
+
+
+class TestResourceRunner(base.TestCase):
+
+    def test_diff_usage(self):
+        start = {'user': 1.0, 'read_bytes': 10, 'max_rss': 100}
+        end = {'user': 1.5, 'read_bytes': 30, 'max_rss': 120}
+        self.assertEqual({'user': 0.5, 'read_bytes': 20, 'max_rss': 120},
+                         resource_runner.diff_usage(start, end))
+
+    def test_resource_usage_result_attaches_usage(self):
+        events = doubles.StreamResult()
+        result = resource_runner.ResourceUsageResult(events)
+        result.startTestRun()
+        result.status(test_id='test', test_status='inprogress')
+        result.status(test_id='test', test_status='success')
+        result.stopTestRun()
+        statuses = [x for x in events._events if x[0] == 'status']
+        self.assertEqual(['inprogress', None, 'success'],
+                         [x[2] for x in statuses])
+        attachment = statuses[1]
+        self.assertEqual(resource_runner.ATTACHMENT_NAME, attachment[5])
+        self.assertEqual('application/json', attachment[8])
+        usage = json.loads(attachment[6].decode('utf8'))
+        if resource_runner.resource is not None:
+            self.assertIn('user', usage)
+            self.assertIn('max_rss', usage)
+
+    def test_runner_output_parses(self):
+        class Sample(unittest.TestCase):
+
+            def test_pass(self):
+                pass
+
+            def test_fail(self):
+                self.fail('boom')
+
+        suite = unittest.TestLoader().loadTestsFromTestCase(Sample)
+        stream = io.BytesIO()
+        resource_runner.ResourceTestRunner(stdout=stream).run(suite)
+        stream.seek(0)
+        resources = {}
+
+        def gather(test_dict):
+            resources[test_dict['id'].split('.')[-1]] = (
+                resource_runner.parse_resources(test_dict['details']))
+
+        result = testtools.StreamToDict(gather)
+        result.startTestRun()
+        subunit.ByteStreamToStreamResult(stream).run(result)
+        result.stopTestRun()
+        self.assertEqual(['test_fail', 'test_pass'], sorted(resources))
+        for usage in resources.values():
+            self.assertIsInstance(usage, dict)
+
+    def test_parse_resources_without_attachment(self):
+        self.assertIsNone(resource_runner.parse_resources({}))
+        self.assertIsNone(resource_runner.parse_resources(None))
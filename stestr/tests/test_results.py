@@ -0,0 +1,95 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import datetime
+
+import six
+from subunit import iso8601
+import testtools
+
+from stestr import results
+from stestr.tests import base
+
+
+class TestProgressResult(base.TestCase):
+
+    def setUp(self):
+        super(TestProgressResult, self).setUp()
+        self.stream = six.StringIO()
+        self.target = testtools.StreamSummary()
+        self.start = datetime.datetime(2017, 1, 1, tzinfo=iso8601.UTC)
+
+    def _run_test(self, result, test_id, worker, seconds):
+        tags = set(['worker-%d' % worker])
+        result.status(test_id=test_id, test_status='inprogress',
+                      test_tags=tags, timestamp=self.start)
+        self.start += datetime.timedelta(seconds=seconds)
+        result.status(test_id=test_id, test_status='success',
+                      test_tags=tags, timestamp=self.start)
+
+    def test_forwards_events(self):
+        result = results.ProgressResult(self.target, self.stream,
+                                        redraw=False)
+        result.startTestRun()
+        self._run_test(result, 'test', 0, 1)
+        result.stopTestRun()
+        self.assertEqual(1, self.target.testsRun)
+        self.assertEqual(1, result.done)
+
+    def test_status_line_unknown_plan(self):
+        result = results.ProgressResult(self.target, self.stream,
+                                        redraw=False)
+        result.startTestRun()
+        self._run_test(result, 'test', 0, 1)
+        self.assertEqual('[1] elapsed 0:00:00',
+                         result.get_status_line(now=result._start))
+
+    def test_status_line_eta(self):
+        partitions = [['a', 'b'], ['c', 'd']]
+        estimates = {'a': 10.0, 'b': 20.0, 'c': 5.0}
+        result = results.ProgressResult(self.target, self.stream,
+                                        partitions=partitions,
+                                        estimates=estimates, redraw=False)
+        result.startTestRun()
+        # 'd' has no timing data so it is assumed to take the average time
+        self.assertEqual([30.0, 5.0 + 35.0 / 3], result._get_remaining())
+        # 'a' taking twice its estimate doubles the rest of the predictions
+        self._run_test(result, 'a', 0, 20)
+        self.assertEqual([40.0, 2 * (5.0 + 35.0 / 3)],
+                         result._get_remaining())
+        line = result.get_status_line(now=result._start)
+        self.assertThat(line, testtools.matchers.StartsWith(
+            '[1/4] 25% elapsed 0:00:00, ETA 0:00:40 (finish '))
+        self.assertThat(line, testtools.matchers.EndsWith(
+            'workers: 0:00:40 0:00:33'))
+
+    def test_redraw(self):
+        result = results.ProgressResult(self.target, self.stream,
+                                        partitions=[['a', 'b']],
+                                        redraw=True, interval=0)
+        result.startTestRun()
+        self._run_test(result, 'a', 0, 1)
+        result.stopTestRun()
+        output = self.stream.getvalue()
+        self.assertIn('\r[1/2] 50%', output)
+        self.assertTrue(output.endswith('\r\x1b[K'))
+
+    def test_periodic_lines(self):
+        result = results.ProgressResult(self.target, self.stream,
+                                        partitions=[['a', 'b']],
+                                        redraw=False, interval=0)
+        result.startTestRun()
+        self._run_test(result, 'a', 0, 1)
+        result.stopTestRun()
+        output = self.stream.getvalue()
+        self.assertNotIn('\r', output)
+        self.assertIn('\n[1/2] 50%', output)
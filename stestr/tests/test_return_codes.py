@@ -12,6 +12,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import json
 import os
 import re
 import shutil
@@ -98,9 +99,73 @@ class TestReturnCodes(base.TestCase):
         self.assertRunExit('stestr run --until-failure --subunit', 1,
                            subunit=True)
 
+    def test_repeat_passing(self):
+        self.assertRunExit('stestr run --repeat 3 passing', 0)
+
+    def test_repeat_fails(self):
+        self.assertRunExit('stestr run --repeat 3', 1)
+
+    def test_until_failure_parallel_repeats_fails(self):
+        self.assertRunExit('stestr run --until-failure --parallel-repeats', 1)
+
+    def test_retry_fails(self):
+        self.assertRunExit('stestr run --retry 1', 1)
+
+    def test_retry_passing(self):
+        self.assertRunExit('stestr run --retry 1 passing', 0)
+
     def test_list(self):
         self.assertRunExit('stestr list', 0)
 
+    def test_timeline(self):
+        self.assertRunExit('stestr run passing', 0)
+        stdout = self._get_cmd_stdout('stestr timeline')
+        events = json.loads(stdout[0].decode('utf8'))['traceEvents']
+        self.assertIn('test', set(x.get('cat') for x in events))
+
+    def test_timeline_no_run(self):
+        self.assertRunExit('stestr init', 0)
+        self.assertRunExit('stestr timeline', 3)
+
+    def test_compare(self):
+        self.assertRunExit('stestr run passing', 0)
+        self.assertRunExit('stestr compare', 3)
+        self.assertRunExit('stestr run passing', 0)
+        self.assertRunExit('stestr compare', 0)
+
+    def test_export(self):
+        self.assertRunExit('stestr run', 1)
+        stdout = self._get_cmd_stdout('stestr export --format json')
+        tests = json.loads(stdout[0].decode('utf8'))['tests']
+        self.assertIn('fail', set(x['status'] for x in tests))
+        self.assertRunExit('stestr export --format junitxml -o junit.xml', 0)
+        self.assertTrue(os.path.isfile('junit.xml'))
+
+    def test_export_no_run(self):
+        self.assertRunExit('stestr init', 0)
+        self.assertRunExit('stestr export', 3)
+
+    def test_timing_export_import(self):
+        self.assertRunExit('stestr run passing', 0)
+        self.assertRunExit('stestr timing export timing.json', 0)
+        os.mkdir('other')
+        self.assertRunExit('stestr -u other timing import timing.json', 0)
+        stdout = self._get_cmd_stdout('stestr -u other timing export')
+        tests = json.loads(stdout[0].decode('utf8'))['tests']
+        self.assertIn('tests.test_passing.FakeTestClass.test_pass', tests)
+
+    def test_timing_import_invalid(self):
+        with open('timing.json', 'w') as timing_file:
+            timing_file.write('{}')
+        self.assertRunExit('stestr timing import timing.json', 1)
+
+    def test_timing_import_missing_file(self):
+        p = subprocess.Popen('stestr timing import missing.json', shell=True,
+                             stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        out, err = p.communicate()
+        self.assertEqual(1, p.returncode)
+        self.assertEqual(b'missing.json: No such file or directory\n', err)
+
     def test_no_command(self):
         self.assertRunExit('stestr', 2)
 
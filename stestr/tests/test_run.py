@@ -0,0 +1,157 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import argparse
+import datetime
+import io
+import shutil
+import tempfile
+
+import six
+import subunit
+from subunit import iso8601
+import testtools
+
+from stestr.commands import run
+from stestr.repository import util
+from stestr.tests import base
+
+
+def _subunit_bytes(results):
+    stream = six.BytesIO()
+    output = subunit.v2.StreamResultToBytes(stream)
+    start = datetime.datetime.now(iso8601.UTC)
+    for test_id, status in results:
+        output.status(test_id=test_id, test_status='inprogress',
+                      test_tags=set(['worker-0']), timestamp=start)
+        output.status(test_id=test_id, test_status=status,
+                      test_tags=set(['worker-0']),
+                      timestamp=start + datetime.timedelta(seconds=1))
+    return stream.getvalue()
+
+
+class FakeProcess(object):
+
+    def __init__(self, data):
+        self.stdout = io.BufferedReader(io.BytesIO(data))
+        self.returncode = 0
+
+    def wait(self):
+        return self.returncode
+
+
+class FakeRunCommand(object):
+    """Stand in for a TestProcessorFixture running canned results."""
+
+    def __init__(self, attempts, test_ids):
+        self.attempts = attempts
+        self.test_ids = test_ids
+
+    def setUp(self):
+        pass
+
+    def cleanUp(self):
+        pass
+
+    def run_tests(self):
+        results = self.attempts.pop(0)
+        return [FakeProcess(_subunit_bytes(
+            [(x, results[x]) for x in self.test_ids]))]
+
+
+class TestRetryFailures(base.TestCase):
+
+    def setUp(self):
+        super(TestRetryFailures, self).setUp()
+        self.repo_url = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.repo_url)
+        self.repo = util.get_repo_initialise('file', self.repo_url)
+        self.requested = []
+
+    def _insert_run(self, results):
+        inserter = self.repo.get_inserter()
+        inserter.startTestRun()
+        subunit.ByteStreamToStreamResult(
+            six.BytesIO(_subunit_bytes(results))).run(inserter)
+        inserter.stopTestRun()
+        return inserter.get_id()
+
+    def _retry(self, run_id, attempts, retry, stdout):
+        def get_run_command(test_ids):
+            self.requested.append(test_ids)
+            return FakeRunCommand(attempts, test_ids)
+
+        return run._retry_failures(
+            self.repo, run_id, get_run_command, retry, 1, repo_type='file',
+            repo_url=self.repo_url, pretty_out=False, stdout=stdout)
+
+    def _tags(self, run_id):
+        tags = []
+
+        def gather(test_dict):
+            attempts = sorted(x for x in test_dict['tags']
+                              if x.startswith('attempt-'))
+            tags.append((test_dict['id'], test_dict['status'], attempts))
+
+        result = testtools.StreamToDict(gather)
+        result.startTestRun()
+        try:
+            self.repo.get_test_run(run_id).get_test().run(result)
+        finally:
+            result.stopTestRun()
+        return tags
+
+    def test_retry_appends_attempts_to_the_run(self):
+        run_id = self._insert_run([('a', 'fail'), ('b', 'fail'),
+                                   ('c', 'success')])
+        # A later run, like one loaded concurrently, isn't retried
+        other_id = self._insert_run([('d', 'fail')])
+        stdout = six.StringIO()
+        attempts = [{'a': 'success', 'b': 'fail'}, {'b': 'fail'}]
+        self.assertEqual(1, self._retry(run_id, attempts, 2, stdout))
+        self.assertEqual([['a', 'b'], ['b']], self.requested)
+        self.assertEqual([
+            ('a', 'fail', []),
+            ('b', 'fail', []),
+            ('c', 'success', []),
+            ('a', 'success', ['attempt-1']),
+            ('b', 'fail', ['attempt-1']),
+            ('b', 'fail', ['attempt-2']),
+        ], self._tags(run_id))
+        self.assertEqual([('d', 'fail', [])], self._tags(other_id))
+        self.assertIn('The following tests failed but passed on a retry:\n'
+                      '  a\n', stdout.getvalue())
+
+    def test_retry_stops_when_all_pass(self):
+        run_id = self._insert_run([('a', 'fail'), ('b', 'fail')])
+        stdout = six.StringIO()
+        attempts = [{'a': 'success', 'b': 'success'}]
+        self.assertEqual(0, self._retry(run_id, attempts, 3, stdout))
+        self.assertEqual([['a', 'b']], self.requested)
+        self.assertIn('The following tests failed but passed on a retry:\n'
+                      '  a\n  b\n', stdout.getvalue())
+
+    def test_retry_without_a_run(self):
+        stdout = six.StringIO()
+        self.assertEqual(1, self._retry(None, [], 1, stdout))
+        self.assertEqual([], self.requested)
+
+
+class TestRunOptions(base.TestCase):
+
+    def test_repeat_option(self):
+        parser = argparse.ArgumentParser()
+        run.set_cli_opts(parser)
+        self.assertEqual(3, parser.parse_args(['--repeat', '3']).repeat)
+        for value in ('0', '-2'):
+            self.assertRaises(SystemExit, parser.parse_args,
+                              ['--repeat', value])
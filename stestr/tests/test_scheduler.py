@@ -10,6 +10,7 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import collections
 import datetime
 import re
 
@@ -117,6 +118,26 @@ class TestScheduler(base.TestCase):
         if 'testdir.testfile.TestCase5.test' not in partitions[0]:
             self.assertTrue('testdir.testfile.TestCase5.test' in partitions[1])
 
+    def test_group_by_resources(self):
+        groups = collections.OrderedDict([
+            ('a', ['a1', 'a2']), ('b', ['b1']), ('c', ['c1']),
+            ('d', ['d1'])])
+        resources = {'a2': ['db'], 'c1': ['port', 'db'], 'd1': ['port'],
+                     'b1': []}
+        merged = scheduler.group_by_resources(
+            groups, lambda x: resources.get(x, []))
+        self.assertEqual([('a', ['a1', 'a2', 'c1', 'd1']), ('b', ['b1'])],
+                         list(merged.items()))
+
+    def test_partition_tests_with_resources(self):
+        repo = memory.RepositoryFactory().initialise('memory:')
+        test_ids = ['db1', 'db2', 'db3', 'other1', 'other2', 'other3']
+        resource_callback = scheduler.get_resource_callback({'db': ['^db']})
+        partitions = scheduler.partition_tests(
+            test_ids, 4, repo, None, resource_callback=resource_callback)
+        self.assertIn(['db1', 'db2', 'db3'], partitions)
+        self.assertEqual(sorted(test_ids), sorted(sum(partitions, [])))
+
     @mock.patch('six.moves.builtins.open', mock.mock_open(), create=True)
     def test_generate_worker_partitions(self):
         test_ids = ['test_a', 'test_b', 'your_test']
@@ -132,6 +153,28 @@ class TestScheduler(base.TestCase):
         ]
         self.assertEqual(expected_grouping, groups)
 
+    @mock.patch('six.moves.builtins.open', mock.mock_open(), create=True)
+    def test_generate_worker_partitions_with_resources(self):
+        test_ids = ['test_a', 'test_b', 'your_test', 'your_db_test']
+        fake_worker_yaml = [
+            {'resources': {'db': 'db'}},
+            {'worker': ['test_a', 'test_b']},
+            {'worker': ['your_test', 'your_db']},
+        ]
+        resource_callback = scheduler.get_resource_callback(
+            {'db': ['test_b']})
+        with mock.patch('yaml.load', return_value=fake_worker_yaml):
+            groups = scheduler.generate_worker_partitions(
+                test_ids, 'fakepath', resource_callback=resource_callback)
+        self.assertEqual([['test_a', 'test_b', 'your_db_test'],
+                          ['your_test']], groups)
+        # A worker left without tests is dropped
+        fake_worker_yaml[2]['worker'] = ['your_db']
+        with mock.patch('yaml.load', return_value=fake_worker_yaml):
+            groups = scheduler.generate_worker_partitions(
+                test_ids, 'fakepath', resource_callback=resource_callback)
+        self.assertEqual([['test_a', 'test_b', 'your_db_test']], groups)
+
     @mock.patch('six.moves.builtins.open', mock.mock_open(), create=True)
     def test_generate_worker_partitions_group_without_list(self):
         test_ids = ['test_a', 'test_b', 'your_test']
@@ -203,3 +246,44 @@ class TestScheduler(base.TestCase):
             ['test_a', 'test_b', 'your_test'],
         ]
         self.assertEqual(expected_grouping, groups)
+
+    def test_shard_tests(self):
+        repo = memory.RepositoryFactory().initialise('memory:')
+        result = repo.get_inserter()
+        result.startTestRun()
+        self._add_timed_test("slow", 3, result)
+        self._add_timed_test("fast1", 1, result)
+        self._add_timed_test("fast2", 1, result)
+        result.stopTestRun()
+        test_ids = ['unknown1', 'fast1', 'unknown2', 'slow', 'fast2',
+                    'unknown3']
+        shards = [scheduler.shard_tests(test_ids, i, 2, repo)
+                  for i in range(2)]
+        self.assertEqual([['unknown1', 'unknown2', 'slow'],
+                          ['fast1', 'fast2', 'unknown3']], shards)
+        # The split doesn't depend on the order of the test ids
+        reordered = list(reversed(test_ids))
+        self.assertEqual(
+            [sorted(x) for x in shards],
+            [sorted(scheduler.shard_tests(reordered, i, 2, repo))
+             for i in range(2)])
+
+    def test_shard_tests_with_grouping(self):
+        test_ids = ['TestCase1.a', 'TestCase2.a', 'TestCase1.b',
+                    'TestCase2.b', 'TestCase3.a']
+
+        def group_id(test_id):
+            return test_id.split('.')[0]
+
+        shards = [scheduler.shard_tests(test_ids, i, 2, None, group_id)
+                  for i in range(2)]
+        self.assertEqual([['TestCase1.a', 'TestCase1.b', 'TestCase3.a'],
+                          ['TestCase2.a', 'TestCase2.b']], shards)
+
+    def test_shard_tests_invalid_shard(self):
+        self.assertRaises(ValueError, scheduler.shard_tests, ['a'], 2, 2)
+
+    def test_parse_shard(self):
+        self.assertEqual((1, 4), scheduler.parse_shard('2/4'))
+        for value in ('0/4', '5/4', '1/0', '4', 'a/b'):
+            self.assertRaises(ValueError, scheduler.parse_shard, value)
@@ -30,6 +30,30 @@ class TestSelection(base.TestCase):
         result = selection.filter_tests(['a'], test_list)
         self.assertEqual(['a'], result)
 
+    def test_filter_tests_multiple_filters(self):
+        test_list = ['a', 'b', 'c', 'ab']
+        result = selection.filter_tests(['^a$', 'b'], test_list)
+        self.assertEqual(['a', 'b', 'ab'], result)
+
+    def test_filter_tests_backreference(self):
+        test_list = ['aa', 'ab', 'c']
+        result = selection.filter_tests([r'(a)\1', 'c'], test_list)
+        self.assertEqual(['aa', 'c'], result)
+
+    def test_filter_tests_inline_flags(self):
+        test_list = ['A', 'b', 'c']
+        result = selection.filter_tests(['(?i)a', 'b'], test_list)
+        self.assertEqual(['A', 'b'], result)
+
+    def test_filter_tests_inline_flags_not_first(self):
+        # The flags of one filter mustn't apply to the others
+        result = selection.filter_tests(['b', '(?i)a'], ['B', 'A'])
+        self.assertEqual(['A'], result)
+
+    def test_filter_tests_invalid_regex(self):
+        self.assertRaises(re.error, selection.filter_tests, ['a)|(b', 'c'],
+                          ['a'])
+
 
 class TestBlackReader(base.TestCase):
     def test_black_reader(self):
@@ -116,3 +140,21 @@ class TestConstructList(base.TestCase):
                                               regexes=['fake_test'])
         self.assertEqual(
             list(result), ['compute.test_fake.FakeTest.test_fake_test'])
+
+    def test_overlapping_black_regex_skipped(self):
+        black_list = [(re.compile('KeypairsTestV210'), 'first', []),
+                      (re.compile('KeypairsTestV21'), 'second', [])]
+        test_lists = [
+            'compute.test_keypairs.KeypairsTestV210.test_create_keypair',
+            'compute.test_keypairs.KeypairsTestV21.test_create_keypair',
+            'compute.test_fake.FakeTest.test_fake_test']
+        skipped = []
+        with mock.patch('stestr.selection.black_reader',
+                        return_value=black_list):
+            result = selection.construct_list(test_lists,
+                                              blacklist_file='file',
+                                              skipped=skipped)
+        self.assertEqual(
+            list(result), ['compute.test_fake.FakeTest.test_fake_test'])
+        self.assertEqual([('first', [test_lists[0]]),
+                          ('second', [test_lists[1]])], skipped)
@@ -13,17 +13,22 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import datetime
 from datetime import datetime as dt
 import io
 import os
+import shutil
 import sys
+import tempfile
 
 from ddt import data
 from ddt import ddt
 from ddt import unpack
-from mock import patch
+import mock
 import six
+from subunit import iso8601
 
+from stestr.repository import util
 from stestr import subunit_trace
 from stestr.tests import base
 
@@ -31,15 +36,6 @@ from stestr.tests import base
 @ddt
 class TestSubunitTrace(base.TestCase):
 
-    def setUp(self):
-        super(TestSubunitTrace, self).setUp()
-        # NOTE(mtreinish): subunit-trace relies on a global to track results
-        # with the expectation that it's run once per python interpreter
-        # (like per stestr run or other command). Make sure to clear those on
-        # each test to isolate the tests from each other.
-        subunit_trace.RESULTS = {}
-        subunit_trace.FAILS = []
-
     @data(([dt(2015, 4, 17, 22, 23, 14, 111111),
             dt(2015, 4, 17, 22, 23, 14, 111111)],
            "0.000000s"),
@@ -65,13 +61,10 @@ class TestSubunitTrace(base.TestCase):
            0.0))
     @unpack
     def test_run_time(self, timestamps, expected_result):
-        patched_res = {
-            0: [
-                {'timestamps': timestamps}
-            ]
-        }
-        with patch.dict(subunit_trace.RESULTS, patched_res, clear=True):
-            self.assertEqual(subunit_trace.run_time(), expected_result)
+        summary = subunit_trace.TraceSummary()
+        summary.add({'status': 'success', 'timestamps': timestamps,
+                     'tags': set()})
+        self.assertEqual(summary.run_time, expected_result)
 
     def test_trace(self):
         regular_stream = os.path.join(
@@ -108,3 +101,155 @@ class TestSubunitTrace(base.TestCase):
         stdin = io.TextIOWrapper(io.BufferedReader(bytes_))
         returncode = subunit_trace.trace(stdin, sys.stdout)
         self.assertEqual(1, returncode)
+
+    def _trace_output(self, sample, **kwargs):
+        regular_stream = os.path.join(
+            os.path.dirname(os.path.abspath(__file__)),
+            'sample_streams', sample)
+        with open(regular_stream, 'rb') as stream:
+            stdin = io.BytesIO(stream.read())
+        stdout = io.TextIOWrapper(io.BytesIO(), encoding='utf8')
+        returncode = subunit_trace.trace(stdin, stdout, post_fails=True,
+                                         **kwargs)
+        stdout.flush()
+        return returncode, stdout.buffer.getvalue().decode('utf8')
+
+    def test_trace_is_reentrant(self):
+        first = self._trace_output('failure.subunit')
+        second = self._trace_output('failure.subunit')
+        self.assertEqual(first[0], second[0])
+        self.assertEqual(first[1].split('Ran:')[1].split('\n')[0],
+                         second[1].split('Ran:')[1].split('\n')[0])
+
+    def test_trace_spill_failures(self):
+        returncode, output = self._trace_output('failure.subunit')
+        spill_returncode, spill_output = self._trace_output(
+            'failure.subunit', spill_failures=True)
+        self.assertEqual(returncode, spill_returncode)
+        fails = output.split('output below:')[1].split('======\nTotals')[0]
+        spill_fails = spill_output.split('output below:')[1].split(
+            '======\nTotals')[0]
+        self.assertEqual(fails, spill_fails)
+
+    def test_compat_helpers(self):
+        summary = subunit_trace.TraceSummary()
+        summary.add({'status': 'success', 'tags': {'worker-0'},
+                     'timestamps': [dt(2015, 4, 17, 22, 23, 14),
+                                    dt(2015, 4, 17, 22, 23, 15)]})
+        failure = {'id': 'test_fail', 'status': 'fail',
+                   'tags': {'worker-0'}, 'details': {},
+                   'timestamps': [dt(2015, 4, 17, 22, 23, 15),
+                                  dt(2015, 4, 17, 22, 23, 17)]}
+        summary.add(failure)
+        summary.add_failure(failure)
+        self.assertEqual(2, subunit_trace.count_tests('status', '.*',
+                                                      summary))
+        self.assertEqual(1, subunit_trace.count_tests('status', '^fail$',
+                                                      summary))
+        self.assertEqual(3.0, subunit_trace.run_time(summary))
+        self.assertEqual((2, '0:00:03'),
+                         subunit_trace.worker_stats(0, summary))
+        self.assertRaises(ValueError, subunit_trace.count_tests, 'id', '.*',
+                          summary)
+        stdout = six.StringIO()
+        subunit_trace.print_fails(stdout, summary)
+        self.assertIn('Failed 1 tests', stdout.getvalue())
+        stdout = six.StringIO()
+        subunit_trace.print_summary(stdout, datetime.timedelta(seconds=1),
+                                    summary)
+        self.assertIn('Ran: 2 tests', stdout.getvalue())
+
+    def test_summary_worker_stats(self):
+        summary = subunit_trace.TraceSummary()
+        summary.add({'status': 'success', 'tags': {'worker-1'},
+                     'timestamps': [dt(2015, 4, 17, 22, 23, 14),
+                                    dt(2015, 4, 17, 22, 23, 15)]})
+        summary.add({'status': 'fail', 'tags': {'worker-1'},
+                     'timestamps': [dt(2015, 4, 17, 22, 23, 15),
+                                    dt(2015, 4, 17, 22, 23, 17)]})
+        self.assertEqual(2, summary.num_tests)
+        self.assertEqual(3.0, summary.run_time)
+        self.assertEqual((2, '0:00:03'), summary.worker_stats(1))
+        self.assertNotIn(0, summary.workers)
+
+    def test_find_test_run_time_diff(self):
+        test_times = {'test': 2.0, 'zero': 0.0}
+        self.assertEqual(50.0, subunit_trace.find_test_run_time_diff(
+            'test', '3.000000s', test_times))
+        self.assertEqual(-50.0, subunit_trace.find_test_run_time_diff(
+            'test', '1.000000s', test_times))
+        self.assertFalse(subunit_trace.find_test_run_time_diff(
+            'zero', '1.000000s', test_times))
+        self.assertFalse(subunit_trace.find_test_run_time_diff(
+            'missing', '1.000000s', test_times))
+
+    def test_load_test_times(self):
+        repo_path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, repo_path)
+        self.assertEqual({}, subunit_trace.load_test_times('file', repo_path))
+        repo = util.get_repo_initialise('file', repo_path)
+        self.assertEqual({}, subunit_trace.load_test_times('file', repo_path))
+        start = dt.now(iso8601.UTC)
+        inserter = repo.get_inserter()
+        inserter.startTestRun()
+        inserter.status(test_id='test', test_status='inprogress',
+                        timestamp=start)
+        inserter.status(test_id='test', test_status='success',
+                        timestamp=start + datetime.timedelta(seconds=2))
+        inserter.stopTestRun()
+        self.assertEqual({'test': 2.0},
+                         subunit_trace.load_test_times('file', repo_path))
+        # Tests which weren't in the last run keep their estimate
+        inserter = repo.get_inserter()
+        inserter.startTestRun()
+        inserter.status(test_id='other', test_status='inprogress',
+                        timestamp=start)
+        inserter.status(test_id='other', test_status='success',
+                        timestamp=start + datetime.timedelta(seconds=1))
+        inserter.stopTestRun()
+        self.assertEqual({'test': 2.0, 'other': 1.0},
+                         subunit_trace.load_test_times('file', repo_path))
+        self.assertEqual({'other': 1.0}, subunit_trace.load_test_times(
+            'file', repo_path, test_ids=['other', 'missing']))
+        self.assertEqual({'other': 1.0}, subunit_trace.load_test_times(
+            'file', repo_path, test_ids=['other[id-1,smoke]']))
+
+    def test_trace_perc_diff_uses_repo(self):
+        with mock.patch.object(subunit_trace, 'load_test_times',
+                               return_value={}) as load_test_times:
+            self._trace_output('successful.subunit', enable_diff=True,
+                               repo_type='sql', repo_url='sqlite://')
+        load_test_times.assert_called_once_with('sql', 'sqlite://')
+
+    def test_show_outcome_perc_diff(self):
+        stream = six.StringIO()
+        test = {'id': 'test', 'status': 'success', 'tags': set(),
+                'details': {},
+                'timestamps': [dt(2015, 4, 17, 22, 23, 14),
+                               dt(2015, 4, 17, 22, 23, 17)]}
+        subunit_trace.show_outcome(stream, test, enable_diff=True,
+                                   test_times={'test': 2.0})
+        self.assertIn('[3.000000s +50.00%]', stream.getvalue())
+
+    def test_show_outcome_perc_diff_with_attrs(self):
+        repo_path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, repo_path)
+        repo = util.get_repo_initialise('file', repo_path)
+        test_id = 'tests.TestA.test_a[id-1234,smoke]'
+        start = dt.now(iso8601.UTC)
+        inserter = repo.get_inserter()
+        inserter.startTestRun()
+        inserter.status(test_id=test_id, test_status='inprogress',
+                        timestamp=start)
+        inserter.status(test_id=test_id, test_status='success',
+                        timestamp=start + datetime.timedelta(seconds=2))
+        inserter.stopTestRun()
+        stream = six.StringIO()
+        test = {'id': test_id, 'status': 'success', 'tags': set(),
+                'details': {},
+                'timestamps': [dt(2015, 4, 17, 22, 23, 14),
+                               dt(2015, 4, 17, 22, 23, 17)]}
+        subunit_trace.show_outcome(
+            stream, test, enable_diff=True,
+            test_times=subunit_trace.load_test_times('file', repo_path))
+        self.assertIn('[3.000000s +50.00%]', stream.getvalue())
@@ -10,13 +10,31 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import os
 import subprocess
+import sys
+import tempfile
 
 import mock
+import subunit
+import testtools
 
+from stestr.repository import memory
 from stestr import test_processor
 from stestr.tests import base
 
+# A fake test runner which reports the tests given to it as successful and
+# exits non-zero for a test named crash.
+FAKE_RUNNER = """
+import sys
+import subunit
+output = subunit.StreamResultToBytes(getattr(sys.stdout, 'buffer',
+                                             sys.stdout))
+for test_id in sys.argv[1:]:
+    output.status(test_id=test_id, test_status='success')
+sys.exit(3 if 'crash' in sys.argv else 0)
+"""
+
 
 class TestTestProcessorFixture(base.TestCase):
 
@@ -45,3 +63,49 @@ class TestTestProcessorFixture(base.TestCase):
     def test_start_process_linux(self):
         self._check_start_process(
             platform='linux2', expected_fn=self._fixture._clear_SIGPIPE)
+
+
+class TestIsolatedRun(base.TestCase):
+
+    def _run_isolated(self, test_ids, concurrency, resource_callback=None):
+        fd, runner = tempfile.mkstemp(suffix='.py')
+        os.write(fd, FAKE_RUNNER.encode('utf8'))
+        os.close(fd)
+        self.addCleanup(os.remove, runner)
+        repo = memory.RepositoryFactory().initialise('memory:')
+        fixture = self.useFixture(test_processor.TestProcessorFixture(
+            test_ids, '%s %s $IDLIST' % (sys.executable, runner), '', '',
+            repo, concurrency=concurrency, isolated=True,
+            resource_callback=resource_callback))
+        procs = fixture.run_tests()
+        statuses = []
+        result = testtools.StreamToDict(
+            lambda x: statuses.append((x['id'], x['status'])))
+        result.startTestRun()
+        for proc in procs:
+            subunit.ByteStreamToStreamResult(proc.stdout).run(result)
+            self.assertEqual(0, proc.wait())
+        result.stopTestRun()
+        return procs, statuses
+
+    def test_isolated_workers(self):
+        test_ids = ['test%d' % i for i in range(5)]
+        procs, statuses = self._run_isolated(test_ids, 2)
+        self.assertEqual(2, len(procs))
+        self.assertEqual(sorted((x, 'success') for x in test_ids),
+                         sorted(statuses))
+
+    def test_isolated_returncode(self):
+        procs, statuses = self._run_isolated(['test', 'crash'], 4)
+        self.assertEqual(2, len(procs))
+        self.assertEqual([('crash', 'success'), ('process-returncode', 'fail'),
+                          ('test', 'success')], sorted(statuses))
+
+    def test_isolated_resource_lanes(self):
+        test_ids = ['test_db1', 'test_a', 'test_db2', 'test_b']
+        procs, statuses = self._run_isolated(
+            test_ids, 4, lambda x: ['db'] if 'db' in x else [])
+        # The tests holding the db resource are run by a single worker
+        self.assertEqual(3, len(procs))
+        self.assertEqual(sorted((x, 'success') for x in test_ids),
+                         sorted(statuses))
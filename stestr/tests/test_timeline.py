@@ -0,0 +1,63 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import datetime
+import json
+
+import six
+from subunit import iso8601
+
+from stestr.commands import timeline
+from stestr.tests import base
+
+
+class TestTimelineWriter(base.TestCase):
+
+    def setUp(self):
+        super(TestTimelineWriter, self).setUp()
+        self.start = datetime.datetime(2017, 1, 1, tzinfo=iso8601.UTC)
+
+    def _test(self, test_id, worker, start, stop, status='success'):
+        return {
+            'id': test_id,
+            'status': status,
+            'tags': set(['worker-%d' % worker]),
+            'timestamps': (self.start + datetime.timedelta(seconds=start),
+                           self.start + datetime.timedelta(seconds=stop)),
+        }
+
+    def test_tracks_and_gaps(self):
+        stream = six.StringIO()
+        writer = timeline.TimelineWriter(stream, 'run 0')
+        writer.start()
+        writer.add_test(self._test('a', 0, 0, 1))
+        writer.add_test(self._test('b', 0, 2, 3, status='fail'))
+        writer.add_test(self._test('c', 1, 0, 5))
+        writer.finish()
+        events = json.loads(stream.getvalue())['traceEvents']
+        self.assertEqual(3, writer.tests)
+        names = [(x['name'], x['ph'], x.get('tid')) for x in events]
+        self.assertEqual([
+            ('process_name', 'M', None),
+            ('thread_name', 'M', 0),
+            ('a', 'X', 0),
+            ('gap', 'X', 0),
+            ('b', 'X', 0),
+            ('thread_name', 'M', 1),
+            ('c', 'X', 1),
+            ('idle', 'X', 0),
+        ], names)
+        gap = events[3]
+        self.assertEqual(1000000, gap['dur'])
+        self.assertEqual(events[2]['ts'] + 1000000, gap['ts'])
+        self.assertEqual('terrible', events[4]['cname'])
+        self.assertEqual(2000000, events[-1]['dur'])
@@ -0,0 +1,44 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+
+import six
+
+from stestr.tests import base
+from stestr import timing
+
+
+class TestTiming(base.TestCase):
+
+    def test_dump_load_roundtrip(self):
+        timing_data = {'test_a': (0.5, 3), 'test_b': (2.0, 1)}
+        stream = six.StringIO()
+        timing.dump(timing_data, stream)
+        stream.seek(0)
+        self.assertEqual(timing_data, timing.load(stream))
+
+    def test_load_unsupported_version(self):
+        stream = six.StringIO('{"version": 2, "tests": {}}')
+        self.assertRaises(timing.TimingFileError, timing.load, stream)
+
+    def test_load_invalid(self):
+        for content in ('not json', '[]', '{"version": 1}',
+                        '{"version": 1, "tests": {"a": [1.0, 0]}}',
+                        '{"version": 1, "tests": {"a": 1.0}}'):
+            self.assertRaises(timing.TimingFileError, timing.load,
+                              six.StringIO(content))
+
+    def test_merge_weights_by_samples(self):
+        existing = {'test_a': (1.0, 3), 'test_c': (5.0, 1)}
+        new = {'test_a': (3.0, 1), 'test_b': (2.0, 2)}
+        self.assertEqual({'test_a': (1.5, 4), 'test_b': (2.0, 2)},
+                         timing.merge(existing, new))
@@ -0,0 +1,78 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import os
+import shutil
+import tempfile
+
+from stestr.tests import base
+from stestr import watcher
+
+
+class TestImportGraph(base.TestCase):
+
+    def setUp(self):
+        super(TestImportGraph, self).setUp()
+        self.top_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.top_dir)
+        self._write('pkg/__init__.py', '')
+        self._write('pkg/util.py', 'import os\n')
+        self._write('pkg/core.py', 'from . import util\n')
+        self._write('pkg/tests/__init__.py', '')
+        self._write('pkg/tests/test_core.py', 'from pkg import core\n')
+        self._write('pkg/tests/test_other.py', 'import pkg\n')
+        self._write('.tox/lib/ignored.py', 'import pkg.util\n')
+
+    def _write(self, name, contents):
+        path = os.path.join(self.top_dir, name)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as source_file:
+            source_file.write(contents)
+        return path
+
+    def test_module_name(self):
+        self.assertEqual('pkg.core', watcher.module_name(
+            os.path.join(self.top_dir, 'pkg', 'core.py'), self.top_dir))
+        self.assertEqual('pkg', watcher.module_name(
+            os.path.join(self.top_dir, 'pkg', '__init__.py'), self.top_dir))
+        self.assertIsNone(watcher.module_name(
+            os.path.join(self.top_dir, 'my-scripts', 'x.py'), self.top_dir))
+
+    def test_find_imports_relative(self):
+        path = os.path.join(self.top_dir, 'pkg', 'core.py')
+        self.assertEqual(set(['pkg', 'pkg.util']),
+                         watcher.find_imports(path, 'pkg.core'))
+
+    def test_impacted(self):
+        graph = watcher.ImportGraph(self.top_dir)
+        self.assertNotIn('lib.ignored', graph.imports)
+        self.assertEqual(
+            set(['pkg.util', 'pkg.core', 'pkg.tests.test_core']),
+            graph.impacted(['pkg.util']))
+
+    def test_update(self):
+        graph = watcher.ImportGraph(self.top_dir)
+        path = self._write('pkg/tests/test_util.py', 'from pkg import util\n')
+        graph.update([path])
+        self.assertIn('pkg.tests.test_util', graph.impacted(['pkg.util']))
+        os.remove(path)
+        graph.update([path])
+        self.assertNotIn('pkg.tests.test_util', graph.impacted(['pkg.util']))
+
+    def test_polling_watcher(self):
+        source_watcher = watcher.PollingWatcher(self.top_dir, interval=0)
+        os.remove(os.path.join(self.top_dir, 'pkg', 'util.py'))
+        new = self._write('pkg/new.py', '')
+        self.assertEqual(
+            sorted([os.path.join(self.top_dir, 'pkg', 'util.py'), new]),
+            source_watcher.wait())
@@ -0,0 +1,95 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+
+"""Portable timing data, used to seed repositories on new machines.
+
+The timing data of a repository maps each test id to the estimated duration
+of the test in seconds and the number of samples the estimate is based on. It
+is written out as a compact JSON file::
+
+  {"version": 1, "tests": {"project.tests.test_a.TestA.test_one": [0.25, 3]}}
+
+When timing data is merged into a repository the estimates of each test are
+averaged, weighted by their number of samples.
+"""
+
+import json
+
+import six
+
+# The version of the timing file format written by dump()
+FORMAT_VERSION = 1
+
+
+class TimingFileError(Exception):
+    """Raised when a timing file can't be read."""
+
+
+def dump(timing_data, stream):
+    """Write timing data to a text file object.
+
+    :param dict timing_data: A dict of test id -> (estimated seconds, samples)
+    :param stream: The text file object to write the timing file to
+    """
+    tests = dict((test_id, [round(seconds, 6), samples])
+                 for test_id, (seconds, samples) in timing_data.items())
+    json.dump({'version': FORMAT_VERSION, 'tests': tests}, stream,
+              sort_keys=True, separators=(',', ':'))
+    stream.write('\n')
+
+
+def load(stream):
+    """Read timing data from a text file object written by dump().
+
+    :param stream: The text file object to read the timing file from
+    :return: A dict of test id -> (estimated seconds, samples)
+    :raises TimingFileError: If the file isn't a valid timing file
+    """
+    try:
+        data = json.load(stream)
+    except ValueError as e:
+        raise TimingFileError('Invalid timing file: %s' % e)
+    if not isinstance(data, dict) or data.get('version') != FORMAT_VERSION:
+        raise TimingFileError('Unsupported timing file version: %s'
+                              % (data.get('version')
+                                 if isinstance(data, dict) else None))
+    timing_data = {}
+    try:
+        for test_id, (seconds, samples) in data['tests'].items():
+            if seconds < 0 or samples < 1:
+                raise ValueError(test_id)
+            timing_data[six.text_type(test_id)] = (float(seconds),
+                                                   int(samples))
+    except (KeyError, TypeError, ValueError) as e:
+        raise TimingFileError('Invalid timing file entry: %s' % e)
+    return timing_data
+
+
+def merge(existing, new):
+    """Merge timing data, weighting the estimates by their samples.
+
+    :param dict existing: The timing data of the tests already known, a dict
+        of test id -> (estimated seconds, samples). It may also contain tests
+        which aren't in new.
+    :param dict new: The timing data to merge into existing
+    :return: A dict of the merged timing data of the tests in new
+    """
+    merged = {}
+    for test_id, (seconds, samples) in new.items():
+        if test_id in existing:
+            old_seconds, old_samples = existing[test_id]
+            total = old_samples + samples
+            seconds = (old_seconds * old_samples + seconds * samples) / total
+            samples = total
+        merged[test_id] = (seconds, samples)
+    return merged
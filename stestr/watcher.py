@@ -0,0 +1,243 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Watch a source tree for changes and find the tests they impact."""
+
+import ast
+import os
+import time
+
+try:
+    import inotify_simple
+except ImportError:
+    inotify_simple = None
+
+
+def _skip_dir(name):
+    return (name.startswith('.') or name == '__pycache__' or
+            name.endswith('.egg-info'))
+
+
+def iter_python_files(top_dir):
+    """Yield the path of every python source file under top_dir."""
+    for root, dirs, files in os.walk(top_dir):
+        dirs[:] = sorted(x for x in dirs if not _skip_dir(x))
+        for name in sorted(files):
+            if name.endswith('.py'):
+                yield os.path.join(root, name)
+
+
+def module_name(path, top_dir):
+    """Return the dotted module name of the python file at path.
+
+    :param str path: The path of the python file
+    :param str top_dir: The directory the module names are relative to
+    :return: The module name, or None if the path isn't importable from
+        top_dir.
+    """
+    rel_path = os.path.relpath(path, top_dir)
+    parts = os.path.splitext(rel_path)[0].split(os.sep)
+    if parts[-1] == '__init__':
+        parts.pop()
+    if not parts or parts[0] == '..':
+        return None
+    for part in parts:
+        if not part.replace('_', 'a').isalnum() or part[0].isdigit():
+            return None
+    return '.'.join(parts)
+
+
+def find_imports(path, module):
+    """Return the names of the modules imported by a python file.
+
+    Names imported with ``from x import y`` are returned both as ``x`` and
+    ``x.y`` because y may be a module. Relative imports are resolved against
+    module.
+
+    :param str path: The path of the python file
+    :param str module: The module name of the python file
+    :return: A set of module names
+    """
+    with open(path, 'rb') as source_file:
+        try:
+            tree = ast.parse(source_file.read(), path)
+        except (SyntaxError, ValueError):
+            return set()
+    if os.path.basename(path) == '__init__.py':
+        package = module.split('.')
+    else:
+        package = module.split('.')[:-1]
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            if node.level:
+                base = package[:len(package) - node.level + 1]
+                if node.module:
+                    base = base + [node.module]
+                base = '.'.join(base)
+            else:
+                base = node.module
+            if not base:
+                names.update(alias.name for alias in node.names)
+                continue
+            names.add(base)
+            names.update(base + '.' + alias.name for alias in node.names)
+    # Importing a.b.c imports a and a.b as well
+    for name in list(names):
+        parts = name.split('.')
+        for i in range(1, len(parts)):
+            names.add('.'.join(parts[:i]))
+    return names
+
+
+class ImportGraph(object):
+    """The imports between the python modules under a directory.
+
+    :param str top_dir: The directory to scan, module names are relative to
+        this directory
+    """
+
+    def __init__(self, top_dir):
+        self.top_dir = top_dir
+        # (path -> module name)
+        self.modules = {}
+        # (module name -> set of imported module names)
+        self.imports = {}
+        self.update(iter_python_files(top_dir))
+
+    def update(self, paths):
+        """Rescan the python files at paths, which may have been removed."""
+        for path in paths:
+            module = self.modules.pop(path, None) or module_name(
+                path, self.top_dir)
+            if module is None:
+                continue
+            if os.path.isfile(path):
+                self.modules[path] = module
+                self.imports[module] = find_imports(path, module)
+            else:
+                self.imports.pop(module, None)
+
+    def impacted(self, modules):
+        """Return the modules which import any of modules, directly or not.
+
+        :param modules: The names of the changed modules
+        :return: A set of the module names, including modules themselves
+        """
+        importers = {}
+        for module, names in self.imports.items():
+            for name in names:
+                importers.setdefault(name, set()).add(module)
+        impacted = set(modules)
+        to_check = list(modules)
+        while to_check:
+            for module in importers.get(to_check.pop(), ()):
+                if module not in impacted:
+                    impacted.add(module)
+                    to_check.append(module)
+        return impacted
+
+
+def snapshot(top_dir):
+    """Return a dict mapping each python file under top_dir to its mtime."""
+    files = {}
+    for path in iter_python_files(top_dir):
+        try:
+            files[path] = os.stat(path).st_mtime
+        except OSError:
+            pass
+    return files
+
+
+class PollingWatcher(object):
+    """Wait for python files under a directory to change by polling.
+
+    :param str top_dir: The directory to watch
+    :param float interval: The number of seconds between checks
+    """
+
+    method = 'polling'
+
+    def __init__(self, top_dir, interval=1.0):
+        self.top_dir = top_dir
+        self.interval = interval
+        self._files = snapshot(top_dir)
+
+    def _block(self):
+        time.sleep(self.interval)
+
+    def wait(self):
+        """Block until python files change.
+
+        :return: A sorted list of the paths of the files which were added,
+            modified or removed.
+        """
+        while True:
+            self._block()
+            files = snapshot(self.top_dir)
+            changed = set(files).symmetric_difference(self._files)
+            changed.update(path for path, mtime in files.items()
+                           if self._files.get(path, mtime) != mtime)
+            self._files = files
+            if changed:
+                return sorted(changed)
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher(PollingWatcher):
+    """Wait for python files under a directory to change using inotify.
+
+    The changed files are still found by comparing mtimes, inotify is only
+    used to sleep until something under the directory changes.
+    """
+
+    method = 'inotify'
+
+    def __init__(self, top_dir, interval=1.0):
+        super(InotifyWatcher, self).__init__(top_dir, interval)
+        flags = inotify_simple.flags
+        self._mask = (flags.CLOSE_WRITE | flags.MOVED_TO | flags.MOVED_FROM |
+                      flags.CREATE | flags.DELETE)
+        self._inotify = inotify_simple.INotify()
+        self._watched = set()
+        self._add_watches()
+
+    def _add_watches(self):
+        for root, dirs, files in os.walk(self.top_dir):
+            dirs[:] = [x for x in dirs if not _skip_dir(x)]
+            if root not in self._watched:
+                self._inotify.add_watch(root, self._mask)
+                self._watched.add(root)
+
+    def _block(self):
+        self._inotify.read()
+        # Let editors finish writing out all of the files of a save
+        time.sleep(min(self.interval, 0.1))
+        self._inotify.read(timeout=0)
+        self._add_watches()
+
+    def close(self):
+        self._inotify.close()
+
+
+def get_watcher(top_dir, interval=1.0):
+    """Return a watcher for top_dir, using inotify if it's available."""
+    if inotify_simple is not None:
+        try:
+            return InotifyWatcher(top_dir, interval)
+        except OSError:
+            pass
+    return PollingWatcher(top_dir, interval)